@@ -1,11 +1,14 @@
-import os
-import re
+import sys
 import math
+import time
+import threading
+import weakref
+import traceback
+from collections import OrderedDict
 from fontTools.misc import bezierTools as ftBezierTools
-from fontTools.agl import AGL2UV
 from fontTools.pens.cocoaPen import CocoaPen
-from robofab.pens.digestPen import DigestPointPen
 from AppKit import *
+from PyObjCTools import AppHelper
 import vanilla
 from vanilla import dialogs
 from defconAppKit.windows.baseWindow import BaseWindowController
@@ -13,48 +16,42 @@ from mojo.roboFont import CurrentFont, AllFonts
 from mojo.roboFont import version as roboFontVersion
 from mojo.UI import UpdateCurrentGlyphView
 from mojo.events import addObserver, removeObserver
-from mojo.extensions import getExtensionDefault, setExtensionDefault, getExtensionDefaultColor, setExtensionDefaultColor
-from lib.tools import bezierTools as rfBezierTools
+from glyphNannyProfiler import profiler, histogramEdges
+from glyphNannySettings import settings, defaultKeyColorInform, defaultKeyColorReview, defaultKeyColorRemove, defaultKeyColorInsert, getColorKey
+from glyphNannyCore import testRegistry, reportOrder, getGlyphReport, runTest, getScheduledTestOrder, GlyphGeometry
 
 DEBUG = False
 
-# --------
-# Defaults
-# --------
-
-defaultKeyStub = "com.typesupply.GlyphNanny."
-defaultKeyObserverVisibility = defaultKeyStub + "displayReportInGlyphView"
-defaultKeyTestStates = defaultKeyStub + "testStates"
-defaultKeyColorInform = defaultKeyStub + "colorInform"
-defaultKeyColorReview = defaultKeyStub + "colorReview"
-defaultKeyColorRemove = defaultKeyStub + "colorRemove"
-defaultKeyColorInsert = defaultKeyStub + "colorInsert"
-
-def registerGlyphNannyDefaults():
-    defaults = {
-        defaultKeyObserverVisibility : False,
-        defaultKeyTestStates : {}
-    }
-    for key in sorted(testRegistry.keys()):
-        defaults[defaultKeyTestStates][key] = True
-
-    try:
-        from mojo.extensions import registerExtensionsDefaults
-    except ImportError:
-        def registerExtensionsDefaults(d):
-            for k, v in d.items():
-                e = getExtensionDefault(k, fallback="__fallback__")
-                if e == "__fallback__":
-                    setExtensionDefault(k, v)
-
-    registerExtensionsDefaults(defaults)
-
-    # handle nested
-    nested = getExtensionDefault(defaultKeyTestStates)
-    for key, default in defaults[defaultKeyTestStates].items():
-        if key not in nested:
-            nested[key] = default
-            setExtensionDefault(defaultKeyTestStates, nested)
+# Draw all of the labels after all of the
+# paths in the live report instead of as
+# each drawing function creates them.
+batchLabelDrawing = True
+
+# The number of glyphs that keep
+# their recorded report drawing.
+displayListCacheSize = 20
+
+# Hide the labels in the live report when the
+# glyph is drawn smaller than this fraction of
+# its size in units.
+levelOfDetail = True
+levelOfDetailLabelScale = 0.4
+
+# The live report runs the cheap tests on every
+# draw. The other tests are run from cheapest to
+# most expensive until this many seconds have been
+# spent and the rest are left for the next draws.
+liveReportBudget = 0.004
+
+# The font reports are made in the RoboFont process.
+# Forking it after AppKit has started isn't safe, so
+# the process pool is only used by the command line.
+fontReportWorkers = 1
+
+# When reports are computed in the background,
+# the outline tests start after the outline has
+# not changed for this many seconds.
+backgroundReportDelay = 0.15
 
 # ----------------
 # Drawing Observer
@@ -63,18 +60,38 @@ def registerGlyphNannyDefaults():
 def registerGlyphNannyObserver(observer):
     addObserver(observer, "drawReport", "drawBackground")
     addObserver(observer, "drawReport", "drawInactive")
+    addObserver(observer, "mouseDragged", "mouseDragged")
+    addObserver(observer, "mouseUp", "mouseUp")
 
 def unregisterGlyphNannyObserver(observer):
     removeObserver(observer, "drawBackground")
     removeObserver(observer, "drawInactive")
+    removeObserver(observer, "mouseDragged")
+    removeObserver(observer, "mouseUp")
 
 
 class GlyphNannyObserver(object):
 
+    def __init__(self):
+        self._displayListCache = OrderedDict()
+        self._dragging = False
+        self._backgroundReports = OrderedDict()
+        self._backgroundRequests = {}
+        self._backgroundWorker = None
+        self._backgroundTestSplit = None
+
+    def mouseDragged(self, info):
+        self._dragging = True
+
+    def mouseUp(self, info):
+        if self._dragging:
+            self._dragging = False
+            if settings.backgroundReports:
+                UpdateCurrentGlyphView()
+
     def drawReport(self, info):
         # skip if the user doesn't want to see the report
-        display = getExtensionDefault(defaultKeyObserverVisibility)
-        if not display:
+        if not settings.displayReport:
             return
         # make sure there is something to be tested
         glyph = info["glyph"]
@@ -82,21 +99,194 @@ class GlyphNannyObserver(object):
             return
         # get the report
         font = glyph.getParent()
-        testStates = getExtensionDefault(defaultKeyTestStates)
-        if roboFontVersion > "1.5.1":
-            testStates = dictToTuple(testStates)
-            report = glyph.getRepresentation("com.typesupply.GlyphNanny.Report", testStates=testStates)
+        testStates = settings.testStates
+        if roboFontVersion > "1.5.1" and settings.backgroundReports:
+            report = self.getBackgroundGlyphReport(font, glyph)
+        elif roboFontVersion > "1.5.1":
+            report = self.getBudgetedGlyphReport(font, glyph, testStates)
         else:
             report = getGlyphReport(font, glyph, testStates)
         # draw the report
-        scale = info["scale"]
-        for key in drawingOrder:
-            data = report.get(key)
-            if data:
-                drawingFunction = testRegistry[key]["drawingFunction"]
-                if drawingFunction is not None:
-                    drawingFunction(data, scale, glyph)
-        drawTextReport(report, scale, glyph)
+        scale = getScaleBucket(info["scale"])
+        displayList = self.getDisplayList(glyph, report, scale)
+        showLabels = True
+        if levelOfDetail and info["scale"] > 1.0 / levelOfDetailLabelScale:
+            showLabels = False
+        displayList.draw(getVisibleRect(), showLabels)
+
+    def getBudgetedGlyphReport(self, font, glyph, testStates):
+        """
+        Get a report with the tests that fit in
+        liveReportBudget. If some tests were left
+        out, the glyph view is drawn again so that
+        they are filled in progressively.
+        """
+        report, complete = getBudgetedCachedGlyphReport(font, glyph, testStates, liveReportBudget)
+        if not complete:
+            AppHelper.callAfter(UpdateCurrentGlyphView)
+        return report
+
+    def getBackgroundGlyphReport(self, font, glyph):
+        """
+        Get a report with the outline tests computed on
+        a background thread. Until the tests for the
+        current outline are finished, the results for
+        the previous outline are used. No new tests are
+        started while points are being dragged.
+        """
+        split = self._backgroundTestSplit
+        if split is None or split[0] != settings.testStatesKey:
+            testStates = dict(settings.testStates)
+            identifiers = []
+            for identifier in sorted(testRegistry.keys()):
+                if testStates.get(identifier, True) and _isOutlineTest(identifier):
+                    identifiers.append(identifier)
+                    testStates[identifier] = False
+            split = self._backgroundTestSplit = (settings.testStatesKey, testStates, tuple(identifiers))
+        testStatesKey, testStates, identifiers = split
+        # the font level tests are fast enough for the main thread
+        report = self.getBudgetedGlyphReport(font, glyph, testStates)
+        naked = glyph.naked()
+        # ids are reused after a glyph is deleted,
+        # so the glyph is checked before using
+        # anything stored with its id
+        key = id(naked)
+        geometry = naked.getRepresentation(geometryRepresentationKey)
+        finished = self._backgroundReports.get(key)
+        if finished is not None and finished[0]() is not naked:
+            del self._backgroundReports[key]
+            finished = None
+        if finished is not None:
+            glyphRef, finishedGeometry, finishedIdentifiers, results = finished
+            for identifier in identifiers:
+                report[identifier] = results.get(identifier)
+            if finishedGeometry is geometry and finishedIdentifiers == identifiers:
+                return report
+        if self._dragging:
+            return report
+        request = self._backgroundRequests.get(key)
+        if request is None or request[0]() is not naked or request[1] is not geometry or request[2] != identifiers:
+            glyphRef = weakref.ref(naked)
+            self._backgroundRequests[key] = (glyphRef, geometry, identifiers)
+            if self._backgroundWorker is None:
+                self._backgroundWorker = BackgroundReportWorker(self._backgroundReportFinished)
+            # the tests get a detached copy so
+            # that edits can't change their data
+            replaced = self._backgroundWorker.request(key, glyphRef, glyph.copy(), geometry, identifiers)
+            # a replaced request will never finish, so
+            # forget it to have it requested again
+            if replaced is not None and replaced != key:
+                self._backgroundRequests.pop(replaced, None)
+        return report
+
+    def _backgroundReportFinished(self, key, glyphRef, geometry, identifiers, results):
+        naked = glyphRef()
+        request = self._backgroundRequests.get(key)
+        if request is not None and request[0]() is naked and request[1] is geometry:
+            del self._backgroundRequests[key]
+        if naked is None:
+            return
+        self._backgroundReports.pop(key, None)
+        self._backgroundReports[key] = (glyphRef, geometry, identifiers, results)
+        if len(self._backgroundReports) > displayListCacheSize:
+            self._backgroundReports.popitem(last=False)
+        UpdateCurrentGlyphView()
+
+    def getDisplayList(self, glyph, report, scale):
+        """
+        Get the recorded drawing of report. The recording is
+        reused as long as the report results are the same
+        objects, the colors are the same and the scale is
+        in the same bucket.
+        """
+        key = id(glyph.naked())
+        results = [report.get(identifier) for identifier in drawingOrder]
+        colors = settings.colorsKey
+        cached = self._displayListCache.pop(key, None)
+        if cached is not None:
+            cachedResults, cachedColors, cachedScale, displayList = cached
+            same = cachedScale == scale and cachedColors == colors
+            if same:
+                for result, cachedResult in zip(results, cachedResults):
+                    if result is not cachedResult:
+                        same = False
+                        break
+            if not same:
+                cached = None
+        if cached is None:
+            displayList = recordReport(report, scale, glyph)
+            cached = (results, colors, scale, displayList)
+            if len(self._displayListCache) >= displayListCacheSize:
+                self._displayListCache.popitem(last=False)
+        self._displayListCache[key] = cached
+        return displayList
+
+
+def _isOutlineTest(identifier):
+    return set(testRegistry[identifier]["dependencies"]) <= set(["contours"])
+
+
+class BackgroundReportWorker(object):
+
+    """
+    Run outline tests on a background thread. Only the
+    most recent request is kept and it is started once
+    there has been no newer request for
+    backgroundReportDelay seconds. callback is called
+    on the main thread with the request key, glyph
+    reference, geometry, test identifiers and results.
+    """
+
+    def __init__(self, callback):
+        self._callback = callback
+        self._condition = threading.Condition()
+        self._pending = None
+        self._requestTime = 0
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def request(self, key, glyphRef, glyph, geometry, identifiers):
+        """
+        Request the tests. The key of the pending
+        request that this replaces is returned,
+        or None if nothing was pending.
+        """
+        self._condition.acquire()
+        try:
+            replaced = None
+            if self._pending is not None:
+                replaced = self._pending[0]
+            self._pending = (key, glyphRef, glyph, geometry, identifiers)
+            self._requestTime = time.time()
+            self._condition.notify()
+        finally:
+            self._condition.release()
+        return replaced
+
+    def _run(self):
+        while True:
+            self._condition.acquire()
+            try:
+                while self._pending is None:
+                    self._condition.wait()
+                while True:
+                    remaining = self._requestTime + backgroundReportDelay - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                key, glyphRef, glyph, geometry, identifiers = self._pending
+                self._pending = None
+            finally:
+                self._condition.release()
+            results = {}
+            for identifier in identifiers:
+                try:
+                    results[identifier] = runTest(identifier, glyph, geometry)
+                except Exception:
+                    traceback.print_exc()
+                    results[identifier] = None
+            AppHelper.callAfter(self._callback, key, glyphRef, geometry, identifiers, results)
 
 
 # ------------
@@ -109,25 +299,27 @@ class GlyphNannyPrefsWindow(object):
         self.testStateControlToIdentifier = {}
         self.colorControlToKey = {}
 
-        self.w = vanilla.Window((264, 425), "Glyph Nanny Preferences")
+        self.w = vanilla.Window((264, 485), "Glyph Nanny Preferences")
 
         # global visibility
-        state = getExtensionDefault(defaultKeyObserverVisibility)
+        state = settings.displayReport
         self.w.displayLiveReportTitle = vanilla.TextBox((15, 15, 150, 17), "Live report display is:")
         self.w.displayLiveReportRadioGroup = vanilla.RadioGroup((159, 15, -15, 17), ["On", "Off"], isVertical=False, callback=self.displayLiveReportRadioGroupCallback)
         self.w.displayLiveReportRadioGroup.set(not state)
+        state = settings.backgroundReports
+        self.w.backgroundReportsCheckBox = vanilla.CheckBox((15, 40, -15, 22), "Compute reports in the background", value=state, callback=self.backgroundReportsCheckBoxCallback)
 
         # test states
-        _buildGlyphTestTabs(self, 50)
+        _buildGlyphTestTabs(self, 75)
 
         # colors
         colors = [
-            ("Information", colorInform(), defaultKeyColorInform),
-            ("Review Something", colorReview(), defaultKeyColorReview),
-            ("Insert Something", colorInsert(), defaultKeyColorInsert),
-            ("Remove Something", colorRemove(), defaultKeyColorRemove)
+            ("Information", settings.colors[defaultKeyColorInform], defaultKeyColorInform),
+            ("Review Something", settings.colors[defaultKeyColorReview], defaultKeyColorReview),
+            ("Insert Something", settings.colors[defaultKeyColorInsert], defaultKeyColorInsert),
+            ("Remove Something", settings.colors[defaultKeyColorRemove], defaultKeyColorRemove)
         ]
-        top = 290
+        top = 315
         for title, color, key in colors:
             control = vanilla.ColorWell((15, top, 70, 25), color=color, callback=self.noteColorColorWellCallback)
             self.colorControlToKey[control] = key
@@ -136,11 +328,18 @@ class GlyphNannyPrefsWindow(object):
             setattr(self.w, "colorTitle_" + title, control)
             top += 32
 
+        # profiler
+        self.w.profilerButton = vanilla.Button((15, top + 7, -15, 20), "Show Test Timings", callback=self.profilerButtonCallback)
+
         self.w.open()
 
     def displayLiveReportRadioGroupCallback(self, sender):
         state = not sender.get()
-        setExtensionDefault(defaultKeyObserverVisibility, state)
+        settings.setDisplayReport(state)
+        UpdateCurrentGlyphView()
+
+    def backgroundReportsCheckBoxCallback(self, sender):
+        settings.setBackgroundReports(sender.get())
         UpdateCurrentGlyphView()
 
     def testStateTabSelectorCallback(self, sender):
@@ -150,17 +349,18 @@ class GlyphNannyPrefsWindow(object):
     def testStateCheckBoxCallback(self, sender):
         identifier = self.testStateControlToIdentifier[sender]
         state = sender.get()
-        defaults = getExtensionDefault(defaultKeyTestStates)
-        defaults[identifier] = state
-        setExtensionDefault(defaultKeyTestStates, defaults)
+        settings.setTestState(identifier, state)
         UpdateCurrentGlyphView()
 
     def noteColorColorWellCallback(self, sender):
         color = sender.get()
         key = self.colorControlToKey[sender]
-        setExtensionDefaultColor(key, color)
+        settings.setColor(key, color)
         UpdateCurrentGlyphView()
 
+    def profilerButtonCallback(self, sender):
+        GlyphNannyProfilerWindow()
+
 
 def _buildGlyphTestTabs(controller, viewTop):
     groupTitles = ["Glyph Tests", "Metrics Tests", "Contour Tests", "Segment Tests", "Point Tests"]
@@ -181,7 +381,7 @@ def _buildGlyphTestTabs(controller, viewTop):
                    continue
                if testData["level"] != group:
                    continue
-               state = getExtensionDefault(defaultKeyTestStates)[identifier]
+               state = settings.testStates[identifier]
                control = vanilla.CheckBox((15, top, -15, 22), testData["title"], value=state, callback=controller.testStateCheckBoxCallback)
                top += 25
                controller.testStateControlToIdentifier[control] = identifier
@@ -194,8 +394,7 @@ def _buildGlyphTestTabs(controller, viewTop):
 # --------------
 
 def toggleObserverVisibility():
-    state = not getExtensionDefault(defaultKeyObserverVisibility)
-    setExtensionDefault(defaultKeyObserverVisibility, state)
+    settings.setDisplayReport(not settings.displayReport)
     UpdateCurrentGlyphView()
 
 
@@ -235,8 +434,7 @@ class GlyphNannyTestFontsWindow(BaseWindowController):
             dialogs.message("There is no font to test.", "Open a font and try again.")
             return
         testStates = self.getTestStates()
-        results = getFontReport(font, testStates, format=True)
-        print results
+        _writeTrackedFontReport(font, testStates)
 
     def testAllButtonCallback(self, sender):
         fonts = AllFonts()
@@ -245,42 +443,126 @@ class GlyphNannyTestFontsWindow(BaseWindowController):
             return
         testStates = self.getTestStates()
         for font in fonts:
-            results = getFontReport(font, testStates, format=True)
-            print results
-            print
+            _writeCachedFontReport(font, testStates)
+
+
+def _writeTrackedFontReport(font, testStates):
+    from glyphNannyOutput import TextReportSink, writeFontReport
+    tracker = getFontReportTracker(font)
+    writeFontReport(font, tracker.iterReport(testStates), TextReportSink(sys.stdout))
+
+def _writeCachedFontReport(font, testStates):
+    from glyphNannyBatch import iterFontReportParallel
+    from glyphNannyCache import openReportCache
+    from glyphNannyOutput import TextReportSink, writeFontReport
+    cache = openReportCache(font)
+    try:
+        reports = iterFontReportParallel(font, testStates, workers=fontReportWorkers, cache=cache)
+        writeFontReport(font, reports, TextReportSink(sys.stdout))
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+# ---------------
+# Profiler Window
+# ---------------
+
+class GlyphNannyProfilerWindow(BaseWindowController):
+
+    def __init__(self):
+        self.w = vanilla.Window((620, 460), "Glyph Nanny Test Timings", minSize=(450, 300))
+        self.w.enabledCheckBox = vanilla.CheckBox((15, 15, -15, 22), "Record test timings", value=profiler.enabled, callback=self.enabledCheckBoxCallback)
+        histogramTitle = "Recent ms: " + " ".join(["<%s" % edge for edge in histogramEdges])
+        columns = [
+            dict(title="Test", key="title"),
+            dict(title="Calls", key="calls", width=50),
+            dict(title="Total ms", key="total", width=70),
+            dict(title="Mean ms", key="mean", width=60),
+            dict(title="p95 ms", key="p95", width=60),
+            dict(title="Max ms", key="maximum", width=60),
+            dict(title="Found", key="size", width=50),
+            dict(title=histogramTitle, key="histogram")
+        ]
+        self.w.testList = vanilla.List((15, 45, -15, -185), [], columnDescriptions=columns)
+        self.w.glyphTitle = vanilla.TextBox((15, -175, -15, 17), "Slowest recently tested glyphs")
+        columns = [
+            dict(title="Glyph", key="glyph"),
+            dict(title="Total ms", key="total", width=70),
+            dict(title="Slowest Test", key="slowest")
+        ]
+        self.w.glyphList = vanilla.List((15, -153, -15, -45), [], columnDescriptions=columns)
+        self.w.resetButton = vanilla.Button((15, -35, 100, 20), "Reset", callback=self.resetButtonCallback)
+        self.w.exportButton = vanilla.Button((125, -35, 100, 20), "Export...", callback=self.exportButtonCallback)
+        self.w.refreshButton = vanilla.Button((-115, -35, 100, 20), "Refresh", callback=self.refreshButtonCallback)
+        self.update()
+        self.w.open()
+
+    def update(self):
+        items = []
+        summary = profiler.getTestSummary()
+        for identifier in reportOrder:
+            data = summary.get(identifier)
+            if data is None:
+                continue
+            items.append(dict(
+                title=testRegistry[identifier]["title"],
+                calls=data["calls"],
+                total="%.1f" % data["total"],
+                mean="%.3f" % data["mean"],
+                p95="%.3f" % data["p95"],
+                maximum="%.3f" % data["maximum"],
+                size=data["size"],
+                histogram=" ".join([str(count) for count in data["histogram"]])
+            ))
+        self.w.testList.set(items)
+        glyphs = []
+        for glyphName, glyphData in profiler.getGlyphSummary().items():
+            total = sum([data["total"] for data in glyphData.values()])
+            slowest = max(glyphData.keys(), key=lambda identifier: glyphData[identifier]["total"])
+            glyphs.append((total, glyphName, slowest))
+        glyphs.sort(reverse=True)
+        items = []
+        for total, glyphName, slowest in glyphs[:50]:
+            items.append(dict(glyph=glyphName, total="%.1f" % total, slowest=testRegistry[slowest]["title"]))
+        self.w.glyphList.set(items)
+
+    def enabledCheckBoxCallback(self, sender):
+        profiler.enabled = sender.get()
+
+    def resetButtonCallback(self, sender):
+        profiler.reset()
+        self.update()
+
+    def refreshButtonCallback(self, sender):
+        self.update()
+
+    def exportButtonCallback(self, sender):
+        self.showPutFile(["json"], self._exportCallback, fileName="Glyph Nanny Timings.json")
+
+    def _exportCallback(self, path):
+        if not path:
+            return
+        f = open(path, "w")
+        f.write(profiler.toJSON())
+        f.close()
 
 
 # ------
 # Colors
 # ------
 
-# Informative: Blue
 def colorInform():
-    color = getExtensionDefaultColor(defaultKeyColorInform)
-    if color is None:
-        color = NSColor.colorWithCalibratedRed_green_blue_alpha_(0, 0, 0.7, 0.3)
-    return color
+    return settings.colors[defaultKeyColorInform]
 
-# Insert Something: Green
 def colorInsert():
-    color = getExtensionDefaultColor(defaultKeyColorInsert)
-    if color is None:
-        color = NSColor.colorWithCalibratedRed_green_blue_alpha_(0, 1, 0, 0.75)
-    return color
+    return settings.colors[defaultKeyColorInsert]
 
-# Remove Something: Red
 def colorRemove():
-    color = getExtensionDefaultColor(defaultKeyColorInsert)
-    if color is None:
-        color = NSColor.colorWithCalibratedRed_green_blue_alpha_(1, 0, 0, 0.5)
-    return color
+    return settings.colors[defaultKeyColorRemove]
 
-# Review Something: Yellow-Orange
 def colorReview():
-    color = getExtensionDefaultColor(defaultKeyColorInsert)
-    if color is None:
-        color = NSColor.colorWithCalibratedRed_green_blue_alpha_(1, 0.7, 0, 0.7)
-    return color
+    return settings.colors[defaultKeyColorReview]
 
 def modifyColorAlpha(color, a):
     r = color.redComponent()
@@ -292,28 +574,6 @@ def modifyColorAlpha(color, a):
 # Orders
 # ------
 
-reportOrder = """
-unicodeValue
-contourCount
-componentMetrics
-ligatureMetrics
-metricsSymmetry
-strayPoints
-smallContours
-openContours
-duplicateContours
-extremePoints
-unnecessaryPoints
-unnecessaryHandles
-overlappingPoints
-pointsNearVerticalMetrics
-complexCurves
-crossedHandles
-unevenHandles
-straightLines
-unsmoothSmooths
-""".strip().splitlines()
-
 drawingOrder = """
 unicodeValue
 contourCount
@@ -327,6 +587,7 @@ crossedHandles
 unsmoothSmooths
 straightLines
 duplicateContours
+touchingContours
 openContours
 extremePoints
 strayPoints
@@ -334,124 +595,191 @@ unnecessaryPoints
 unnecessaryHandles
 unevenHandles
 overlappingPoints
+nearCoincidentPoints
 """.strip().splitlines()
 
 
-# ---------
-# Reporters
-# ---------
+# --------
+# Trackers
+# --------
+
+# Each font that is drawn or tested has a tracker.
+# It keeps the dependency index of the font up to
+# date, destroys the test representations of the
+# glyphs that depend on a changed glyph and lets
+# Test Current Font test only the changed glyphs.
+
+_fontReportTrackers = {}
+
+def getFontReportTracker(font):
+    key = id(font.naked())
+    tracker = _fontReportTrackers.get(key)
+    if tracker is None:
+        from glyphNannyTracker import FontReportTracker
+        # drop the trackers of closed fonts
+        openFonts = set([id(f.naked()) for f in AllFonts()])
+        for otherKey in list(_fontReportTrackers.keys()):
+            if otherKey not in openFonts:
+                _fontReportTrackers.pop(otherKey).close()
+        tracker = _fontReportTrackers[key] = FontReportTracker(font, _getTrackedGlyphReports)
+        naked = font.naked()
+        tracker.addListener(lambda invalid: _destroyTestRepresentations(naked, invalid))
+    return tracker
+
+def _getTrackedGlyphReports(font, glyphNames, testStates):
+    from glyphNannyBatch import iterFontReportParallel
+    from glyphNannyCache import openReportCache
+    cache = openReportCache(font)
+    try:
+        return list(iterFontReportParallel(font, testStates, workers=fontReportWorkers, cache=cache, glyphNames=glyphNames))
+    finally:
+        if cache is not None:
+            cache.close()
+
+def _destroyTestRepresentations(font, invalid):
+    for name, identifiers in invalid.items():
+        if name not in font:
+            continue
+        glyph = font[name]
+        for identifier in identifiers:
+            glyph.destroyRepresentation(testRepresentationKeyStub + identifier)
+
+# -------
+# Factory
+# -------
+
+# Each test is cached as its own representation.
+# The glyph level dependencies declared by the test
+# are mapped to the notifications that destroy the
+# cached result. The results that depend on font
+# level data are destroyed by the font's tracker.
+
+testRepresentationKeyStub = "com.typesupply.GlyphNanny.Test."
+
+dependencyNotifications = {
+    "contours" : ("Glyph.ContoursChanged",),
+    "components" : ("Glyph.ComponentsChanged", "Glyph.ComponentBaseGlyphDataChanged"),
+    "width" : ("Glyph.WidthChanged",),
+    "unicodes" : ("Glyph.UnicodesChanged",),
+    "name" : ("Glyph.NameChanged",)
+}
 
-# Font
+geometryRepresentationKey = "com.typesupply.GlyphNanny.Geometry"
 
-def getFontReport(font, testStates, format=False):
+def GlyphNannyGeometryFactory(glyph, font):
     """
-    Get a report about all glyphs in the font.
+    Representation factory for retrieving the
+    geometry that is shared by the tests.
+    """
+    return GlyphGeometry(glyph)
 
-    testStates should be a dict of the test names
-    and a boolean indicating if they should be
-    executed or not.
+def GlyphNannyTestFactory(glyph, font, identifier=None):
     """
-    results = {}
-    for name in font.glyphOrder:
-        glyph = font[name]
-        report = getGlyphReport(font, glyph, testStates)
-        results[name] = report
-    if format:
-        path = font.path
-        if path is None:
-            path = "Unsaved Font"
-        else:
-            path = os.path.basename(path)
-        path = ("-" * len(path)) + "\n" + path + "\n" + ("-" * len(path))
-        all = [path]
-        for name in font.glyphOrder:
-            report = results[name]
-            l = []
-            for key in reportOrder:
-                data = testRegistry[key]
-                description = data["description"]
-                value = report.get(key)
-                if value:
-                    l.append(description)
-            if l:
-                l.insert(0, "-" * len(name))
-                l.insert(0, name)
-                all.append("\n".join(l))
-        results = "\n\n".join(all)
-    return results
-
-# Glyph
-
-def getGlyphReport(font, glyph, testStates):
+    Representation factory for retrieving
+    the result of a single test.
     """
-    Get a report about the glyph.
+    geometry = glyph.getRepresentation(geometryRepresentationKey)
+    glyph = RGlyph(glyph)
+    return runTest(identifier, glyph, geometry)
+
+def _makeTestFactory(identifier):
+    def factory(glyph, font):
+        return GlyphNannyTestFactory(glyph, font, identifier=identifier)
+    return factory
 
-    testStates should be a dict of the test names
-    and a boolean indicating if they should be
-    executed or not.
+def _getDestructiveNotifications(identifier):
+    notifications = []
+    for dependency in testRegistry[identifier]["dependencies"]:
+        notifications.extend(dependencyNotifications.get(dependency, ()))
+    return notifications
+
+def getCachedGlyphReport(font, glyph, testStates):
+    """
+    Get a report for glyph from the per-test representations.
     """
+    # make sure that changes to the glyphs
+    # this one depends on are noticed
+    getFontReportTracker(font)
+    naked = glyph.naked()
     report = {}
-    for key, data in testRegistry.items():
-        testFunction = data["testFunction"]
-        if testStates.get(key, True):
-            report[key] = testFunction(glyph)
+    for identifier in testRegistry.keys():
+        if testStates.get(identifier, True):
+            report[identifier] = naked.getRepresentation(testRepresentationKeyStub + identifier)
         else:
-            report[key] = None
+            report[identifier] = None
     return report
 
-# Factory
-
-def dictToTuple(d):
-    t = []
-    for k, v in sorted(d.items()):
-        t.append((k, v))
-    return tuple(t)
-
-def tupleToDict(t):
-    d = {}
-    for k, v in t:
-        d[k] = v
-    return d
-
-def GlyphNannyReportFactory(glyph, font, testStates=None):
+def getBudgetedCachedGlyphReport(font, glyph, testStates, budget):
     """
-    Representation factory for retrieving a report.
+    Get a report for glyph from the per-test representations
+    with the tests run from cheapest to most expensive. The
+    cheap tests and the tests with a cached result are always
+    included, the others only until budget seconds have been
+    spent. At least one of them is run so that repeated calls
+    finish the report. The report and a boolean indicating if
+    all tests were included are returned.
     """
-    glyph = RGlyph(glyph)
-    font = glyph.getParent()
-    d = tupleToDict(testStates)
-    return getGlyphReport(font, glyph, d)
+    getFontReportTracker(font)
+    naked = glyph.naked()
+    report = {}
+    complete = True
+    ranTest = False
+    start = time.time()
+    for identifier in getScheduledTestOrder():
+        report[identifier] = None
+        if not testStates.get(identifier, True):
+            continue
+        key = testRepresentationKeyStub + identifier
+        if testRegistry[identifier]["cost"] != "cheap" and not _hasCachedRepresentation(naked, key):
+            if ranTest and time.time() - start > budget:
+                complete = False
+                continue
+            ranTest = True
+        report[identifier] = naked.getRepresentation(key)
+    return report, complete
+
+def _hasCachedRepresentation(glyph, key):
+    if hasattr(glyph, "hasCachedRepresentation"):
+        return glyph.hasCachedRepresentation(key)
+    return False
 
 def _registerFactory():
     # always register if debugging
     # otherwise only register if it isn't registered
-    from defcon import addRepresentationFactory, removeRepresentationFactory
+    import defcon
     from defcon.objects import glyph as _xxxHackGlyph
-    if DEBUG:
-        if "com.typesupply.GlyphNanny.Report" in _xxxHackGlyph._representationFactories:
+    if hasattr(defcon, "registerRepresentationFactory"):
+        registeredFactories = _xxxHackGlyph.Glyph.representationFactories
+    else:
+        registeredFactories = _xxxHackGlyph._representationFactories
+    factories = [(geometryRepresentationKey, GlyphNannyGeometryFactory, dependencyNotifications["contours"])]
+    for identifier in testRegistry.keys():
+        factories.append((testRepresentationKeyStub + identifier, _makeTestFactory(identifier), _getDestructiveNotifications(identifier)))
+    for name, factory, destructiveNotifications in factories:
+        if name in registeredFactories:
+            if not DEBUG:
+                continue
             for font in AllFonts():
                 for glyph in font:
-                    glyph.naked().destroyAllRepresentations()
-            removeRepresentationFactory("com.typesupply.GlyphNanny.Report")
-        addRepresentationFactory("com.typesupply.GlyphNanny.Report", GlyphNannyReportFactory)
-    else:
-        if "com.typesupply.GlyphNanny.Report" not in _xxxHackGlyph._representationFactories:
-            addRepresentationFactory("com.typesupply.GlyphNanny.Report", GlyphNannyReportFactory)
+                    glyph.naked().destroyRepresentation(name)
+            if hasattr(defcon, "unregisterRepresentationFactory"):
+                defcon.unregisterRepresentationFactory(_xxxHackGlyph.Glyph, name)
+            else:
+                defcon.removeRepresentationFactory(name)
+        if hasattr(defcon, "registerRepresentationFactory"):
+            defcon.registerRepresentationFactory(_xxxHackGlyph.Glyph, name, factory, destructiveNotifications=destructiveNotifications)
+        else:
+            # older versions of defcon destroy all
+            # representations on Glyph.Changed
+            defcon.addRepresentationFactory(name, factory)
 
-# -------------
-# Test Registry
-# -------------
 
-testRegistry = {}
+# ----------------
+# Drawing Registry
+# ----------------
 
-def registerTest(identifier=None, level=None, title=None, description=None, testFunction=None, drawingFunction=None):
-    testRegistry[identifier] = dict(
-        level=level,
-        description=description,
-        title=title,
-        testFunction=testFunction,
-        drawingFunction=drawingFunction
-    )
+def registerDrawingFunction(identifier, drawingFunction):
+    testRegistry[identifier]["drawingFunction"] = drawingFunction
 
 
 # -----------------
@@ -472,130 +800,12 @@ def drawTextReport(report, scale, glyph):
         y = 50
         drawString((x, y), text, 16, scale, colorInform(), alignment="left")
 
-# Unicode Value
-
-uniNamePattern = re.compile(
-    "uni"
-    "([0-9A-Fa-f]{4})"
-    "$"
-)
-
-def testUnicodeValue(glyph):
-    """
-    A Unicode value should appear only once per font.
-    """
-    report = []
-    font = glyph.getParent()
-    uni = glyph.unicode
-    name = glyph.name
-    # test for uniXXXX name
-    m = uniNamePattern.match(name)
-    if m is not None:
-        uniFromName = m.group(1)
-        uniFromName = int(uniFromName, 16)
-        if uni != uniFromName:
-            report.append("The Unicode value for this glyph does not match its name.")
-    # test against AGLFN
-    else:
-        expectedUni = AGL2UV.get(name)
-        if expectedUni != uni:
-            report.append("The Unicode value for this glyph may not be correct.")
-    # look for duplicates
-    if uni is not None:
-        duplicates = []
-        for name in sorted(font.keys()):
-            if name == glyph.name:
-                continue
-            other = font[name]
-            if other.unicode == uni:
-                duplicates.append(name)
-        if duplicates:
-            report.append("The Unicode for this glyph is also used by: %s." % " ".join(duplicates))
-    return report
-
-registerTest(
-    identifier="unicodeValue",
-    level="glyph",
-    title="Unicode Value",
-    description="Unicode value may have problems.",
-    testFunction=testUnicodeValue,
-    drawingFunction=None
-)
-
-
-# Contour Count
-
-def testContourCount(glyph):
-    """
-    There shouldn't be too many overlapping contours.
-    """
-    report = []
-    count = len(glyph)
-    test = glyph.copy()
-    test.removeOverlap()
-    if count - len(test) > 2:
-        report.append("This glyph has a unusally high number of overlapping contours.")
-    return report
-
-registerTest(
-    identifier="contourCount",
-    level="glyph",
-    title="Contour Count",
-    description="There are an unusual number of contours.",
-    testFunction=testContourCount,
-    drawingFunction=None
-)
-
-
 # -------------------
 # Metrics Level Tests
 # -------------------
 
 # Ligatures
 
-def testLigatureMetrics(glyph):
-    """
-    Sometimes ligatures should have the same
-    metrics as the glyphs they represent.
-    """
-    font = glyph.getParent()
-    name = glyph.name
-    if "_" not in name:
-        return
-    base = name
-    suffix = None
-    if "." in name:
-        base, suffix = name.split(".", 1)
-    # guess at the ligature parts
-    parts = base.split("_")
-    leftPart = parts[0]
-    rightPart = parts[-1]
-    # try snapping on the suffixes
-    if suffix:
-        if leftPart + "." + suffix in font:
-            leftPart += "." + suffix
-        if rightPart + "." + suffix in font:
-            rightPart += "." + suffix
-    # test
-    left = glyph.leftMargin
-    right = glyph.rightMargin
-    report = dict(leftMessage=None, rightMessage=None, left=left, right=right, width=glyph.width, box=glyph.box)
-    if leftPart not in font:
-        report["leftMessage"] = "Couldn't find the ligature's left component."
-    else:
-        expectedLeft = font[leftPart].leftMargin
-        if left != expectedLeft:
-            report["leftMessage"] = "Left doesn't match the presumed part %s left" % leftPart
-    if rightPart not in font:
-        report["rightMessage"] = "Couldn't find the ligature's right component."
-    else:
-        expectedRight = font[rightPart].rightMargin
-        if right != expectedRight:
-            report["rightMessage"] = "Right doesn't match the presumed part %s right" % rightPart
-    if report["leftMessage"] or report["rightMessage"]:
-        return report
-    return None
-
 def drawLigatureMetrics(data, scale, glyph):
     xMin, yMin, xMax, yMax = data["box"]
     h = (yMax - yMin) / 2.0
@@ -609,7 +819,6 @@ def _drawSideBearingsReport(data, scale, textPosition, color):
     leftMessage = data["leftMessage"]
     rightMessage = data["rightMessage"]
     xMin, yMin, xMax, yMax = data["box"]
-    h = (yMax - yMin) / 2.0
     y = textPosition
     path = NSBezierPath.bezierPath()
     if leftMessage:
@@ -627,121 +836,23 @@ def _drawSideBearingsReport(data, scale, textPosition, color):
         path.lineToPoint_((right, yMax))
         x = max((width, right)) + (5 * scale)
         drawString((x, y), rightMessage, 10, scale, color, alignment="left")
-    color.set()
     path.setLineWidth_(scale)
-    path.stroke()
+    strokePath(path, color)
 
-registerTest(
-    identifier="ligatureMetrics",
-    level="metrics",
-    title="Ligature Side-Bearings",
-    description="The side-bearings don't match the ligature's presumed part metrics.",
-    testFunction=testLigatureMetrics,
-    drawingFunction=drawLigatureMetrics
-)
+registerDrawingFunction("ligatureMetrics", drawLigatureMetrics)
 
 # Components
 
-def testComponentMetrics(glyph):
-    """
-    If components are present, check their base margins.
-    """
-    font = glyph.getParent()
-    components = [c for c in glyph.components if c.baseGlyph in font]
-    # no components
-    if len(components) == 0:
-        return
-    boxes = [c.box for c in components]
-    # a component has no contours
-    if None in boxes:
-        return
-    report = dict(leftMessage=None, rightMessage=None, left=None, right=None, width=glyph.width, box=glyph.box)
-    problem = False
-    if len(components) > 1:
-        # filter marks
-        nonMarks = []
-        markCategories = ("Sk", "Zs", "Lm")
-        for component in components:
-            baseGlyphName = component.baseGlyph
-            category = font.naked().unicodeData.categoryForGlyphName(baseGlyphName, allowPseudoUnicode=True)
-            if category not in markCategories:
-                nonMarks.append(component)
-        if nonMarks:
-            components = nonMarks
-    # order the components from left to right based on their boxes
-    if len(components) > 1:
-        leftComponent, rightComponent = _getXMinMaxComponents(components)
-    else:
-        leftComponent = rightComponent = components[0]
-    expectedLeft = _getComponentBaseMargins(font, leftComponent)[0]
-    expectedRight = _getComponentBaseMargins(font, rightComponent)[1]
-    left = leftComponent.box[0]
-    right = glyph.width - rightComponent.box[2]
-    if left != expectedLeft:
-        problem = True
-        report["leftMessage"] = "%s component left does not match %s left" % (leftComponent.baseGlyph, leftComponent.baseGlyph)
-        report["left"] = left
-    if right != expectedRight:
-        problem = True
-        report["rightMessage"] = "%s component right does not match %s right" % (rightComponent.baseGlyph, rightComponent.baseGlyph)
-        report["right"] = right
-    if problem:
-        return report
-
-def _getComponentBaseMargins(font, component):
-    baseGlyphName = component.baseGlyph
-    baseGlyph = font[baseGlyphName]
-    scale = component.scale[0]
-    left = baseGlyph.leftMargin * scale
-    right = baseGlyph.rightMargin * scale
-    return left, right
-
-def _getXMinMaxComponents(components):
-    minSide = []
-    maxSide = []
-    for component in components:
-        xMin, yMin, xMax, yMax = component.box
-        minSide.append((xMin, component))
-        maxSide.append((xMax, component))
-    o = [
-        min(minSide)[-1],
-        max(maxSide)[-1],
-    ]
-    return o
-
 def drawComponentMetrics(data, scale, glyph):
     xMin, yMin, xMax, yMax = data["box"]
     h = (yMax - yMin) / 2.0
     y = yMax - h - (20 * scale)
     _drawSideBearingsReport(data, scale, y, colorReview())
 
-registerTest(
-    identifier="componentMetrics",
-    level="metrics",
-    title="Component Side-Bearings",
-    description="The side-bearings don't match the component's metrics.",
-    testFunction=testComponentMetrics,
-    drawingFunction=drawComponentMetrics
-)
+registerDrawingFunction("componentMetrics", drawComponentMetrics)
 
 # Symmetry
 
-def testMetricsSymmetry(glyph):
-    """
-    Sometimes glyphs are almost symmetrical, but could be.
-    """
-    left = glyph.leftMargin
-    right = glyph.rightMargin
-    diff = int(round(abs(left - right)))
-    if diff == 1:
-        message = "The side-bearings are 1 unit from being equal."
-    else:
-        message = "The side-bearings are %d units from being equal." % diff
-    data = dict(left=left, right=right, width=glyph.width, message=message)
-    if 0 < diff <= 5:
-        return data
-    return None
-
 def drawMetricsSymmetry(data, scale, glyph):
     color = colorReview()
     left = data["left"]
@@ -762,18 +873,10 @@ def drawMetricsSymmetry(data, scale, glyph):
     path.moveToPoint_((width, 0))
     path.lineToPoint_((width, y * 2))
     path.setLineWidth_(scale)
-    color.set()
-    path.stroke()
+    strokePath(path, color)
     drawString((x, y), message, 10, scale, color, backgroundColor=NSColor.whiteColor())
 
-registerTest(
-    identifier="metricsSymmetry",
-    level="metrics",
-    title="Symmetry",
-    description="The side-bearings are almost equal.",
-    testFunction=testMetricsSymmetry,
-    drawingFunction=drawMetricsSymmetry
-)
+registerDrawingFunction("metricsSymmetry", drawMetricsSymmetry)
 
 
 # -------------------
@@ -782,114 +885,61 @@ registerTest(
 
 # Duplicate Contours
 
-def testDuplicateContours(glyph):
-    """
-    Contours shouldn't be duplicated on each other.
-    """
-    contours = {}
-    for index, contour in enumerate(glyph):
-        contour = contour.copy()
-        contour.autoStartSegment()
-        pen = DigestPointPen()
-        contour.drawPoints(pen)
-        digest = pen.getDigest()
-        if digest not in contours:
-            contours[digest] = []
-        contours[digest].append(index)
-    duplicateContours = []
-    for digest, indexes in contours.items():
-        if len(indexes) > 1:
-            duplicateContours.append(indexes[0])
-    return duplicateContours
-
 def drawDuplicateContours(contours, scale, glyph):
     font = glyph.getParent()
     color = colorRemove()
-    color.set()
     for contourIndex in contours:
         contour = glyph[contourIndex]
         pen = CocoaPen(font)
         contour.draw(pen)
         path = pen.path
         path.setLineWidth_(5 * scale)
-        path.stroke()
+        strokePath(path, color)
         xMin, yMin, xMax, yMax = contour.box
         mid = calcMid((xMin, yMin), (xMax, yMin))
         x, y = mid
         drawString((x, y - (10 * scale)), "Duplicate Contour", 10, scale, color)
 
-registerTest(
-    identifier="duplicateContours",
-    level="contour",
-    title="Duplicate Contours",
-    description="One or more contours are duplicated.",
-    testFunction=testDuplicateContours,
-    drawingFunction=drawDuplicateContours
-)
+registerDrawingFunction("duplicateContours", drawDuplicateContours)
 
-# Small Contours
+# Touching Contours
 
-def testForSmallContours(glyph):
-    """
-    Contours should not have an area less than or equal to 4 units.
-    """
-    smallContours = {}
-    for index, contour in enumerate(glyph):
-        box = contour.box
-        if not box:
-            continue
-        xMin, yMin, xMax, yMax = box
-        w = xMax - xMin
-        h = yMin - yMax
-        area = abs(w * h)
-        if area <= 4:
-            smallContours[index] = contour.box
-    return smallContours
+def drawTouchingContours(contours, scale, glyph):
+    color = colorReview()
+    path = NSBezierPath.bezierPath()
+    d = 16 * scale
+    h = d / 2.0
+    for contourIndex, points in contours.items():
+        for (x, y) in points:
+            r = ((x - h, y - h), (d, d))
+            path.appendBezierPathWithOvalInRect_(r)
+            drawString((x, y - d), "Touching Contour", 10, scale, color)
+    path.setLineWidth_(scale)
+    strokePath(path, color)
+
+registerDrawingFunction("touchingContours", drawTouchingContours)
+
+# Small Contours
 
 def drawSmallContours(contours, scale, glyph):
     color = colorRemove()
-    color.set()
     for contourIndex, box in contours.items():
         xMin, yMin, xMax, yMax = box
         w = xMax - xMin
         h = yMax - yMin
         r = ((xMin, yMin), (w, h))
         r = NSInsetRect(r, -5 * scale, -5 * scale)
-        NSRectFillUsingOperation(r, NSCompositeSourceOver)
+        fillRect(r, color)
         x = xMin + (w / 2)
         y = yMin - (10 * scale)
         drawString((x, y), "Tiny Contour", 10, scale, color)
 
-registerTest(
-    identifier="smallContours",
-    level="contour",
-    title="Small Contours",
-    description="One or more contours are suspiciously small.",
-    testFunction=testForSmallContours,
-    drawingFunction=drawSmallContours
-)
+registerDrawingFunction("smallContours", drawSmallContours)
 
 # Open Contours
 
-def testForOpenContours(glyph):
-    """
-    Contours should be closed.
-    """
-    openContours = {}
-    for index, contour in enumerate(glyph):
-        if not contour.open:
-            continue
-        start = contour[0].onCurve
-        start = (start.x, start.y)
-        end = contour[-1].onCurve
-        end = (end.x, end.y)
-        if start != end:
-            openContours[index] = (start, end)
-    return openContours
-
 def drawOpenContours(contours, scale, glyph):
     color = colorInsert()
-    color.set()
     for contourIndex, points in contours.items():
         start, end = points
         mid = calcMid(start, end)
@@ -898,36 +948,13 @@ def drawOpenContours(contours, scale, glyph):
         path.lineToPoint_(end)
         path.setLineWidth_(scale)
         path.setLineDash_count_phase_([4], 1, 0.0)
-        path.stroke()
+        strokePath(path, color)
         drawString(mid, "Open Contour", 10, scale, color, backgroundColor=NSColor.whiteColor())
 
-registerTest(
-    identifier="openContours",
-    level="contour",
-    title="Open Contours",
-    description="One or more contours are not properly closed.",
-    testFunction=testForOpenContours,
-    drawingFunction=drawOpenContours
-)
+registerDrawingFunction("openContours", drawOpenContours)
 
 # Extreme Points
 
-def testForExtremePoints(glyph):
-    """
-    Points should be at the extrema.
-    """
-    pointsAtExtrema = {}
-    for index, contour in enumerate(glyph):
-        dummy = glyph.copy()
-        dummy.clear()
-        dummy.appendContour(contour)
-        dummy.extremePoints()
-        testPoints = _getOnCurves(dummy[0])
-        points = _getOnCurves(contour)
-        if points != testPoints:
-            pointsAtExtrema[index] = testPoints - points
-    return pointsAtExtrema
-
 def drawExtremePoints(contours, scale, glyph):
     color = colorInsert()
     path = NSBezierPath.bezierPath()
@@ -943,50 +970,18 @@ def drawExtremePoints(contours, scale, glyph):
             path.moveToPoint_((x, y - h + o))
             path.lineToPoint_((x, y + h - o))
             drawString((x, y - (16 * scale)), "Insert Point", 10, scale, color)
-    color.set()
     path.setLineWidth_(scale)
-    path.stroke()
+    strokePath(path, color)
 
-registerTest(
-    identifier="extremePoints",
-    level="contour",
-    title="Extreme Points",
-    description="One or more curves need an extreme point.",
-    testFunction=testForExtremePoints,
-    drawingFunction=drawExtremePoints
-)
+registerDrawingFunction("extremePoints", drawExtremePoints)
 
 
 # -------------------
 # Segment Level Tests
 # -------------------
 
-def testForStraightLines(glyph):
-    """
-    Lines shouldn't be just shy of vertical or horizontal.
-    """
-    straightLines = {}
-    for index, contour in enumerate(glyph):
-        prev = _unwrapPoint(contour[-1].onCurve)
-        for segment in contour:
-            point = _unwrapPoint(segment.onCurve)
-            if segment.type == "line":
-                x = abs(prev[0] - point[0])
-                y = abs(prev[1] - point[1])
-                if x > 0 and x <= 5:
-                    if index not in straightLines:
-                        straightLines[index] = set()
-                    straightLines[index].add((prev, point))
-                if y > 0 and y <= 5:
-                    if index not in straightLines:
-                        straightLines[index] = set()
-                    straightLines[index].add((prev, point))
-            prev = point
-    return straightLines
-
 def drawStraightLines(contours, scale, glyph):
     color = colorReview()
-    color.set()
     for contourIndex, segments in contours.items():
         for segment in segments:
             xs = []
@@ -1002,69 +997,12 @@ def drawStraightLines(contours, scale, glyph):
             h = yMax - yMin
             r = ((xMin, yMin), (w, h))
             r = NSInsetRect(r, -2 * scale, -2 * scale)
-            NSRectFillUsingOperation(r, NSCompositeSourceOver)
+            fillRect(r, color)
 
-registerTest(
-    identifier="straightLines",
-    level="segment",
-    title="Straight Lines",
-    description="One or more lines is a few units from being horizontal or vertical.",
-    testFunction=testForStraightLines,
-    drawingFunction=drawStraightLines
-)
+registerDrawingFunction("straightLines", drawStraightLines)
 
 # Segments Near Vertical Metrics
 
-def testForSegmentsNearVerticalMetrics(glyph):
-    """
-    Points shouldn't be just off a vertical metric.
-    """
-    font = glyph.getParent()
-    verticalMetrics = {
-        0 : set()
-    }
-    for attr in "descender xHeight capHeight ascender".split(" "):
-        value = getattr(font.info, attr)
-        verticalMetrics[value] = set()
-    for contour in glyph:
-        sequence = None
-        # test the last segment to start the sequence
-        pt = _unwrapPoint(contour[-1].onCurve)
-        near, currentMetric = _testPointNearVerticalMetrics(pt, verticalMetrics)
-        if near:
-            sequence = set()
-        # test them all
-        for segment in contour:
-            pt = _unwrapPoint(segment.onCurve)
-            near, metric = _testPointNearVerticalMetrics(pt, verticalMetrics)
-            # hit on the same metric as the previous point
-            if near and sequence is not None and metric == currentMetric:
-                sequence.add(pt)
-            else:
-                # existing sequence, note it if needed, clear it
-                if sequence:
-                    if len(sequence) > 1:
-                        verticalMetrics[currentMetric] |= sequence
-                sequence = None
-                currentMetric = None
-                # hit, make a new sequence
-                if near:
-                    sequence = set()
-                    currentMetric = metric
-                    sequence.add(pt)
-    for verticalMetric, points in verticalMetrics.items():
-        if not points:
-            del verticalMetrics[verticalMetric]
-    return verticalMetrics
-
-def _testPointNearVerticalMetrics(pt, verticalMetrics):
-    y = pt[1]
-    for v in verticalMetrics:
-        d = abs(v - y)
-        if d != 0 and d <= 5:
-            return True, v
-    return False, None
-
 def drawSegmentsNearVericalMetrics(verticalMetrics, scale, glyph):
     color = colorReview()
     path = NSBezierPath.bezierPath()
@@ -1084,91 +1022,31 @@ def drawSegmentsNearVericalMetrics(verticalMetrics, scale, glyph):
                 xMax = x
         path.moveToPoint_((xMin, verticalMetric))
         path.lineToPoint_((xMax, verticalMetric))
-    color.set()
     path.setLineWidth_(4 * scale)
-    path.stroke()
+    strokePath(path, color)
 
-registerTest(
-    identifier="pointsNearVerticalMetrics",
-    level="segment",
-    title="Near Vertical Metrics",
-    description="Two or more points are just off a vertical metric.",
-    testFunction=testForSegmentsNearVerticalMetrics,
-    drawingFunction=drawSegmentsNearVericalMetrics
-)
+registerDrawingFunction("pointsNearVerticalMetrics", drawSegmentsNearVericalMetrics)
 
 # Unsmooth Smooths
 
-def testUnsmoothSmooths(glyph):
-    """
-    Smooth segments should have bcps in the right places.
-    """
-    unsmoothSmooths = {}
-    for index, contour in enumerate(glyph):
-        prev = contour[-1]
-        for segment in contour:
-            if prev.type == "curve" and segment.type == "curve":
-                if prev.smooth:
-                    angle1 = _calcAngle(prev.offCurve[1], prev.onCurve, r=0)
-                    angle2 = _calcAngle(prev.onCurve, segment.offCurve[0], r=0)
-                    if angle1 != angle2:
-                        if index not in unsmoothSmooths:
-                            unsmoothSmooths[index] = []
-                        pt1 = _unwrapPoint(prev.offCurve[1])
-                        pt2 = _unwrapPoint(prev.onCurve)
-                        pt3 = _unwrapPoint(segment.offCurve[0])
-                        unsmoothSmooths[index].append((pt1, pt2, pt3))
-            prev = segment
-    return unsmoothSmooths
-
 def drawUnsmoothSmooths(contours, scale, glyph):
     color = colorReview()
-    color.set()
     for contourIndex, points in contours.items():
         path = NSBezierPath.bezierPath()
         for pt1, pt2, pt3 in points:
             path.moveToPoint_(pt1)
             path.lineToPoint_(pt3)
-            path.setLineWidth_(2 * scale)
-            path.stroke()
             x, y = pt2
             drawString((x, y - (10 * scale)), "Unsmooth Smooth", 10, scale, color, backgroundColor=NSColor.whiteColor())
+        path.setLineWidth_(2 * scale)
+        strokePath(path, color)
 
-registerTest(
-    identifier="unsmoothSmooths",
-    level="segment",
-    title="Unsmooth Smooths",
-    description="One or more smooth points do not have handles that are properly placed.",
-    testFunction=testUnsmoothSmooths,
-    drawingFunction=drawUnsmoothSmooths
-)
+registerDrawingFunction("unsmoothSmooths", drawUnsmoothSmooths)
 
 # Complex Curves
 
-def testForComplexCurves(glyph):
-    """
-    S curves are suspicious.
-    """
-    impliedS = {}
-    for index, contour in enumerate(glyph):
-        prev = _unwrapPoint(contour[-1].onCurve)
-        for segment in contour:
-            if segment.type == "curve":
-                pt0 = prev
-                pt1, pt2 = [_unwrapPoint(p) for p in segment.offCurve]
-                pt3 = _unwrapPoint(segment.onCurve)
-                line1 = (pt0, pt3)
-                line2 = (pt1, pt2)
-                if _intersectLines(line1, line2):
-                    if index not in impliedS:
-                        impliedS[index] = []
-                    impliedS[index].append((prev, pt1, pt2, pt3))
-            prev = _unwrapPoint(segment.onCurve)
-    return impliedS
-
 def drawComplexCurves(contours, scale, glyph):
     color = colorReview()
-    color.set()
     for contourIndex, segments in contours.items():
         for segment in segments:
             pt0, pt1, pt2, pt3 = segment
@@ -1177,80 +1055,18 @@ def drawComplexCurves(contours, scale, glyph):
             path.curveToPoint_controlPoint1_controlPoint2_(pt3, pt1, pt2)
             path.setLineWidth_(3 * scale)
             path.setLineCapStyle_(NSRoundLineCapStyle)
-            path.stroke()
+            strokePath(path, color)
             mid = ftBezierTools.splitCubicAtT(pt0, pt1, pt2, pt3, 0.5)[0][-1]
             drawString(mid, "Complex Curve", 10, scale, color, backgroundColor=NSColor.whiteColor())
 
-registerTest(
-    identifier="complexCurves",
-    level="segment",
-    title="Complex Curves",
-    description="One or more curves is suspiciously complex.",
-    testFunction=testForComplexCurves,
-    drawingFunction=drawComplexCurves
-)
+registerDrawingFunction("complexCurves", drawComplexCurves)
 
 # Crossed Handles
 
-def testForCrossedHandles(glyph):
-    """
-    Handles shouldn't intersect.
-    """
-    crossedHandles = {}
-    for index, contour in enumerate(glyph):
-        pt0 = _unwrapPoint(contour[-1].onCurve)
-        for segment in contour:
-            pt3 = _unwrapPoint(segment.onCurve)
-            if segment.type == "curve":
-                pt1, pt2 = [_unwrapPoint(p) for p in segment.offCurve]
-                # direct intersection
-                direct = _intersectLines((pt0, pt1), (pt2, pt3))
-                if direct:
-                    if index not in crossedHandles:
-                        crossedHandles[index] = []
-                    crossedHandles[index].append(dict(points=(pt0, pt1, pt2, pt3), intersection=direct))
-                # indirect intersection
-                else:
-                    while 1:
-                        # bcp1 = ray, bcp2 = segment
-                        angle = _calcAngle(pt0, pt1)
-                        if angle in (0, 180.0):
-                            t1 = (pt0[0] + 1000, pt0[1])
-                            t2 = (pt0[0] - 1000, pt0[1])
-                        else:
-                            yOffset = _getAngleOffset(angle, 1000)
-                            t1 = (pt0[0] + 1000, pt0[1] + yOffset)
-                            t2 = (pt0[0] - 1000, pt0[1] - yOffset)
-                        indirect = _intersectLines((t1, t2), (pt2, pt3))
-                        if indirect:
-                            if index not in crossedHandles:
-                                crossedHandles[index] = []
-                            crossedHandles[index].append(dict(points=(pt0, indirect, pt2, pt3), intersection=indirect))
-                            break
-                        # bcp1 = segment, bcp2 = ray
-                        angle = _calcAngle(pt3, pt2)
-                        if angle in (90.0, 270.0):
-                            t1 = (pt3[0], pt3[1] + 1000)
-                            t2 = (pt3[0], pt3[1] - 1000)
-                        else:
-                            yOffset = _getAngleOffset(angle, 1000)
-                            t1 = (pt3[0] + 1000, pt3[1] + yOffset)
-                            t2 = (pt3[0] - 1000, pt3[1] - yOffset)
-                        indirect = _intersectLines((t1, t2), (pt0, pt1))
-                        if indirect:
-                            if index not in crossedHandles:
-                                crossedHandles[index] = []
-                            crossedHandles[index].append(dict(points=(pt0, pt1, indirect, pt3), intersection=indirect))
-                            break
-                        break
-            pt0 = pt3
-    return crossedHandles
-
 def drawCrossedHandles(contours, scale, glyph):
     d = 10 * scale
     h = d / 2.0
     color = colorReview()
-    color.set()
     for contourIndex, segments in contours.items():
         for segment in segments:
             pt1, pt2, pt3, pt4 = segment["points"]
@@ -1266,49 +1082,16 @@ def drawCrossedHandles(contours, scale, glyph):
             path2.appendBezierPathWithOvalInRect_(r)
             path1.setLineWidth_(3 * scale)
             path1.setLineCapStyle_(NSRoundLineCapStyle)
-            path1.stroke()
-            path2.fill()
+            strokePath(path1, color)
+            fillPath(path2, color)
             drawString((x, y - (12 * scale)), "Crossed Handles", 10, scale, color, backgroundColor=NSColor.whiteColor())
 
-registerTest(
-    identifier="crossedHandles",
-    level="segment",
-    title="Crossed Handles",
-    description="One or more curves contain crossed handles.",
-    testFunction=testForCrossedHandles,
-    drawingFunction=drawCrossedHandles
-)
+registerDrawingFunction("crossedHandles", drawCrossedHandles)
 
 # Unnecessary Handles
 
-def testForUnnecessaryHandles(glyph):
-    """
-    Handles shouldn't be used if they aren't doing anything.
-    """
-    unnecessaryHandles = {}
-    for index, contour in enumerate(glyph):
-        prevPoint = contour[-1].onCurve
-        for segment in contour:
-            if segment.type == "curve":
-                pt0 = prevPoint
-                pt1, pt2 = segment.offCurve
-                pt3 = segment.onCurve
-                lineAngle = _calcAngle(pt0, pt3, 0)
-                bcpAngle1 = bcpAngle2 = None
-                if (pt0.x, pt0.y) != (pt1.x, pt1.y):
-                    bcpAngle1 = _calcAngle(pt0, pt1, 0)
-                if (pt2.x, pt2.y) != (pt3.x, pt3.y):
-                    bcpAngle2 = _calcAngle(pt2, pt3, 0)
-                if bcpAngle1 == lineAngle and bcpAngle2 == lineAngle:
-                    if index not in unnecessaryHandles:
-                        unnecessaryHandles[index] = []
-                    unnecessaryHandles[index].append((_unwrapPoint(pt1), _unwrapPoint(pt2)))
-            prevPoint = segment.onCurve
-    return unnecessaryHandles
-
 def drawUnnecessaryHandles(contours, scale, glyph):
     color = colorRemove()
-    color.set()
     d = 10 * scale
     h = d / 2.0
     for contourIndex, points in contours.items():
@@ -1318,95 +1101,27 @@ def drawUnnecessaryHandles(contours, scale, glyph):
             path1.moveToPoint_(bcp1)
             path1.lineToPoint_(bcp2)
             path1.setLineWidth_(3 * scale)
-            path1.stroke()
+            strokePath(path1, color)
             # dots
             path2 = NSBezierPath.bezierPath()
             for (x, y) in (bcp1, bcp2):
                 r = ((x - h, y - h), (d, d))
                 path2.appendBezierPathWithOvalInRect_(r)
             path2.setLineWidth_(scale)
-            path2.stroke()
+            strokePath(path2, color)
             # text
             mid = calcMid(bcp1, bcp2)
             drawString(mid, "Unnecessary Handles", 10, scale, color, backgroundColor=NSColor.whiteColor())
 
-registerTest(
-    identifier="unnecessaryHandles",
-    level="segment",
-    title="Unnecessary Handles",
-    description="One or more curves has unnecessary handles.",
-    testFunction=testForUnnecessaryHandles,
-    drawingFunction=drawUnnecessaryHandles
-)
+registerDrawingFunction("unnecessaryHandles", drawUnnecessaryHandles)
 
 # Uneven Handles
 
-def testForUnevenHandles(glyph):
-    """
-    Handles should share the workload as evenly as possible.
-    """
-    unevenHandles = {}
-    for index, contour in enumerate(glyph):
-        prevPoint = contour[-1].onCurve
-        for segment in contour:
-            if segment.type == "curve":
-                # create rays perpendicular to the
-                # angle between the on and off
-                # through the on
-                on1 = _unwrapPoint(prevPoint)
-                off1, off2 = [_unwrapPoint(pt) for pt in segment.offCurve]
-                on2 = _unwrapPoint(segment.onCurve)
-                curve = (on1, off1, off2, on2)
-                off1Angle = _calcAngle(on1, off1) - 90
-                on1Ray = _createLineThroughPoint(on1, off1Angle)
-                off2Angle = _calcAngle(off2, on2) - 90
-                on2Ray = _createLineThroughPoint(on2, off2Angle)
-                # find the intersection of the rays
-                rayIntersection = _intersectLines(on1Ray, on2Ray)
-                if rayIntersection is not None:
-                    # draw a line between the off curves and the intersection
-                    # and find out where these lines intersect the curve
-                    off1Intersection = _getLineCurveIntersection((off1, rayIntersection), curve)
-                    off2Intersection = _getLineCurveIntersection((off2, rayIntersection), curve)
-                    if off1Intersection is not None and off2Intersection is not None:
-                        if off1Intersection.points and off2Intersection.points:
-                            off1IntersectionPoint = (off1Intersection.points[0].x, off1Intersection.points[0].y)
-                            off2IntersectionPoint = (off2Intersection.points[0].x, off2Intersection.points[0].y)
-                            # assemble the off curves and their intersections into lines
-                            off1Line = (off1, off1IntersectionPoint)
-                            off2Line = (off2, off2IntersectionPoint)
-                            # measure and compare these
-                            # if they are not both very short calculate the ratio
-                            length1, length2 = sorted((_getLineLength(*off1Line), _getLineLength(*off2Line)))
-                            if length1 >= 3 and length2 >= 3:
-                                ratio = length2 / float(length1)
-                                # if outside acceptable range, flag
-                                if ratio > 1.5:
-                                    off1Shape = _getUnevenHandleShape(on1, off1, off2, on2, off1Intersection, on1, off1IntersectionPoint, off1)
-                                    off2Shape = _getUnevenHandleShape(on1, off1, off2, on2, off2Intersection, off2IntersectionPoint, on2, off2)
-                                    if index not in unevenHandles:
-                                        unevenHandles[index] = []
-                                    unevenHandles[index].append((off1, off2, off1Shape, off2Shape))
-            prevPoint = segment.onCurve
-    return unevenHandles
-
-def _getUnevenHandleShape(pt0, pt1, pt2, pt3, intersection, start, end, off):
-    splitSegments = ftBezierTools.splitCubicAtT(pt0, pt1, pt2, pt3, *intersection.t)
-    curves = []
-    for segment in splitSegments:
-        if _roundPoint(segment[0]) != _roundPoint(start) and not curves:
-            continue
-        curves.append(segment[1:])
-        if _roundPoint(segment[-1]) == _roundPoint(end):
-            break
-    return curves + [off, start]
-
 def drawUnevenHandles(contours, scale, glyph):
     strokeColor = colorReview()
     fillColor = modifyColorAlpha(strokeColor, 0.15)
     for index, groups in contours.items():
         for off1, off2, shape1, shape2 in groups:
-            fillColor.set()
             path = NSBezierPath.bezierPath()
             for shape in (shape1, shape2):
                 path.moveToPoint_(shape[-1])
@@ -1415,24 +1130,16 @@ def drawUnevenHandles(contours, scale, glyph):
                     path.curveToPoint_controlPoint1_controlPoint2_(pt3, pt1, pt2)
                 path.lineToPoint_(shape[-2])
                 path.lineToPoint_(shape[-1])
-            path.fill()
-            strokeColor.set()
+            fillPath(path, fillColor)
             path = NSBezierPath.bezierPath()
             path.moveToPoint_(off1)
             path.lineToPoint_(off2)
             path.setLineWidth_(scale)
-            path.stroke()
+            strokePath(path, strokeColor)
             mid = calcMid(off1, off2)
             drawString(mid, "Uneven Handles", 10, scale, strokeColor, backgroundColor=NSColor.whiteColor())
 
-registerTest(
-    identifier="unevenHandles",
-    level="segment",
-    title="Uneven Handles",
-    description="One or more curves has uneven handles.",
-    testFunction=testForUnevenHandles,
-    drawingFunction=drawUnevenHandles
-)
+registerDrawingFunction("unevenHandles", drawUnevenHandles)
 
 # -----------------
 # Point Level Tests
@@ -1440,18 +1147,6 @@ registerTest(
 
 # Stray Points
 
-def testForStrayPoints(glyph):
-    """
-    There should be no stray points.
-    """
-    strayPoints = {}
-    for index, contour in enumerate(glyph):
-        if len(contour) == 1:
-            pt = contour[0].onCurve
-            pt = (pt.x, pt.y)
-            strayPoints[index] = pt
-    return strayPoints
-
 def drawStrayPoints(contours, scale, glyph):
     color = colorRemove()
     path = NSBezierPath.bezierPath()
@@ -1461,40 +1156,13 @@ def drawStrayPoints(contours, scale, glyph):
         r = ((x - h, y - h), (d, d))
         path.appendBezierPathWithOvalInRect_(r)
         drawString((x, y - d), "Stray Point", 10, scale, color)
-    color.set()
     path.setLineWidth_(scale)
-    path.stroke()
+    strokePath(path, color)
 
-registerTest(
-    identifier="strayPoints",
-    level="point",
-    title="Stray Points",
-    description="One or more stray points are present.",
-    testFunction=testForStrayPoints,
-    drawingFunction=drawStrayPoints
-)
+registerDrawingFunction("strayPoints", drawStrayPoints)
 
 # Unnecessary Points
 
-def testForUnnecessaryPoints(glyph):
-    """
-    Consecutive segments shouldn't have the same angle.
-    """
-    unnecessaryPoints = {}
-    for index, contour in enumerate(glyph):
-        for segmentIndex, segment in enumerate(contour):
-            if segment.type == "line":
-                prevSegment = contour[segmentIndex - 1]
-                nextSegment = contour[(segmentIndex + 1) % len(contour)]
-                if nextSegment.type == "line":
-                    thisAngle = _calcAngle(prevSegment.onCurve, segment.onCurve)
-                    nextAngle = _calcAngle(segment.onCurve, nextSegment.onCurve)
-                    if thisAngle == nextAngle:
-                        if index not in unnecessaryPoints:
-                            unnecessaryPoints[index] = []
-                        unnecessaryPoints[index].append(_unwrapPoint(segment.onCurve))
-    return unnecessaryPoints
-
 def drawUnnecessaryPoints(contours, scale, glyph):
     color = colorRemove()
     path = NSBezierPath.bezierPath()
@@ -1503,39 +1171,13 @@ def drawUnnecessaryPoints(contours, scale, glyph):
             drawDeleteMark(pt, scale, path)
             x, y = pt
             drawString((x, y - (10 * scale)), "Unnecessary Point", 10, scale, color)
-    color.set()
     path.setLineWidth_(2 * scale)
-    path.stroke()
+    strokePath(path, color)
 
-registerTest(
-    identifier="unnecessaryPoints",
-    level="point",
-    title="Unnecessary Points",
-    description="One or more unnecessary points are present in lines.",
-    testFunction=testForUnnecessaryPoints,
-    drawingFunction=drawUnnecessaryPoints
-)
+registerDrawingFunction("unnecessaryPoints", drawUnnecessaryPoints)
 
 # Overlapping Points
 
-def testForOverlappingPoints(glyph):
-    """
-    Consequtive points should not overlap.
-    """
-    overlappingPoints = {}
-    for index, contour in enumerate(glyph):
-        if len(contour) == 1:
-            continue
-        prev = _unwrapPoint(contour[-1].onCurve)
-        for segment in contour:
-            point = _unwrapPoint(segment.onCurve)
-            if point == prev:
-                if index not in overlappingPoints:
-                    overlappingPoints[index] = set()
-                overlappingPoints[index].add(point)
-            prev = point
-    return overlappingPoints
-
 def drawOverlappingPoints(contours, scale, glyph):
     color = colorRemove()
     path = NSBezierPath.bezierPath()
@@ -1549,100 +1191,29 @@ def drawOverlappingPoints(contours, scale, glyph):
             r = ((x - q, y - d + q), (d, d))
             path.appendBezierPathWithOvalInRect_(r)
             drawString((x, y - (12 * scale)), "Overlapping Points", 10, scale, color)
-    color.set()
-    path.fill()
+    fillPath(path, color)
 
-registerTest(
-    identifier="overlappingPoints",
-    level="point",
-    title="Overlapping Points",
-    description="Two or more points are overlapping.",
-    testFunction=testForOverlappingPoints,
-    drawingFunction=drawOverlappingPoints
-)
+registerDrawingFunction("overlappingPoints", drawOverlappingPoints)
 
+# Near Coincident Points
 
-# --------------
-# Test Utilities
-# --------------
+def drawNearCoincidentPoints(pairs, scale, glyph):
+    color = colorReview()
+    path = NSBezierPath.bezierPath()
+    d = 8 * scale
+    h = d / 2.0
+    for pt1, pt2 in pairs:
+        for (x, y) in (pt1, pt2):
+            r = ((x - h, y - h), (d, d))
+            path.appendBezierPathWithOvalInRect_(r)
+        mid = calcMid(pt1, pt2)
+        x, y = mid
+        drawString((x, y - (12 * scale)), "Near Points", 10, scale, color)
+    path.setLineWidth_(scale)
+    strokePath(path, color)
 
-def _getOnCurves(contour):
-    points = set()
-    for segement in contour:
-        pt = segement.onCurve
-        points.add((pt.x, pt.y))
-    return points
-
-def _unwrapPoint(pt):
-    return pt.x, pt.y
-
-def _roundPoint(pt):
-    return round(pt[0]), round(pt[1])
-
-def _intersectLines((a1, a2), (b1, b2)):
-    # adapted from: http://www.kevlindev.com/gui/math/intersection/Intersection.js
-    ua_t = (b2[0] - b1[0]) * (a1[1] - b1[1]) - (b2[1] - b1[1]) * (a1[0] - b1[0])
-    ub_t = (a2[0] - a1[0]) * (a1[1] - b1[1]) - (a2[1] - a1[1]) * (a1[0] - b1[0])
-    u_b  = (b2[1] - b1[1]) * (a2[0] - a1[0]) - (b2[0] - b1[0]) * (a2[1] - a1[1])
-    if u_b != 0:
-        ua = ua_t / float(u_b)
-        ub = ub_t / float(u_b)
-        if 0 <= ua and ua <= 1 and 0 <= ub and ub <= 1:
-            return a1[0] + ua * (a2[0] - a1[0]), a1[1] + ua * (a2[1] - a1[1])
-        else:
-            return None
-    else:
-        return None
+registerDrawingFunction("nearCoincidentPoints", drawNearCoincidentPoints)
 
-def _calcAngle(point1, point2, r=None):
-    if not isinstance(point1, tuple):
-        point1 = _unwrapPoint(point1)
-    if not isinstance(point2, tuple):
-        point2 = _unwrapPoint(point2)
-    width = point2[0] - point1[0]
-    height = point2[1] - point1[1]
-    angle = round(math.atan2(height, width) * 180 / math.pi, 3)
-    if r is not None:
-        angle = round(angle, r)
-    return angle
-
-def _getAngleOffset(angle, distance):
-    A = 90
-    B = angle
-    C = 180 - (A + B)
-    if C == 0:
-        return 0
-    c = distance
-    A = math.radians(A)
-    B = math.radians(B)
-    C = math.radians(C)
-    b = (c * math.sin(B)) / math.sin(C)
-    return round(b, 5)
-
-def _createLineThroughPoint(pt, angle):
-    angle = math.radians(angle)
-    length = 100000
-    x1 = math.cos(angle) * -length + pt[0]
-    y1 = math.sin(angle) * -length + pt[1]
-    x2 = math.cos(angle) * length + pt[0]
-    y2 = math.sin(angle) * length + pt[1]
-    return (x1, y1), (x2, y2)
-
-def _getLineLength(pt1, pt2):
-    return math.hypot(pt1[0] - pt2[0], pt1[1] - pt2[1])
-
-def _getAreaOfTriangle(pt1, pt2, pt3):
-    a = _getLineLength(pt1, pt2)
-    b = _getLineLength(pt2, pt3)
-    c = _getLineLength(pt3, pt1)
-    s = (a + b + c) / 2.0
-    area = math.sqrt(s * (s - a) * (s - b) * (s - c))
-    return area
-
-def _getLineCurveIntersection(line, curve):
-    points = curve + line
-    intersection = rfBezierTools.intersectCubicLine(*points)
-    return intersection
 
 # -----------------
 # Drawing Utilities
@@ -1661,23 +1232,180 @@ def drawDeleteMark(pt, scale, path):
     path.lineToPoint_((x2, y1))
 
 def drawString(pt, text, size, scale, color, alignment="center", backgroundColor=None):
-    attributes = attributes = {
-        NSFontAttributeName : NSFont.fontWithName_size_("Lucida Grande", size * scale),
-        NSForegroundColorAttributeName : color
-    }
-    if backgroundColor is not None:
-        text = " " + text + " "
-        attributes[NSBackgroundColorAttributeName] = backgroundColor
-    text = NSAttributedString.alloc().initWithString_attributes_(text, attributes)
+    text, width, height = getLabel(text, size * scale, color, backgroundColor)
     x, y = pt
     if alignment == "center":
-        width, height = text.size()
         x -= width / 2.0
         y -= height / 2.0
     elif alignment == "right":
-        width, height = text.size()
         x -= width
-    text.drawAtPoint_((x, y))
+    if _displayList is not None:
+        _displayList.append(("label", text, (x, y)), (x, y, x + width, y + height))
+    else:
+        text.drawAtPoint_((x, y))
+
+def strokePath(path, color):
+    if _displayList is not None:
+        (x, y), (w, h) = path.bounds()
+        d = path.lineWidth() / 2.0
+        _displayList.append(("stroke", path, color), (x - d, y - d, x + w + d, y + h + d))
+    else:
+        color.set()
+        path.stroke()
+
+def fillPath(path, color):
+    if _displayList is not None:
+        (x, y), (w, h) = path.bounds()
+        _displayList.append(("fill", path, color), (x, y, x + w, y + h))
+    else:
+        color.set()
+        path.fill()
+
+def fillRect(rect, color):
+    if _displayList is not None:
+        (x, y), (w, h) = rect
+        _displayList.append(("rect", rect, color), (x, y, x + w, y + h))
+    else:
+        color.set()
+        NSRectFillUsingOperation(rect, NSCompositeSourceOver)
+
+def getVisibleRect():
+    """
+    Get the part of the current graphics context that
+    needs to be drawn, in glyph units, as a
+    (xMin, yMin, xMax, yMax) tuple.
+    """
+    try:
+        from Quartz import CGContextGetClipBoundingBox
+    except ImportError:
+        return None
+    context = NSGraphicsContext.currentContext()
+    if context is None:
+        return None
+    (x, y), (w, h) = CGContextGetClipBoundingBox(context.graphicsPort())
+    return (x, y, x + w, y + h)
+
+# Label Cache
+# The attributed strings and their sizes are
+# kept for the most recently used labels.
+
+_labelCache = OrderedDict()
+_labelCacheSize = 500
+
+def getLabel(text, pointSize, color, backgroundColor=None):
+    """
+    Get an attributed string and its width and
+    height for text drawn at pointSize in color.
+    """
+    key = (text, pointSize, getColorKey(color), getColorKey(backgroundColor))
+    label = _labelCache.pop(key, None)
+    if label is None:
+        attributes = {
+            NSFontAttributeName : NSFont.fontWithName_size_("Lucida Grande", pointSize),
+            NSForegroundColorAttributeName : color
+        }
+        if backgroundColor is not None:
+            text = " " + text + " "
+            attributes[NSBackgroundColorAttributeName] = backgroundColor
+        text = NSAttributedString.alloc().initWithString_attributes_(text, attributes)
+        width, height = text.size()
+        label = (text, width, height)
+        if len(_labelCache) >= _labelCacheSize:
+            _labelCache.popitem(last=False)
+    _labelCache[key] = label
+    return label
+
+def clearLabelCache():
+    _labelCache.clear()
+
+# Display Lists
+# While a display list is being recorded the
+# drawing utilities add primitives to it
+# instead of drawing.
+
+_displayList = None
+
+class DisplayList(object):
+
+    """
+    Ready made paths and labels for a report along
+    with the bounds of each of them.
+    """
+
+    def __init__(self):
+        self.primitives = []
+        self.bounds = []
+
+    def append(self, primitive, bounds):
+        self.primitives.append(primitive)
+        self.bounds.append(bounds)
+
+    def draw(self, visibleRect=None, showLabels=True):
+        """
+        Draw the primitives. Anything outside of
+        visibleRect is skipped. The labels are
+        skipped if showLabels is False.
+        """
+        labels = []
+        for primitive, bounds in zip(self.primitives, self.bounds):
+            if visibleRect is not None and not _rectsIntersect(bounds, visibleRect):
+                continue
+            if primitive[0] == "label":
+                if not showLabels:
+                    continue
+                # draw the labels after all of the paths
+                if batchLabelDrawing:
+                    labels.append(primitive)
+                    continue
+            _drawPrimitive(*primitive)
+        for primitive in labels:
+            _drawPrimitive(*primitive)
+
+def _rectsIntersect(rect1, rect2):
+    xMin1, yMin1, xMax1, yMax1 = rect1
+    xMin2, yMin2, xMax2, yMax2 = rect2
+    return xMin1 <= xMax2 and xMin2 <= xMax1 and yMin1 <= yMax2 and yMin2 <= yMax1
+
+def _drawPrimitive(primitiveType, obj, data):
+    if primitiveType == "label":
+        obj.drawAtPoint_(data)
+    elif primitiveType == "stroke":
+        data.set()
+        obj.stroke()
+    elif primitiveType == "fill":
+        data.set()
+        obj.fill()
+    elif primitiveType == "rect":
+        data.set()
+        NSRectFillUsingOperation(obj, NSCompositeSourceOver)
+
+def getScaleBucket(scale):
+    """
+    Round scale to one of eight steps per doubling.
+    The drawing is recorded at this scale.
+    """
+    if scale <= 0:
+        return scale
+    return 2 ** (round(math.log(scale, 2) * 8) / 8.0)
+
+def recordReport(report, scale, glyph):
+    """
+    Record the drawing of a report into a DisplayList.
+    """
+    global _displayList
+    displayList = DisplayList()
+    _displayList = displayList
+    try:
+        for key in drawingOrder:
+            data = report.get(key)
+            if data:
+                drawingFunction = testRegistry[key]["drawingFunction"]
+                if drawingFunction is not None:
+                    drawingFunction(data, scale, glyph)
+        drawTextReport(report, scale, glyph)
+    finally:
+        _displayList = None
+    return displayList
 
 def calcMid(pt1, pt2):
     x1, y1 = pt1
@@ -1694,8 +1422,8 @@ if __name__ == "__main__":
     # sanity check to make sure that the tests are consistently registered
     assert set(reportOrder) == set(testRegistry.keys())
     assert set(drawingOrder) == set(testRegistry.keys())
-    # register the defaults
-    registerGlyphNannyDefaults()
+    # register and load the defaults
+    settings.load()
     # boot the observer
     glyphNannyObserver = GlyphNannyObserver()
     # if debugging, kill any instances of this observer that are already running
@@ -0,0 +1,282 @@
+import multiprocessing
+import defcon
+import glyphNannyCore
+import glyphNannyNumpy
+from glyphNannyCache import getGlyphReportKey, ReportCache
+try:
+    from fontParts.fontshell import RFont
+except ImportError:
+    # RoboFont 1 provides RGlyph as a builtin
+    RFont = None
+
+# ---------
+# Font Data
+# ---------
+
+fontInfoAttributes = "unitsPerEm descender xHeight capHeight ascender".split(" ")
+
+class PlainDataPointPen(object):
+
+    """
+    A point pen that records an outline
+    as lists of tuples that can be pickled.
+    """
+
+    def __init__(self):
+        self.contours = []
+        self.components = []
+        self._contour = None
+
+    def beginPath(self, **kwargs):
+        self._contour = []
+
+    def addPoint(self, pt, segmentType=None, smooth=False, name=None, **kwargs):
+        self._contour.append((tuple(pt), segmentType, smooth, name))
+
+    def endPath(self):
+        self.contours.append(self._contour)
+        self._contour = None
+
+    def addComponent(self, baseGlyphName, transformation, **kwargs):
+        self.components.append((baseGlyphName, tuple(transformation)))
+
+
+def serializeFont(font):
+    """
+    Serialize the parts of font that the tests
+    look at into plain data.
+    """
+    info = {}
+    for attr in fontInfoAttributes:
+        info[attr] = getattr(font.info, attr)
+    glyphs = []
+    for name in font.keys():
+        glyph = font[name]
+        pen = PlainDataPointPen()
+        glyph.drawPoints(pen)
+        glyphs.append(dict(
+            name=name,
+            width=glyph.width,
+            unicodes=list(glyph.unicodes),
+            contours=pen.contours,
+            components=pen.components
+        ))
+    return dict(info=info, glyphs=glyphs)
+
+def deserializeFont(data):
+    """
+    Build a defcon font from data created by serializeFont.
+    """
+    font = defcon.Font()
+    for attr, value in data["info"].items():
+        setattr(font.info, attr, value)
+    for glyphData in data["glyphs"]:
+        glyph = font.newGlyph(glyphData["name"])
+        glyph.width = glyphData["width"]
+        glyph.unicodes = glyphData["unicodes"]
+        pen = glyph.getPointPen()
+        for contour in glyphData["contours"]:
+            pen.beginPath()
+            for pt, segmentType, smooth, name in contour:
+                pen.addPoint(pt, segmentType=segmentType, smooth=smooth, name=name)
+            pen.endPath()
+        for baseGlyphName, transformation in glyphData["components"]:
+            pen.addComponent(baseGlyphName, transformation)
+    return font
+
+# -------
+# Workers
+# -------
+
+_workerFont = None
+
+def _initializeWorker(fontData):
+    global _workerFont
+    _workerFont = deserializeFont(fontData)
+    if RFont is not None:
+        _workerFont = RFont(_workerFont)
+
+def _testGlyphs(args):
+    glyphNames, testStates = args
+    if RFont is not None:
+        return getGlyphReports(_workerFont, glyphNames, testStates)
+    results = []
+    for name in glyphNames:
+        glyph = RGlyph(_workerFont[name])
+        font = glyph.getParent()
+        report = glyphNannyCore.getGlyphReport(font, glyph, testStates)
+        results.append((name, report))
+    return results
+
+def _initializeLazyWorker(path, cachePath):
+    global _workerFont, _workerCache
+    _workerFont = defcon.Font(path)
+    if RFont is not None:
+        _workerFont = RFont(_workerFont)
+    _workerCache = None
+    if cachePath is not None:
+        _workerCache = ReportCache(cachePath)
+
+def _testGlyphsLazy(args):
+    glyphNames, testStates = args
+    if RFont is None:
+        font = RGlyph(_workerFont[glyphNames[0]]).getParent()
+    else:
+        font = _workerFont
+    keys = {}
+    reports = {}
+    if _workerCache is not None:
+        for name in glyphNames:
+            keys[name] = getGlyphReportKey(font, font[name], testStates)
+            report = _workerCache.get(name, keys[name])
+            if report is not None:
+                reports[name] = report
+    untested = [name for name in glyphNames if name not in reports]
+    tested = set(untested)
+    if RFont is not None:
+        reports.update(getGlyphReports(font, untested, testStates))
+    else:
+        reports.update(_testGlyphs((untested, testStates)))
+    return [(name, keys.get(name), reports[name], name in tested) for name in glyphNames]
+
+def getGlyphReports(font, glyphNames, testStates):
+    """
+    Get a list of (glyph name, report) pairs for
+    glyphNames. The segment tests are batched if
+    NumPy is available.
+    """
+    if glyphNannyNumpy.available:
+        reports = glyphNannyNumpy.getGlyphReports(font, glyphNames, testStates)
+    else:
+        reports = [glyphNannyCore.getGlyphReport(font, font[name], testStates) for name in glyphNames]
+    return list(zip(glyphNames, reports))
+
+# ------
+# Engine
+# ------
+
+def getFontReportParallel(font, testStates, format=False, workers=None, chunkSize=25, cache=None):
+    """
+    Get a report about all glyphs in the font
+    with the tests spread across a pool of
+    worker processes.
+
+    The arguments and the return value are the
+    same as getFontReport. workers is the number
+    of processes to use. If it is None, one
+    process per CPU will be used. If it is 1, the
+    glyphs are tested in this process. Use this
+    inside an application, where forking is not
+    safe. chunkSize is
+    the number of glyphs sent to a worker at once.
+    cache is an optional glyphNannyCache.ReportCache.
+    Glyphs with a stored report for their current
+    key are not tested again.
+    """
+    results = {}
+    for name, report in iterFontReportParallel(font, testStates, workers=workers, chunkSize=chunkSize, cache=cache):
+        results[name] = report
+    if format:
+        results = glyphNannyCore.formatFontReport(font, results)
+    return results
+
+def iterFontReportParallel(font, testStates, workers=None, chunkSize=25, cache=None, glyphNames=None):
+    """
+    Yield (glyph name, report) pairs in glyph order
+    as soon as the workers have finished them. If
+    glyphNames is given only those glyphs are tested.
+    """
+    glyphOrder = glyphNannyCore.getGlyphOrder(font)
+    if glyphNames is not None:
+        glyphNames = set(glyphNames)
+        glyphOrder = [name for name in glyphOrder if name in glyphNames]
+    keys = {}
+    cached = {}
+    if cache is not None:
+        for name in glyphOrder:
+            key = getGlyphReportKey(font, font[name], testStates)
+            report = cache.get(name, key)
+            if report is None:
+                keys[name] = key
+            else:
+                cached[name] = report
+    tested = _iterTestedGlyphs(font, [name for name in glyphOrder if name not in cached], testStates, workers, chunkSize)
+    for name in glyphOrder:
+        if name in cached:
+            yield name, cached[name]
+            continue
+        testedName, report = next(tested)
+        if cache is not None:
+            cache.set(name, keys[name], report)
+        yield name, report
+    if cache is not None:
+        cache.commit()
+
+def _iterTestedGlyphs(font, glyphNames, testStates, workers, chunkSize):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers < 2 or len(glyphNames) <= chunkSize:
+        for i in range(0, len(glyphNames), chunkSize):
+            for name, report in getGlyphReports(font, glyphNames[i:i + chunkSize], testStates):
+                yield name, report
+        return
+    fontData = serializeFont(font)
+    chunks = []
+    for i in range(0, len(glyphNames), chunkSize):
+        chunks.append((glyphNames[i:i + chunkSize], testStates))
+    pool = multiprocessing.Pool(workers, _initializeWorker, (fontData,))
+    try:
+        for chunk in pool.imap(_testGlyphs, chunks):
+            for name, report in chunk:
+                yield name, report
+    finally:
+        # terminate rather than close so that a
+        # consumer that stops early doesn't wait
+        # for the remaining chunks
+        pool.terminate()
+        pool.join()
+
+# -------------
+# Lazy Scanning
+# -------------
+
+def iterFontReportLazy(font, testStates, workers=None, chunkSize=25, maxLoadedGlyphs=1000, cache=None):
+    """
+    Yield (glyph name, report) pairs in glyph order
+    without loading the whole font into memory.
+
+    font must be saved and unmodified. The workers
+    open the UFO from font.path and read the glyphs
+    from disk as they test them. Each worker is
+    replaced after it has tested about maxLoadedGlyphs
+    glyphs so that the glyphs that it loaded are
+    released. Memory use is bounded by the number of
+    workers times maxLoadedGlyphs glyphs, plus the
+    glyphs they reference through components and
+    ligature parts. The glyphs are never loaded in
+    this process.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, workers)
+    glyphOrder = glyphNannyCore.getGlyphOrder(font)
+    chunkSize = max(1, min(chunkSize, maxLoadedGlyphs))
+    chunks = []
+    for i in range(0, len(glyphOrder), chunkSize):
+        chunks.append((glyphOrder[i:i + chunkSize], testStates))
+    cachePath = None
+    if cache is not None:
+        cachePath = cache.path
+    tasksPerWorker = max(1, maxLoadedGlyphs // chunkSize)
+    pool = multiprocessing.Pool(workers, _initializeLazyWorker, (font.path, cachePath), maxtasksperchild=tasksPerWorker)
+    try:
+        for chunk in pool.imap(_testGlyphsLazy, chunks):
+            for name, key, report, tested in chunk:
+                if cache is not None and tested:
+                    cache.set(name, key, report)
+                yield name, report
+    finally:
+        pool.terminate()
+        pool.join()
+    if cache is not None:
+        cache.commit()
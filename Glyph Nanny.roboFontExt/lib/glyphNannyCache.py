@@ -0,0 +1,200 @@
+import os
+import json
+import hashlib
+import sqlite3
+from glyphNannyCore import testRegistry, getTestContext, DigestPointPen, _getBounds
+
+# Increase this if the way reports are
+# stored or keyed changes.
+cacheFormatVersion = 3
+
+# ---
+# Key
+# ---
+
+def getGlyphReportKey(font, glyph, testStates):
+    """
+    Get a digest of everything that the report for
+    glyph depends on: the outline, the metrics, the
+    font level data that the tests in testStates
+    depend on and the versions of those tests.
+    """
+    pen = DigestPointPen()
+    glyph.drawPoints(pen)
+    bounds = _getBounds(glyph)
+    if bounds is not None:
+        bounds = tuple(bounds)
+    data = (
+        cacheFormatVersion,
+        glyph.name,
+        glyph.width,
+        tuple(glyph.unicodes),
+        bounds,
+        glyph.leftMargin,
+        glyph.rightMargin,
+        pen.getDigest(),
+        _getFontContext(font, glyph, testStates),
+        _getTestVersions(testStates)
+    )
+    return hashlib.sha1(repr(data).encode("utf-8")).hexdigest()
+
+def _getFontContext(font, glyph, testStates):
+    context = []
+    for identifier in sorted(testRegistry.keys()):
+        if testStates.get(identifier, True):
+            context.append(getTestContext(font, glyph, identifier))
+    return tuple(context)
+
+def _getTestVersions(testStates):
+    versions = []
+    for identifier, data in sorted(testRegistry.items()):
+        if testStates.get(identifier, True):
+            versions.append((identifier, data["version"]))
+    return tuple(versions)
+
+# -----
+# Cache
+# -----
+
+def getReportCachePath(font):
+    """
+    Get the path of the report cache that
+    is stored next to the font's UFO. None
+    is returned if the font is not saved.
+    """
+    path = font.path
+    if path is None:
+        return None
+    path = os.path.normpath(path)
+    return path + ".glyphNanny.sqlite"
+
+
+class ReportCache(object):
+
+    """
+    A SQLite store for glyph reports. One report
+    is kept per glyph along with the key it was
+    computed for. Call commit after storing reports.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS reports (glyphName TEXT PRIMARY KEY, key TEXT, report TEXT)"
+        )
+
+    def get(self, glyphName, key):
+        """
+        Get the report for glyphName. None is returned
+        if there is no report stored for key.
+        """
+        row = self._connection.execute(
+            "SELECT key, report FROM reports WHERE glyphName = ?", (glyphName,)
+        ).fetchone()
+        if row is None or row[0] != key:
+            return None
+        try:
+            return decodeReport(row[1])
+        except (TypeError, ValueError, RuntimeError):
+            # anyone can put a cache next to a UFO, so
+            # anything unexpected is treated as missing
+            return None
+
+    def set(self, glyphName, key, report):
+        data = encodeReport(report)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO reports (glyphName, key, report) VALUES (?, ?, ?)", (glyphName, key, data)
+        )
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+
+def openReportCache(font):
+    """
+    Open the report cache for font. None is
+    returned if the font is not saved.
+    """
+    path = getReportCachePath(font)
+    if path is None:
+        return None
+    return ReportCache(path)
+
+# --------
+# Encoding
+# --------
+
+# Reports are stored as JSON. JSON arrays are lists
+# and the other containers are objects with a single
+# key: "t" for tuples, "s" for sets and "d" for dicts
+# as a list of [key, value] pairs. Reports are never
+# pickled, since unpickling a cache that came with a
+# UFO could run any code.
+
+_scalarTypes = (type(None), bool, int, float, type(u""), type(""))
+try:
+    _scalarTypes += (long,)
+except NameError:
+    pass
+
+def encodeReport(report):
+    """
+    Encode a glyph report as JSON text.
+    """
+    return json.dumps(_encodeValue(report), separators=(",", ":"))
+
+def decodeReport(text):
+    """
+    Decode a glyph report made by encodeReport.
+    ValueError is raised if the text is not a
+    report of registered tests.
+    """
+    report = _decodeValue(json.loads(text))
+    if not isinstance(report, dict):
+        raise ValueError("The report is not a dict.")
+    for identifier in report.keys():
+        if identifier not in testRegistry:
+            raise ValueError("Unknown test in report: %r" % (identifier,))
+    return report
+
+def _encodeValue(value):
+    if isinstance(value, _scalarTypes):
+        return value
+    if isinstance(value, list):
+        return [_encodeValue(item) for item in value]
+    if isinstance(value, tuple):
+        return dict(t=[_encodeValue(item) for item in value])
+    if isinstance(value, (set, frozenset)):
+        return dict(s=[_encodeValue(item) for item in value])
+    if isinstance(value, dict):
+        return dict(d=[[_encodeValue(key), _encodeValue(item)] for key, item in value.items()])
+    raise TypeError("Can't store %r in a report." % (value,))
+
+def _decodeValue(value):
+    if isinstance(value, _scalarTypes):
+        return value
+    if isinstance(value, list):
+        return [_decodeValue(item) for item in value]
+    if not isinstance(value, dict) or len(value) != 1:
+        raise ValueError("Unknown value in report.")
+    tag, items = list(value.items())[0]
+    if not isinstance(items, list):
+        raise ValueError("Unknown value in report.")
+    if tag == "t":
+        return tuple([_decodeValue(item) for item in items])
+    if tag == "s":
+        # unhashable items raise TypeError
+        return set([_decodeValue(item) for item in items])
+    if tag == "d":
+        result = {}
+        for pair in items:
+            if not isinstance(pair, list) or len(pair) != 2:
+                raise ValueError("Unknown value in report.")
+            result[_decodeValue(pair[0])] = _decodeValue(pair[1])
+        return result
+    raise ValueError("Unknown value in report.")
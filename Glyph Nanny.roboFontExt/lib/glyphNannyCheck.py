@@ -0,0 +1,156 @@
+"""
+Run the Glyph Nanny tests on UFOs from the command line.
+
+    python glyphNannyCheck.py MyFont-Regular.ufo MyFont-Bold.ufo
+
+The report for each glyph is written as soon as it
+is ready. The output can be text, CSV or the
+structured records of glyphNannyRecords as JSON
+Lines or binary data.
+
+With --max-glyphs the UFOs are read glyph by glyph
+in worker processes that are replaced after testing
+that many glyphs, so that large collections of UFOs
+can be checked with little memory.
+
+With --duplicate-contours the tests are not run.
+Instead, the contours that have the same shape in
+more than one glyph, and could be components, are
+listed.
+
+The exit code is 0 if nothing was found, 1 if one
+or more glyphs have problems and 2 if the arguments
+or a UFO could not be read.
+"""
+
+import os
+import sys
+import json
+import argparse
+import glyphNannyCore
+from glyphNannyBatch import iterFontReportParallel, iterFontReportLazy
+from glyphNannyCache import openReportCache
+from glyphNannyOutput import reportSinks, binaryReportFormats, getReportSink, writeFontReport
+
+
+def getTestStates(tests=None, skip=None, testStatesPath=None):
+    """
+    Build a testStates dict in the same form as the
+    one stored in the extension defaults.
+    """
+    testStates = {}
+    for identifier in glyphNannyCore.testRegistry.keys():
+        testStates[identifier] = True
+    if testStatesPath is not None:
+        with open(testStatesPath, "r") as f:
+            testStates.update(json.load(f))
+    if tests:
+        for identifier in testStates.keys():
+            testStates[identifier] = identifier in tests
+    if skip:
+        for identifier in skip:
+            testStates[identifier] = False
+    return testStates
+
+def checkFont(font, testStates, sink, workers=None, cache=None, maxLoadedGlyphs=None):
+    """
+    Test font and write the results to sink. The
+    number of glyphs with problems is returned.
+    If maxLoadedGlyphs is given, the font is tested
+    with iterFontReportLazy.
+    """
+    if maxLoadedGlyphs is None:
+        reports = iterFontReportParallel(font, testStates, workers=workers, cache=cache)
+    else:
+        reports = iterFontReportLazy(font, testStates, workers=workers, maxLoadedGlyphs=maxLoadedGlyphs, cache=cache)
+    return writeFontReport(font, reports, sink)
+
+def writeFontDuplicateContours(font, stream):
+    """
+    Write the contours that have the same shape
+    in more than one glyph as text. The number
+    of shapes that were found is returned.
+    """
+    groups = glyphNannyCore.getFontDuplicateContours(font)
+    stream.write(glyphNannyCore.formatFontTitle(font) + "\n")
+    for contours in groups:
+        stream.write("\n")
+        for glyphName, index, (x, y) in contours:
+            stream.write("%s contour %d at %s, %s\n" % (glyphName, index, _formatNumber(x), _formatNumber(y)))
+    stream.write("\n")
+    stream.flush()
+    return len(groups)
+
+def _formatNumber(value):
+    if value == int(value):
+        return str(int(value))
+    return str(value)
+
+def _parseIdentifiers(value):
+    identifiers = [i.strip() for i in value.split(",") if i.strip()]
+    for identifier in identifiers:
+        if identifier not in glyphNannyCore.testRegistry:
+            raise argparse.ArgumentTypeError("unknown test: %s" % identifier)
+    return identifiers
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run the Glyph Nanny tests on UFOs.")
+    parser.add_argument("paths", metavar="UFO", nargs="*", help="UFOs to test.")
+    parser.add_argument("--tests", type=_parseIdentifiers, help="Comma separated list of the only tests to run.")
+    parser.add_argument("--skip", type=_parseIdentifiers, help="Comma separated list of tests not to run.")
+    parser.add_argument("--test-states", dest="testStatesPath", help="JSON file with a test identifier to boolean mapping.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to one per CPU.")
+    parser.add_argument("--format", choices=sorted(reportSinks.keys()), default="text", help="Output format. Defaults to text.")
+    parser.add_argument("--max-glyphs", dest="maxLoadedGlyphs", type=int, default=None, help="Read the glyphs from disk as they are tested and keep at most about this many in memory per worker process.")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="Don't read or write the report cache stored next to each UFO.")
+    parser.add_argument("--duplicate-contours", dest="duplicateContours", action="store_true", help="Instead of running the tests, list the contours that have the same shape in more than one glyph.")
+    parser.add_argument("--list-tests", dest="listTests", action="store_true", help="List the available tests and exit.")
+    args = parser.parse_args(args)
+
+    if args.listTests:
+        for identifier in glyphNannyCore.reportOrder:
+            sys.stdout.write("%s: %s\n" % (identifier, glyphNannyCore.testRegistry[identifier]["title"]))
+        return 0
+    if not args.paths:
+        parser.error("no UFOs were given")
+    if args.duplicateContours and args.format != "text":
+        parser.error("--duplicate-contours can only be used with the text format")
+
+    from fontParts.world import OpenFont
+
+    testStates = getTestStates(args.tests, args.skip, args.testStatesPath)
+    stream = sys.stdout
+    if args.format in binaryReportFormats:
+        stream = getattr(sys.stdout, "buffer", sys.stdout)
+    sink = getReportSink(args.format, stream)
+    exitCode = 0
+    for path in args.paths:
+        if not os.path.exists(path):
+            sys.stderr.write("%s does not exist.\n" % path)
+            exitCode = 2
+            continue
+        try:
+            font = OpenFont(path, showInterface=False)
+        except Exception as e:
+            sys.stderr.write("%s could not be read: %s\n" % (path, e))
+            exitCode = 2
+            continue
+        if args.duplicateContours:
+            if writeFontDuplicateContours(font, sys.stdout) and exitCode == 0:
+                exitCode = 1
+            font.close()
+            continue
+        cache = None
+        if args.cache:
+            cache = openReportCache(font)
+        problems = checkFont(font, testStates, sink, workers=args.workers, cache=cache, maxLoadedGlyphs=args.maxLoadedGlyphs)
+        if cache is not None:
+            cache.close()
+        font.close()
+        if problems and exitCode == 0:
+            exitCode = 1
+    return exitCode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2159 @@
+"""
+The Glyph Nanny tests. This module does not depend
+on AppKit or RoboFont so the tests can be run
+anywhere. Glyphs are expected to follow the fontParts
+(RoboFab) API.
+"""
+
+import os
+import re
+import math
+import threading
+from collections import namedtuple, OrderedDict
+from fontTools.misc import bezierTools as ftBezierTools
+from fontTools.agl import AGL2UV
+from fontTools.pens.areaPen import AreaPen
+from fontTools.pens.basePen import decomposeQuadraticSegment
+from glyphNannyProfiler import profiler
+try:
+    from robofab.pens.digestPen import DigestPointPen
+except ImportError:
+    from fontPens.digestPointPen import DigestPointPen
+
+# ------
+# Orders
+# ------
+
+reportOrder = """
+unicodeValue
+contourCount
+componentMetrics
+ligatureMetrics
+metricsSymmetry
+strayPoints
+smallContours
+openContours
+duplicateContours
+touchingContours
+extremePoints
+unnecessaryPoints
+unnecessaryHandles
+overlappingPoints
+nearCoincidentPoints
+pointsNearVerticalMetrics
+complexCurves
+crossedHandles
+unevenHandles
+straightLines
+unsmoothSmooths
+""".strip().splitlines()
+
+
+# ---------
+# Reporters
+# ---------
+
+# Font
+
+def getFontReport(font, testStates, format=False):
+    """
+    Get a report about all glyphs in the font.
+
+    testStates should be a dict of the test names
+    and a boolean indicating if they should be
+    executed or not.
+    """
+    results = {}
+    for name, report in iterFontReport(font, testStates):
+        results[name] = report
+    if format:
+        results = formatFontReport(font, results)
+    return results
+
+def iterFontReport(font, testStates):
+    """
+    Yield (glyph name, report) pairs for all
+    glyphs in the font in glyphOrder.
+    """
+    for name in getGlyphOrder(font):
+        glyph = font[name]
+        yield name, getGlyphReport(font, glyph, testStates)
+
+def getGlyphOrder(font):
+    """
+    Get the names of the glyphs in the font in
+    glyphOrder. Names in the glyphOrder that are
+    not in the font are skipped and glyphs that
+    are not in the glyphOrder are added at the end.
+    """
+    glyphOrder = [name for name in font.glyphOrder if name in font]
+    remaining = set(font.keys()) - set(glyphOrder)
+    return glyphOrder + sorted(remaining)
+
+def formatFontReport(font, results):
+    """
+    Format the results of getFontReport as text.
+    """
+    all = [formatFontTitle(font)]
+    for name in getGlyphOrder(font):
+        text = formatGlyphReport(name, results[name])
+        if text:
+            all.append(text)
+    return "\n\n".join(all)
+
+def formatFontTitle(font):
+    path = font.path
+    if path is None:
+        path = "Unsaved Font"
+    else:
+        path = os.path.basename(path)
+    return ("-" * len(path)) + "\n" + path + "\n" + ("-" * len(path))
+
+def formatGlyphReport(name, report):
+    """
+    Format a glyph report as text. If none
+    of the tests found anything, None is returned.
+    """
+    l = [testRegistry[key]["description"] for key in getReportProblems(report)]
+    if not l:
+        return None
+    l.insert(0, "-" * len(name))
+    l.insert(0, name)
+    return "\n".join(l)
+
+def getReportProblems(report):
+    """
+    Get the identifiers of the tests that found
+    something in a glyph report in reportOrder.
+    """
+    return [key for key in reportOrder if report.get(key)]
+
+# Glyph
+
+def getGlyphReport(font, glyph, testStates, geometry=None):
+    """
+    Get a report about the glyph.
+
+    testStates should be a dict of the test names
+    and a boolean indicating if they should be
+    executed or not. geometry is an optional
+    GlyphGeometry for the glyph.
+    """
+    if geometry is None:
+        geometry = GlyphGeometry(glyph)
+    report = {}
+    for key in testRegistry.keys():
+        if testStates.get(key, True):
+            report[key] = runTest(key, glyph, geometry)
+        else:
+            report[key] = None
+    return report
+
+def runTest(identifier, glyph, geometry):
+    """
+    Run the test identifier on glyph. The run
+    is timed if the profiler is enabled.
+    """
+    testFunction = testRegistry[identifier]["testFunction"]
+    if not profiler.enabled:
+        return testFunction(glyph, geometry)
+    start = profiler.clock()
+    result = testFunction(glyph, geometry)
+    profiler.record(identifier, glyph.name, profiler.clock() - start, result)
+    return result
+
+# Test States
+
+def dictToTuple(d):
+    t = []
+    for k, v in sorted(d.items()):
+        t.append((k, v))
+    return tuple(t)
+
+def tupleToDict(t):
+    d = {}
+    for k, v in t:
+        d[k] = v
+    return d
+
+
+# --------
+# Geometry
+# --------
+
+class GlyphGeometry(object):
+
+    """
+    A snapshot of a glyph's contours that is built
+    with a single pass over the outline and shared
+    by all of the tests in a report.
+
+    The segments of all contours are stored in flat
+    lists. For each segment there is the type, the
+    on-curve point, a tuple of the off-curve points
+    leading up to it and the smooth flag. Segments
+    are in the same order as iterating the contours
+    of the glyph. contourOffsets has the index of the
+    first segment of each contour plus the number of
+    segments at the end.
+    """
+
+    __slots__ = [
+        "segmentTypes",
+        "onCurves",
+        "offCurves",
+        "smooth",
+        "contourOffsets",
+        "contourOpen",
+        "_contourBounds",
+        "_contourClockwise",
+        "_spatialGrid"
+    ]
+
+    def __init__(self, glyph):
+        pen = _GeometryPointPen(self)
+        glyph.drawPoints(pen)
+        self._contourBounds = None
+        self._contourClockwise = None
+        self._spatialGrid = None
+
+    def _get_contourCount(self):
+        return len(self.contourOffsets) - 1
+
+    contourCount = property(_get_contourCount)
+
+    def getContourRange(self, index):
+        """
+        Get the start and end segment index of a contour.
+        """
+        return self.contourOffsets[index], self.contourOffsets[index + 1]
+
+    def getContourBounds(self, index):
+        """
+        Get the bounds of a contour. None is
+        returned if the contour is empty.
+        """
+        if self._contourBounds is None:
+            self._contourBounds = [_calcSegmentsBounds(self, i) for i in range(self.contourCount)]
+        return self._contourBounds[index]
+
+    def isClockwise(self, index):
+        if self._contourClockwise is None:
+            self._contourClockwise = [_calcSegmentsArea(self, i) < 0 for i in range(self.contourCount)]
+        return self._contourClockwise[index]
+
+    def getContourFingerprint(self, index, relative=False):
+        """
+        Get a hashable description of a contour that
+        doesn't depend on which point the contour
+        starts at. Closed contours start at the
+        segment that gives the lexicographically
+        smallest sequence of segments. If relative is
+        True the points are relative to the bottom
+        left of the contour's points so that the same
+        shape in different places is the same.
+        """
+        start, end = self.getContourRange(index)
+        dx = dy = 0
+        if relative and start != end:
+            dx, dy = _getSegmentsPointBounds(self, index)[:2]
+        if dx or dy:
+            onCurves = [(x - dx, y - dy) for x, y in self.onCurves[start:end]]
+            offCurves = [tuple([(x - dx, y - dy) for x, y in points]) for points in self.offCurves[start:end]]
+        else:
+            onCurves = self.onCurves[start:end]
+            offCurves = self.offCurves[start:end]
+        segmentTypes = [segmentType or "" for segmentType in self.segmentTypes[start:end]]
+        segments = list(zip(onCurves, segmentTypes, offCurves, self.smooth[start:end]))
+        isOpen = self.contourOpen[index]
+        if segments and not isOpen:
+            # the smallest rotation starts at the
+            # smallest on curve if there is only one
+            onCurves = [segment[0] for segment in segments]
+            first = min(onCurves)
+            if onCurves.count(first) == 1:
+                startIndex = onCurves.index(first)
+            else:
+                startIndex = _getLeastRotation(segments)
+            segments = segments[startIndex:] + segments[:startIndex]
+        return isOpen, tuple(segments)
+
+    def getSpatialGrid(self):
+        """
+        Get a SpatialGrid of the on-curve points and
+        the segments. It is built the first time it
+        is needed and then shared by the tests.
+        """
+        if self._spatialGrid is None:
+            self._spatialGrid = SpatialGrid(self)
+        return self._spatialGrid
+
+    def getDigest(self):
+        """
+        Get a hashable description of the outline.
+        """
+        return (
+            tuple(self.segmentTypes),
+            tuple(self.onCurves),
+            tuple(self.offCurves),
+            tuple(self.contourOffsets)
+        )
+
+
+class _GeometryPointPen(object):
+
+    """
+    Collect points into a GlyphGeometry. The points are
+    grouped into segments the same way that fontParts
+    groups them.
+    """
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        geometry.segmentTypes = []
+        geometry.onCurves = []
+        geometry.offCurves = []
+        geometry.smooth = []
+        geometry.contourOffsets = [0]
+        geometry.contourOpen = []
+        self._points = None
+
+    def beginPath(self, **kwargs):
+        self._points = []
+
+    def addPoint(self, pt, segmentType=None, smooth=False, name=None, **kwargs):
+        if segmentType == "offCurve":
+            segmentType = None
+        self._points.append((tuple(pt), segmentType, smooth))
+
+    def endPath(self):
+        points = self._points
+        self._points = None
+        geometry = self.geometry
+        isOpen = bool(points) and points[0][1] == "move"
+        segments = [[]]
+        lastWasOffCurve = False
+        for point in points:
+            segments[-1].append(point)
+            if point[1] is not None:
+                segments.append([])
+            lastWasOffCurve = point[1] is None
+        if not segments[-1]:
+            del segments[-1]
+        if lastWasOffCurve and isOpen:
+            # ignore trailing off curves
+            del segments[-1]
+        if lastWasOffCurve and not isOpen and len(segments) > 1:
+            segment = segments.pop(-1)
+            segment.extend(segments[0])
+            del segments[0]
+            segments.append(segment)
+        if points and not lastWasOffCurve and not isOpen:
+            segment = segments.pop(0)
+            segments.append(segment)
+        for segment in segments:
+            onCurve, segmentType, smooth = segment[-1]
+            geometry.segmentTypes.append(segmentType)
+            geometry.onCurves.append(onCurve)
+            geometry.offCurves.append(tuple([pt for pt, t, s in segment[:-1]]))
+            geometry.smooth.append(smooth)
+        geometry.contourOffsets.append(len(geometry.onCurves))
+        geometry.contourOpen.append(isOpen)
+
+    def addComponent(self, baseGlyphName, transformation, **kwargs):
+        pass
+
+
+def _getLeastRotation(items):
+    # Booth's algorithm: the index that the smallest
+    # rotation of items starts at in linear time
+    items = items + items
+    failure = [-1] * len(items)
+    k = 0
+    for j in range(1, len(items)):
+        item = items[j]
+        i = failure[j - k - 1]
+        while i != -1 and item != items[k + i + 1]:
+            if item < items[k + i + 1]:
+                k = j - i - 1
+            i = failure[i]
+        if item != items[k + i + 1]:
+            if item < items[k]:
+                k = j
+            failure[j - k] = -1
+        else:
+            failure[j - k] = i + 1
+    return k
+
+# The number of levels of nested components
+# that are followed into their base glyphs.
+maxComponentDepth = 10
+
+def _getComponentGeometries(glyph, maxDepth=maxComponentDepth):
+    """
+    Get a GlyphGeometry of the outline of each
+    component, transformed into the glyph.
+    """
+    if not len(glyph.components):
+        return []
+    font = _getFont(glyph)
+    if font is None:
+        return []
+    return [GlyphGeometry(_ComponentOutline(font, component, maxDepth)) for component in glyph.components]
+
+
+class _ComponentOutline(object):
+
+    """
+    Draw the decomposed outline of a component.
+    """
+
+    def __init__(self, font, component, maxDepth):
+        self.font = font
+        self.baseGlyph = component.baseGlyph
+        self.transformation = tuple(component.transformation)
+        self.maxDepth = maxDepth
+
+    def drawPoints(self, pen):
+        pen = _DecomposingPointPen(self.font, pen, self.maxDepth)
+        pen.addComponent(self.baseGlyph, self.transformation)
+
+
+class _DecomposingPointPen(object):
+
+    """
+    Pass the points to another point pen with a
+    transformation and replace the components with
+    the outlines of their base glyphs.
+    """
+
+    def __init__(self, font, outPen, depth, transformation=(1, 0, 0, 1, 0, 0)):
+        self.font = font
+        self.outPen = outPen
+        self.depth = depth
+        self.transformation = transformation
+
+    def beginPath(self, **kwargs):
+        self.outPen.beginPath()
+
+    def endPath(self):
+        self.outPen.endPath()
+
+    def addPoint(self, pt, segmentType=None, smooth=False, name=None, **kwargs):
+        xx, xy, yx, yy, dx, dy = self.transformation
+        x, y = pt
+        self.outPen.addPoint((xx * x + yx * y + dx, xy * x + yy * y + dy), segmentType, smooth, name)
+
+    def addComponent(self, baseGlyphName, transformation, **kwargs):
+        if self.depth <= 0 or baseGlyphName not in self.font:
+            return
+        xx1, xy1, yx1, yy1, dx1, dy1 = transformation
+        xx2, xy2, yx2, yy2, dx2, dy2 = self.transformation
+        transformation = (
+            xx1 * xx2 + xy1 * yx2,
+            xx1 * xy2 + xy1 * yy2,
+            yx1 * xx2 + yy1 * yx2,
+            yx1 * xy2 + yy1 * yy2,
+            dx1 * xx2 + dy1 * yx2 + dx2,
+            dx1 * xy2 + dy1 * yy2 + dy2
+        )
+        pen = _DecomposingPointPen(self.font, self.outPen, self.depth - 1, transformation)
+        self.font[baseGlyphName].drawPoints(pen)
+
+
+def _iterSegmentPoints(geometry, index):
+    # yield the previous on curve, the off
+    # curves and the on curve of each segment
+    start, end = geometry.getContourRange(index)
+    if start == end:
+        return
+    prev = geometry.onCurves[end - 1]
+    for i in range(start, end):
+        onCurve = geometry.onCurves[i]
+        yield i, prev, geometry.offCurves[i], onCurve
+        prev = onCurve
+
+def _calcSegmentsBounds(geometry, index):
+    bounds = None
+    for i, prev, offCurves, onCurve in _iterSegmentPoints(geometry, index):
+        segmentType = geometry.segmentTypes[i]
+        if segmentType == "curve" and len(offCurves) == 2:
+            segmentBounds = ftBezierTools.calcCubicBounds(prev, offCurves[0], offCurves[1], onCurve)
+        else:
+            # lines, moves and quadratic curves
+            # use the bounds of their points
+            points = [onCurve] + list(offCurves)
+            xs = [x for x, y in points]
+            ys = [y for x, y in points]
+            segmentBounds = (min(xs), min(ys), max(xs), max(ys))
+        if bounds is None:
+            bounds = segmentBounds
+        else:
+            bounds = (
+                min(bounds[0], segmentBounds[0]),
+                min(bounds[1], segmentBounds[1]),
+                max(bounds[2], segmentBounds[2]),
+                max(bounds[3], segmentBounds[3])
+            )
+    return bounds
+
+def _getSegmentsPointBounds(geometry, index):
+    start, end = geometry.getContourRange(index)
+    points = list(geometry.onCurves[start:end])
+    for offCurves in geometry.offCurves[start:end]:
+        points.extend(offCurves)
+    xs = [x for x, y in points]
+    ys = [y for x, y in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def _calcSegmentsArea(geometry, index):
+    # the signed area of the closed contour.
+    # this is negative for clockwise contours.
+    pen = AreaPen()
+    for i, prev, offCurves, onCurve in _iterSegmentPoints(geometry, index):
+        if i == geometry.contourOffsets[index]:
+            pen.moveTo(prev)
+        segmentType = geometry.segmentTypes[i]
+        if segmentType == "curve":
+            pen.curveTo(*(offCurves + (onCurve,)))
+        elif segmentType == "qcurve":
+            pen.qCurveTo(*(offCurves + (onCurve,)))
+        else:
+            pen.lineTo(onCurve)
+    if geometry.contourOffsets[index] != geometry.contourOffsets[index + 1]:
+        pen.closePath()
+    return pen.value
+
+# Spatial Grid
+
+# The smallest size of the grid cells in font units.
+spatialGridCellSize = 32
+
+
+class SpatialGrid(object):
+
+    """
+    A uniform grid over a GlyphGeometry. Each cell
+    lists the segments whose on-curve point is in
+    the cell and the segments whose control point
+    bounds overlap the cell, so the points and
+    segments near a location can be found without
+    looking at the rest of the glyph. Segments are
+    referred to by their index in the geometry.
+
+    If cellSize is None, the cells are about as
+    large as the average segment so that each
+    segment is in a few cells.
+    """
+
+    def __init__(self, geometry, cellSize=None):
+        self.geometry = geometry
+        self.segmentContours = []
+        self.segmentBounds = []
+        for index in range(geometry.contourCount):
+            for i, prev, offCurves, onCurve in _iterSegmentPoints(geometry, index):
+                points = [prev, onCurve] + list(offCurves)
+                xs = [x for x, y in points]
+                ys = [y for x, y in points]
+                self.segmentContours.append(index)
+                self.segmentBounds.append((min(xs), min(ys), max(xs), max(ys)))
+        if cellSize is None:
+            cellSize = spatialGridCellSize
+            if self.segmentBounds:
+                extent = sum([max(xMax - xMin, yMax - yMin) for xMin, yMin, xMax, yMax in self.segmentBounds])
+                cellSize = max(cellSize, extent / len(self.segmentBounds))
+        self.cellSize = float(cellSize)
+        self._points = {}
+        self._segments = {}
+        for i, bounds in enumerate(self.segmentBounds):
+            x, y = geometry.onCurves[i]
+            self._addItem(self._points, (x, y, x, y), i)
+            # the segment from the last point to the
+            # first point of an open contour isn't drawn
+            if geometry.segmentTypes[i] != "move":
+                self._addItem(self._segments, bounds, i)
+
+    def _getCellRange(self, bounds):
+        xMin, yMin, xMax, yMax = bounds
+        size = self.cellSize
+        return (
+            int(math.floor(xMin / size)),
+            int(math.floor(yMin / size)),
+            int(math.floor(xMax / size)),
+            int(math.floor(yMax / size))
+        )
+
+    def _addItem(self, cells, bounds, item):
+        xMin, yMin, xMax, yMax = self._getCellRange(bounds)
+        for x in range(xMin, xMax + 1):
+            for y in range(yMin, yMax + 1):
+                cell = (x, y)
+                if cell not in cells:
+                    cells[cell] = []
+                cells[cell].append(item)
+
+    def _iterItems(self, cells, pt, distance):
+        x, y = pt
+        xMin, yMin, xMax, yMax = self._getCellRange((x - distance, y - distance, x + distance, y + distance))
+        if xMin == xMax and yMin == yMax:
+            for item in cells.get((xMin, yMin), ()):
+                yield item
+            return
+        seen = set()
+        for cellX in range(xMin, xMax + 1):
+            for cellY in range(yMin, yMax + 1):
+                for item in cells.get((cellX, cellY), ()):
+                    if item not in seen:
+                        seen.add(item)
+                        yield item
+
+    def getPointsNear(self, pt, distance):
+        """
+        Get the indexes of the segments whose
+        on-curve point is within distance of pt.
+        """
+        onCurves = self.geometry.onCurves
+        found = []
+        for i in self._iterItems(self._points, pt, distance):
+            if _calcDistance(pt, onCurves[i]) <= distance:
+                found.append(i)
+        return found
+
+    def getSegmentsNear(self, pt, distance):
+        """
+        Get the indexes of the segments whose control
+        point bounds are within distance of pt. The
+        segments themselves may be further away.
+        """
+        x, y = pt
+        found = []
+        for i in self._iterItems(self._segments, pt, distance):
+            xMin, yMin, xMax, yMax = self.segmentBounds[i]
+            if xMin - distance <= x <= xMax + distance and yMin - distance <= y <= yMax + distance:
+                found.append(i)
+        return found
+
+    def isPointNearSegment(self, pt, index, distance):
+        """
+        Get a boolean indicating if pt is
+        within distance of the segment.
+        """
+        geometry = self.geometry
+        start, end = geometry.getContourRange(self.segmentContours[index])
+        prev = geometry.onCurves[index - 1 if index > start else end - 1]
+        offCurves = geometry.offCurves[index]
+        onCurve = geometry.onCurves[index]
+        segmentType = geometry.segmentTypes[index]
+        if segmentType == "curve" and len(offCurves) == 2:
+            return _isPointNearCurve(pt, prev, offCurves[0], offCurves[1], onCurve, distance)
+        if segmentType == "qcurve" and offCurves:
+            # use the cubic equivalent of
+            # each implied quadratic segment
+            for pt1, pt2 in decomposeQuadraticSegment(offCurves + (onCurve,)):
+                off1 = (prev[0] + (pt1[0] - prev[0]) * 2 / 3.0, prev[1] + (pt1[1] - prev[1]) * 2 / 3.0)
+                off2 = (pt2[0] + (pt1[0] - pt2[0]) * 2 / 3.0, pt2[1] + (pt1[1] - pt2[1]) * 2 / 3.0)
+                if _isPointNearCurve(pt, prev, off1, off2, pt2, distance):
+                    return True
+                prev = pt2
+            return False
+        return _calcPointLineDistance(pt, prev, onCurve) <= distance
+
+
+def _calcDistance(pt1, pt2):
+    return math.hypot(pt2[0] - pt1[0], pt2[1] - pt1[1])
+
+def _calcPointLineDistance(pt, pt1, pt2):
+    dx = pt2[0] - pt1[0]
+    dy = pt2[1] - pt1[1]
+    length = dx * dx + dy * dy
+    if length == 0:
+        return _calcDistance(pt, pt1)
+    t = ((pt[0] - pt1[0]) * dx + (pt[1] - pt1[1]) * dy) / float(length)
+    t = max(0, min(1, t))
+    return _calcDistance(pt, (pt1[0] + dx * t, pt1[1] + dy * t))
+
+def _isPointNearCurve(pt, pt1, pt2, pt3, pt4, distance, depth=16):
+    # split the curve in half until the pieces that
+    # could be near the point are much smaller than
+    # distance and then compare to their chords
+    x, y = pt
+    xs = (pt1[0], pt2[0], pt3[0], pt4[0])
+    ys = (pt1[1], pt2[1], pt3[1], pt4[1])
+    xMin = min(xs)
+    yMin = min(ys)
+    xMax = max(xs)
+    yMax = max(ys)
+    if x < xMin - distance or x > xMax + distance or y < yMin - distance or y > yMax + distance:
+        return False
+    if depth == 0 or max(xMax - xMin, yMax - yMin) <= distance * 0.25:
+        return _calcPointLineDistance(pt, pt1, pt4) <= distance
+    mid12 = ((pt1[0] + pt2[0]) * 0.5, (pt1[1] + pt2[1]) * 0.5)
+    mid23 = ((pt2[0] + pt3[0]) * 0.5, (pt2[1] + pt3[1]) * 0.5)
+    mid34 = ((pt3[0] + pt4[0]) * 0.5, (pt3[1] + pt4[1]) * 0.5)
+    mid123 = ((mid12[0] + mid23[0]) * 0.5, (mid12[1] + mid23[1]) * 0.5)
+    mid234 = ((mid23[0] + mid34[0]) * 0.5, (mid23[1] + mid34[1]) * 0.5)
+    mid = ((mid123[0] + mid234[0]) * 0.5, (mid123[1] + mid234[1]) * 0.5)
+    if _isPointNearCurve(pt, pt1, mid12, mid123, mid, distance, depth - 1):
+        return True
+    return _isPointNearCurve(pt, mid, mid234, mid34, pt4, distance, depth - 1)
+
+# -------------
+# Test Registry
+# -------------
+
+testRegistry = {}
+
+# The data that a test result can depend on.
+# The glyph dependencies are changes to the glyph
+# itself. The font dependencies are font level data
+# that is described by getTestContext.
+glyphDependencies = ("contours", "components", "width", "unicodes", "name")
+fontDependencies = ("fontInfo", "unicodeMap", "componentBases", "ligatureParts")
+
+# How serious a problem found by a test is,
+# from most to least serious.
+severities = ("error", "warning", "info")
+
+# How long a test takes on a complex glyph,
+# from fastest to slowest. cheap tests take
+# a fraction of a millisecond, expensive tests
+# can take tens of milliseconds.
+costClasses = ("cheap", "moderate", "expensive")
+
+def registerTest(identifier=None, level=None, title=None, description=None, testFunction=None, drawingFunction=None, severity="warning", cost="moderate", version=1, dependencies=glyphDependencies):
+    """
+    Register a test. testFunction is called with
+    the glyph and its GlyphGeometry. severity is
+    one of severities and cost is one of
+    costClasses. version should be increased
+    whenever the results of testFunction change
+    so that stored reports are recomputed.
+    dependencies lists the glyphDependencies and
+    fontDependencies that the result depends on.
+    """
+    assert severity in severities, "Unknown severity: %s" % severity
+    assert cost in costClasses, "Unknown cost: %s" % cost
+    for dependency in dependencies:
+        assert dependency in glyphDependencies or dependency in fontDependencies, "Unknown dependency: %s" % dependency
+    testRegistry[identifier] = dict(
+        level=level,
+        description=description,
+        title=title,
+        testFunction=testFunction,
+        drawingFunction=drawingFunction,
+        severity=severity,
+        cost=cost,
+        version=version,
+        dependencies=tuple(dependencies)
+    )
+
+def getScheduledTestOrder():
+    """
+    Get the test identifiers ordered from
+    cheapest to most expensive.
+    """
+    order = [identifier for identifier in reportOrder if identifier in testRegistry]
+    order += sorted([identifier for identifier in testRegistry.keys() if identifier not in reportOrder])
+    return sorted(order, key=lambda identifier: costClasses.index(testRegistry[identifier]["cost"]))
+
+def getTestContext(font, glyph, identifier):
+    """
+    Get a hashable description of the font level
+    data that the test depends on. If this changes
+    any stored result for the test is no longer valid.
+    """
+    context = []
+    for dependency in testRegistry[identifier]["dependencies"]:
+        if dependency == "fontInfo":
+            context.append(_getVerticalMetrics(font))
+        elif dependency == "unicodeMap":
+            if glyph.unicode is None:
+                context.append(None)
+            else:
+                context.append(tuple(_getUnicodeDuplicates(font, glyph)))
+        elif dependency == "componentBases":
+            context.append(tuple([_getComponentBaseContext(font, component.baseGlyph) for component in glyph.components]))
+        elif dependency == "ligatureParts":
+            if "_" not in glyph.name:
+                context.append(None)
+            else:
+                context.append(tuple([_getGlyphMetricsContext(font, part) for part in _getLigatureParts(font, glyph.name)]))
+    return tuple(context)
+
+def _getGlyphMetricsContext(font, glyphName):
+    if glyphName not in font:
+        return (glyphName, None)
+    glyph = font[glyphName]
+    bounds = _getBounds(glyph)
+    if bounds is not None:
+        bounds = tuple(bounds)
+    return (glyphName, glyph.leftMargin, glyph.rightMargin, bounds, tuple(glyph.unicodes))
+
+def _getComponentBaseContext(font, glyphName, depth=maxComponentDepth):
+    # the tests of composites can look at the points
+    # of the components and of their own components
+    context = _getGlyphMetricsContext(font, glyphName)
+    if glyphName in font:
+        glyph = font[glyphName]
+        pen = DigestPointPen()
+        glyph.drawPoints(pen)
+        nested = ()
+        if depth > 1:
+            nested = tuple([_getComponentBaseContext(font, component.baseGlyph, depth - 1) for component in glyph.components])
+        context += (pen.getDigest(), nested)
+    return context
+
+# ----------------
+# Dependency Index
+# ----------------
+
+class DependencyIndex(object):
+
+    """
+    A reverse index of the glyphs used by the font
+    level tests of other glyphs: component base to
+    composites, ligature part to ligatures and code
+    point to glyphs. font may be a defcon, fontParts
+    or RoboFab font. Call updateGlyph or removeGlyph
+    when a glyph changes.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self._glyphData = {}
+        self.componentBases = {}
+        self.ligatureParts = {}
+        self.unicodes = {}
+        for name in font.keys():
+            self.updateGlyph(name)
+
+    def updateGlyph(self, name):
+        self.removeGlyph(name)
+        glyph = self.font[name]
+        bases = tuple(set([component.baseGlyph for component in glyph.components]))
+        parts = _getLigaturePartCandidates(name)
+        unicodes = tuple(glyph.unicodes)
+        self._glyphData[name] = (bases, parts, unicodes)
+        for index, keys in ((self.componentBases, bases), (self.ligatureParts, parts), (self.unicodes, unicodes)):
+            for key in keys:
+                if key not in index:
+                    index[key] = set()
+                index[key].add(name)
+
+    def removeGlyph(self, name):
+        data = self._glyphData.pop(name, None)
+        if data is None:
+            return
+        bases, parts, unicodes = data
+        for index, keys in ((self.componentBases, bases), (self.ligatureParts, parts), (self.unicodes, unicodes)):
+            for key in keys:
+                names = index[key]
+                names.discard(name)
+                if not names:
+                    del index[key]
+
+    def getDependents(self, name):
+        """
+        Get a dict of font dependencies and the names
+        of the glyphs whose tests with that dependency
+        use the glyph named name.
+        """
+        dependents = dict(
+            componentBases=self._getComposites(name),
+            ligatureParts=set(self.ligatureParts.get(name, ())),
+            unicodeMap=set()
+        )
+        data = self._glyphData.get(name)
+        if data is not None:
+            for value in data[2]:
+                dependents["unicodeMap"] |= self.unicodes[value]
+            dependents["unicodeMap"].discard(name)
+        return dependents
+
+    def _getComposites(self, name):
+        # the glyphs that use the glyph as a component,
+        # directly or through other components
+        composites = set()
+        pending = [name]
+        while pending:
+            for composite in self.componentBases.get(pending.pop(), ()):
+                if composite not in composites:
+                    composites.add(composite)
+                    pending.append(composite)
+        return composites
+
+def _getLigaturePartCandidates(name):
+    # every name that _getLigatureParts
+    # could pick for the ligature
+    if "_" not in name:
+        return ()
+    base = name
+    suffix = None
+    if "." in name:
+        base, suffix = name.split(".", 1)
+    parts = base.split("_")
+    candidates = set([parts[0], parts[-1]])
+    if suffix:
+        candidates.add(parts[0] + "." + suffix)
+        candidates.add(parts[-1] + "." + suffix)
+    return tuple(candidates)
+
+
+# -----------------
+# Glyph Level Tests
+# -----------------
+
+# Unicode Value
+
+uniNamePattern = re.compile(
+    "uni"
+    "([0-9A-Fa-f]{4})"
+    "$"
+)
+
+def testUnicodeValue(glyph, geometry):
+    """
+    A Unicode value should appear only once per font.
+    """
+    report = []
+    font = _getFont(glyph)
+    uni = glyph.unicode
+    name = glyph.name
+    # test for uniXXXX name
+    m = uniNamePattern.match(name)
+    if m is not None:
+        uniFromName = m.group(1)
+        uniFromName = int(uniFromName, 16)
+        if uni != uniFromName:
+            report.append("The Unicode value for this glyph does not match its name.")
+    # test against AGLFN
+    else:
+        expectedUni = AGL2UV.get(name)
+        if expectedUni != uni:
+            report.append("The Unicode value for this glyph may not be correct.")
+    # look for duplicates
+    if uni is not None:
+        duplicates = _getUnicodeDuplicates(font, glyph)
+        if duplicates:
+            report.append("The Unicode for this glyph is also used by: %s." % " ".join(duplicates))
+    return report
+
+def _getUnicodeDuplicates(font, glyph):
+    uni = glyph.unicode
+    duplicates = []
+    for name in sorted(_getUnicodeIndex(font).get(uni, [])):
+        if name == glyph.name:
+            continue
+        other = font[name]
+        if other.unicode == uni:
+            duplicates.append(name)
+    return duplicates
+
+registerTest(
+    identifier="unicodeValue",
+    level="glyph",
+    title="Unicode Value",
+    description="Unicode value may have problems.",
+    testFunction=testUnicodeValue,
+    severity="warning",
+    cost="cheap",
+    dependencies=("name", "unicodes", "unicodeMap")
+)
+
+
+# Contour Count
+
+def testContourCount(glyph, geometry):
+    """
+    There shouldn't be too many overlapping contours.
+    """
+    report = []
+    # removing overlap can't remove more contours than
+    # could possibly interact, so skip the expensive
+    # boolean operation if there aren't enough of them
+    if _countPossibleOverlapRemovals(geometry) <= 2:
+        return report
+    if _getOverlapRemovalCount(glyph, geometry) > 2:
+        report.append("This glyph has a unusally high number of overlapping contours.")
+    return report
+
+# Contours with less area than this in square
+# units may be dropped by removing overlap.
+overlapRemovalAreaTolerance = 1
+
+def _countPossibleOverlapRemovals(geometry):
+    """
+    Get the maximum number of contours that removing
+    overlap could remove. Contours are grouped if their
+    control point hulls intersect or if one is nested
+    inside of another with the same direction. Each
+    group can at most be reduced to one contour.
+    Contours without area, such as collinear ones,
+    can be removed entirely.
+    """
+    empty = 0
+    data = []
+    for index in range(geometry.contourCount):
+        if geometry.contourOpen[index]:
+            continue
+        bounds = geometry.getContourBounds(index)
+        if bounds is None or abs(_calcSegmentsArea(geometry, index)) < overlapRemovalAreaTolerance:
+            empty += 1
+            continue
+        data.append((bounds, geometry.isClockwise(index), _getSegmentControlBounds(geometry, index)))
+    # union find
+    groups = list(range(len(data)))
+    def find(i):
+        while groups[i] != i:
+            groups[i] = groups[groups[i]]
+            i = groups[i]
+        return i
+    for i, (bounds1, clockwise1, segments1) in enumerate(data):
+        for j in range(i + 1, len(data)):
+            bounds2, clockwise2, segments2 = data[j]
+            if not _boundsIntersect(bounds1, bounds2):
+                continue
+            interact = False
+            if clockwise1 == clockwise2 and (_boundsContain(bounds1, bounds2) or _boundsContain(bounds2, bounds1)):
+                interact = True
+            else:
+                interact = _segmentBoundsIntersect(segments1, segments2)
+            if interact:
+                groups[find(i)] = find(j)
+    return empty + len(data) - len(set([find(i) for i in range(len(data))]))
+
+def _getSegmentControlBounds(geometry, index):
+    # curves are inside of the hull of their
+    # control points so these bounds contain
+    # each segment of the closed contour
+    bounds = []
+    for i, prev, offCurves, onCurve in _iterSegmentPoints(geometry, index):
+        points = [prev, onCurve] + list(offCurves)
+        xs = [x for x, y in points]
+        ys = [y for x, y in points]
+        bounds.append((min(xs), min(ys), max(xs), max(ys)))
+    return bounds
+
+def _segmentBoundsIntersect(segments1, segments2):
+    for bounds1 in segments1:
+        for bounds2 in segments2:
+            if _boundsIntersect(bounds1, bounds2):
+                return True
+    return False
+
+def _boundsIntersect(bounds1, bounds2):
+    xMin1, yMin1, xMax1, yMax1 = bounds1
+    xMin2, yMin2, xMax2, yMax2 = bounds2
+    return xMin1 <= xMax2 and xMin2 <= xMax1 and yMin1 <= yMax2 and yMin2 <= yMax1
+
+def _boundsContain(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+# The exact counts are kept for a limited number of
+# outlines so that undo, redo and switching between
+# glyphs don't repeat the boolean operation. The
+# cache is shared by the background report thread.
+
+_overlapRemovalCache = OrderedDict()
+_overlapRemovalCacheSize = 250
+_overlapRemovalCacheLock = threading.Lock()
+
+def _getOverlapRemovalCount(glyph, geometry):
+    """
+    Get the number of contours that are
+    removed by removing overlap.
+    """
+    key = geometry.getDigest()
+    with _overlapRemovalCacheLock:
+        count = _overlapRemovalCache.pop(key, None)
+        if count is not None:
+            _overlapRemovalCache[key] = count
+            return count
+    # the boolean operation is done outside of the
+    # lock so that other threads aren't held up
+    test = glyph.copy()
+    for contour in [contour for contour in test if contour.open]:
+        test.removeContour(contour)
+    count = len(test)
+    test.removeOverlap()
+    count -= len(test)
+    with _overlapRemovalCacheLock:
+        _overlapRemovalCache.pop(key, None)
+        while len(_overlapRemovalCache) >= _overlapRemovalCacheSize:
+            _overlapRemovalCache.popitem(last=False)
+        _overlapRemovalCache[key] = count
+    return count
+
+registerTest(
+    identifier="contourCount",
+    level="glyph",
+    title="Contour Count",
+    description="There are an unusual number of contours.",
+    testFunction=testContourCount,
+    severity="warning",
+    cost="expensive",
+    version=3,
+    dependencies=("contours",)
+)
+
+
+# -------------------
+# Metrics Level Tests
+# -------------------
+
+# Ligatures
+
+def testLigatureMetrics(glyph, geometry):
+    """
+    Sometimes ligatures should have the same
+    metrics as the glyphs they represent.
+    """
+    font = _getFont(glyph)
+    name = glyph.name
+    if "_" not in name:
+        return
+    leftPart, rightPart = _getLigatureParts(font, name)
+    # test
+    left = glyph.leftMargin
+    right = glyph.rightMargin
+    report = dict(leftMessage=None, rightMessage=None, left=left, right=right, width=glyph.width, box=_getBounds(glyph))
+    if leftPart not in font:
+        report["leftMessage"] = "Couldn't find the ligature's left component."
+    else:
+        expectedLeft = font[leftPart].leftMargin
+        if left != expectedLeft:
+            report["leftMessage"] = "Left doesn't match the presumed part %s left" % leftPart
+    if rightPart not in font:
+        report["rightMessage"] = "Couldn't find the ligature's right component."
+    else:
+        expectedRight = font[rightPart].rightMargin
+        if right != expectedRight:
+            report["rightMessage"] = "Right doesn't match the presumed part %s right" % rightPart
+    if report["leftMessage"] or report["rightMessage"]:
+        return report
+    return None
+
+def _getLigatureParts(font, name):
+    base = name
+    suffix = None
+    if "." in name:
+        base, suffix = name.split(".", 1)
+    # guess at the ligature parts
+    parts = base.split("_")
+    leftPart = parts[0]
+    rightPart = parts[-1]
+    # try snapping on the suffixes
+    if suffix:
+        if leftPart + "." + suffix in font:
+            leftPart += "." + suffix
+        if rightPart + "." + suffix in font:
+            rightPart += "." + suffix
+    return leftPart, rightPart
+
+registerTest(
+    identifier="ligatureMetrics",
+    level="metrics",
+    title="Ligature Side-Bearings",
+    description="The side-bearings don't match the ligature's presumed part metrics.",
+    testFunction=testLigatureMetrics,
+    severity="warning",
+    cost="moderate",
+    dependencies=("contours", "components", "width", "name", "ligatureParts")
+)
+
+# Components
+
+def testComponentMetrics(glyph, geometry):
+    """
+    If components are present, check their base margins.
+    """
+    font = _getFont(glyph)
+    components = [c for c in glyph.components if c.baseGlyph in font]
+    # no components
+    if len(components) == 0:
+        return
+    boxes = [_getBounds(c) for c in components]
+    # a component has no contours
+    if None in boxes:
+        return
+    report = dict(leftMessage=None, rightMessage=None, left=None, right=None, width=glyph.width, box=_getBounds(glyph))
+    problem = False
+    if len(components) > 1:
+        # filter marks
+        nonMarks = []
+        markCategories = ("Sk", "Zs", "Lm")
+        for component in components:
+            baseGlyphName = component.baseGlyph
+            category = font.naked().unicodeData.categoryForGlyphName(baseGlyphName, allowPseudoUnicode=True)
+            if category not in markCategories:
+                nonMarks.append(component)
+        if nonMarks:
+            components = nonMarks
+    # order the components from left to right based on their boxes
+    if len(components) > 1:
+        leftComponent, rightComponent = _getXMinMaxComponents(components)
+    else:
+        leftComponent = rightComponent = components[0]
+    expectedLeft = _getComponentBaseMargins(font, leftComponent)[0]
+    expectedRight = _getComponentBaseMargins(font, rightComponent)[1]
+    left = _getBounds(leftComponent)[0]
+    right = glyph.width - _getBounds(rightComponent)[2]
+    if left != expectedLeft:
+        problem = True
+        report["leftMessage"] = "%s component left does not match %s left" % (leftComponent.baseGlyph, leftComponent.baseGlyph)
+        report["left"] = left
+    if right != expectedRight:
+        problem = True
+        report["rightMessage"] = "%s component right does not match %s right" % (rightComponent.baseGlyph, rightComponent.baseGlyph)
+        report["right"] = right
+    if problem:
+        return report
+
+def _getComponentBaseMargins(font, component):
+    baseGlyphName = component.baseGlyph
+    baseGlyph = font[baseGlyphName]
+    scale = component.scale[0]
+    left = baseGlyph.leftMargin * scale
+    right = baseGlyph.rightMargin * scale
+    return left, right
+
+def _getXMinMaxComponents(components):
+    minSide = []
+    maxSide = []
+    for component in components:
+        xMin, yMin, xMax, yMax = _getBounds(component)
+        minSide.append((xMin, component))
+        maxSide.append((xMax, component))
+    o = [
+        min(minSide)[-1],
+        max(maxSide)[-1],
+    ]
+    return o
+
+registerTest(
+    identifier="componentMetrics",
+    level="metrics",
+    title="Component Side-Bearings",
+    description="The side-bearings don't match the component's metrics.",
+    testFunction=testComponentMetrics,
+    severity="warning",
+    cost="moderate",
+    dependencies=("contours", "components", "width", "componentBases")
+)
+
+# Symmetry
+
+def testMetricsSymmetry(glyph, geometry):
+    """
+    Sometimes glyphs are almost symmetrical, but could be.
+    """
+    left = glyph.leftMargin
+    right = glyph.rightMargin
+    # fontParts and defcon have no margins for empty glyphs
+    if left is None or right is None:
+        return None
+    diff = int(round(abs(left - right)))
+    if diff == 1:
+        message = "The side-bearings are 1 unit from being equal."
+    else:
+        message = "The side-bearings are %d units from being equal." % diff
+    data = dict(left=left, right=right, width=glyph.width, message=message)
+    if 0 < diff <= 5:
+        return data
+    return None
+
+registerTest(
+    identifier="metricsSymmetry",
+    level="metrics",
+    title="Symmetry",
+    description="The side-bearings are almost equal.",
+    testFunction=testMetricsSymmetry,
+    severity="info",
+    cost="cheap",
+    dependencies=("contours", "components", "width", "componentBases")
+)
+
+
+# -------------------
+# Contour Level Tests
+# -------------------
+
+# Duplicate Contours
+
+def testDuplicateContours(glyph, geometry):
+    """
+    Contours shouldn't be duplicated on each other
+    or on the outline of a component.
+    """
+    contours = {}
+    for index in range(geometry.contourCount):
+        fingerprint = geometry.getContourFingerprint(index)
+        if fingerprint not in contours:
+            contours[fingerprint] = []
+        contours[fingerprint].append(index)
+    duplicateContours = []
+    for fingerprint, indexes in contours.items():
+        if len(indexes) > 1:
+            duplicateContours.append(indexes[0])
+    for componentGeometry in _getComponentGeometries(glyph):
+        for index in range(componentGeometry.contourCount):
+            indexes = contours.get(componentGeometry.getContourFingerprint(index))
+            if indexes and indexes[0] not in duplicateContours:
+                duplicateContours.append(indexes[0])
+    return sorted(duplicateContours)
+
+registerTest(
+    identifier="duplicateContours",
+    level="contour",
+    title="Duplicate Contours",
+    description="One or more contours are duplicated.",
+    testFunction=testDuplicateContours,
+    severity="error",
+    cost="moderate",
+    version=2,
+    dependencies=("contours", "components", "componentBases")
+)
+
+def getFontDuplicateContours(font, glyphNames=None):
+    """
+    Find contours that have the same shape in more
+    than one glyph, in one pass over the font. These
+    could be components instead. A group is returned
+    for each shape as a list of (glyph name, contour
+    index, (x, y)) sorted by glyph name, where (x, y)
+    is the bottom left of the contour. Contours with
+    less than two segments are ignored. Components
+    are not decomposed, the contours of their base
+    glyphs are compared like any other.
+    """
+    if glyphNames is None:
+        glyphNames = getGlyphOrder(font)
+    shapes = {}
+    for glyphName in glyphNames:
+        geometry = GlyphGeometry(font[glyphName])
+        for index in range(geometry.contourCount):
+            start, end = geometry.getContourRange(index)
+            if end - start < 2:
+                continue
+            fingerprint = geometry.getContourFingerprint(index, relative=True)
+            xMin, yMin, xMax, yMax = _getSegmentsPointBounds(geometry, index)
+            if fingerprint not in shapes:
+                shapes[fingerprint] = []
+            shapes[fingerprint].append((glyphName, index, (xMin, yMin)))
+    groups = []
+    for contours in shapes.values():
+        if len(set([glyphName for glyphName, index, offset in contours])) > 1:
+            groups.append(sorted(contours))
+    return sorted(groups)
+
+# Touching Contours
+
+touchingContourDistance = 0.5
+
+def testForTouchingContours(glyph, geometry):
+    """
+    Points of one contour shouldn't be on
+    the outline of another contour.
+    """
+    touchingContours = {}
+    grid = geometry.getSpatialGrid()
+    segmentContours = grid.segmentContours
+    for index in range(geometry.contourCount):
+        start, end = geometry.getContourRange(index)
+        if end - start < 2:
+            continue
+        for i in range(start, end):
+            point = geometry.onCurves[i]
+            for other in grid.getSegmentsNear(point, touchingContourDistance):
+                otherIndex = segmentContours[other]
+                if otherIndex == index:
+                    continue
+                otherStart, otherEnd = geometry.getContourRange(otherIndex)
+                if otherEnd - otherStart < 2:
+                    continue
+                if grid.isPointNearSegment(point, other, touchingContourDistance):
+                    if index not in touchingContours:
+                        touchingContours[index] = set()
+                    touchingContours[index].add(point)
+                    break
+    return touchingContours
+
+registerTest(
+    identifier="touchingContours",
+    level="contour",
+    title="Touching Contours",
+    description="One or more contours touch another contour.",
+    testFunction=testForTouchingContours,
+    severity="warning",
+    cost="moderate",
+    dependencies=("contours",)
+)
+
+# Small Contours
+
+def testForSmallContours(glyph, geometry):
+    """
+    Contours should not have an area less than or equal to 4 units.
+    """
+    smallContours = {}
+    for index in range(geometry.contourCount):
+        box = geometry.getContourBounds(index)
+        if not box:
+            continue
+        xMin, yMin, xMax, yMax = box
+        w = xMax - xMin
+        h = yMin - yMax
+        area = abs(w * h)
+        if area <= 4:
+            smallContours[index] = box
+    return smallContours
+
+registerTest(
+    identifier="smallContours",
+    level="contour",
+    title="Small Contours",
+    description="One or more contours are suspiciously small.",
+    testFunction=testForSmallContours,
+    severity="warning",
+    cost="cheap",
+    dependencies=("contours",)
+)
+
+# Open Contours
+
+def testForOpenContours(glyph, geometry):
+    """
+    Contours should be closed.
+    """
+    openContours = {}
+    for index in range(geometry.contourCount):
+        if not geometry.contourOpen[index]:
+            continue
+        start, end = geometry.getContourRange(index)
+        start = geometry.onCurves[start]
+        end = geometry.onCurves[end - 1]
+        if start != end:
+            openContours[index] = (start, end)
+    return openContours
+
+registerTest(
+    identifier="openContours",
+    level="contour",
+    title="Open Contours",
+    description="One or more contours are not properly closed.",
+    testFunction=testForOpenContours,
+    severity="error",
+    cost="cheap",
+    dependencies=("contours",)
+)
+
+# Extreme Points
+
+def testForExtremePoints(glyph, geometry):
+    """
+    Points should be at the extrema.
+    """
+    pointsAtExtrema = {}
+    for index in range(geometry.contourCount):
+        start, end = geometry.getContourRange(index)
+        onCurves = set(geometry.onCurves[start:end])
+        missing = set()
+        for i, pt0, offCurves, pt3 in _iterSegmentPoints(geometry, index):
+            if geometry.segmentTypes[i] != "curve" or len(offCurves) != 2:
+                continue
+            pt1, pt2 = offCurves
+            for pt in _getCubicExtrema(pt0, pt1, pt2, pt3):
+                if pt not in onCurves:
+                    missing.add(pt)
+        if missing:
+            pointsAtExtrema[index] = missing
+    return pointsAtExtrema
+
+def _getCubicExtrema(pt0, pt1, pt2, pt3, tolerance=0.001):
+    """
+    Get the rounded points where the curve has a
+    horizontal or vertical tangent between the
+    end points. These are the roots of the
+    derivative of the curve in each dimension.
+    """
+    extrema = []
+    for d in (0, 1):
+        p0 = pt0[d]
+        p1 = pt1[d]
+        p2 = pt2[d]
+        p3 = pt3[d]
+        a = 3 * (-p0 + 3 * p1 - 3 * p2 + p3)
+        b = 6 * (p0 - 2 * p1 + p2)
+        c = 3 * (p1 - p0)
+        for t in ftBezierTools.solveQuadratic(a, b, c):
+            if tolerance < t < 1 - tolerance:
+                extrema.append(_roundPoint(_getCubicPoint(pt0, pt1, pt2, pt3, t)))
+    return extrema
+
+def _getCubicPoint(pt0, pt1, pt2, pt3, t):
+    mt = 1 - t
+    a = mt * mt * mt
+    b = 3 * mt * mt * t
+    c = 3 * mt * t * t
+    d = t * t * t
+    x = a * pt0[0] + b * pt1[0] + c * pt2[0] + d * pt3[0]
+    y = a * pt0[1] + b * pt1[1] + c * pt2[1] + d * pt3[1]
+    return x, y
+
+registerTest(
+    identifier="extremePoints",
+    level="contour",
+    title="Extreme Points",
+    description="One or more curves need an extreme point.",
+    testFunction=testForExtremePoints,
+    severity="warning",
+    cost="moderate",
+    version=2,
+    dependencies=("contours",)
+)
+
+
+# -------------------
+# Segment Level Tests
+# -------------------
+
+def testForStraightLines(glyph, geometry):
+    """
+    Lines shouldn't be just shy of vertical or horizontal.
+    """
+    straightLines = {}
+    for index in range(geometry.contourCount):
+        for i, prev, offCurves, point in _iterSegmentPoints(geometry, index):
+            if geometry.segmentTypes[i] == "line" and _testStraightLine(prev, point):
+                if index not in straightLines:
+                    straightLines[index] = set()
+                straightLines[index].add((prev, point))
+    return straightLines
+
+def _testStraightLine(pt0, pt1):
+    x = abs(pt0[0] - pt1[0])
+    y = abs(pt0[1] - pt1[1])
+    return (x > 0 and x <= 5) or (y > 0 and y <= 5)
+
+registerTest(
+    identifier="straightLines",
+    level="segment",
+    title="Straight Lines",
+    description="One or more lines is a few units from being horizontal or vertical.",
+    testFunction=testForStraightLines,
+    severity="warning",
+    cost="cheap",
+    dependencies=("contours",)
+)
+
+# Segments Near Vertical Metrics
+
+def testForSegmentsNearVerticalMetrics(glyph, geometry):
+    """
+    Points shouldn't be just off a vertical metric.
+    """
+    font = _getFont(glyph)
+    verticalMetrics = {
+        0 : set()
+    }
+    for value in _getVerticalMetrics(font):
+        verticalMetrics[value] = set()
+    for index in range(geometry.contourCount):
+        start, end = geometry.getContourRange(index)
+        if start == end:
+            continue
+        sequence = None
+        # test the last segment to start the sequence
+        pt = geometry.onCurves[end - 1]
+        near, currentMetric = _testPointNearVerticalMetrics(pt, verticalMetrics)
+        if near:
+            sequence = set()
+        # test them all
+        for pt in geometry.onCurves[start:end]:
+            near, metric = _testPointNearVerticalMetrics(pt, verticalMetrics)
+            # hit on the same metric as the previous point
+            if near and sequence is not None and metric == currentMetric:
+                sequence.add(pt)
+            else:
+                # existing sequence, note it if needed, clear it
+                if sequence:
+                    if len(sequence) > 1:
+                        verticalMetrics[currentMetric] |= sequence
+                sequence = None
+                currentMetric = None
+                # hit, make a new sequence
+                if near:
+                    sequence = set()
+                    currentMetric = metric
+                    sequence.add(pt)
+    for verticalMetric, points in list(verticalMetrics.items()):
+        if not points:
+            del verticalMetrics[verticalMetric]
+    return verticalMetrics
+
+def _getVerticalMetrics(font):
+    return tuple([getattr(font.info, attr) for attr in "descender xHeight capHeight ascender".split(" ")])
+
+def _testPointNearVerticalMetrics(pt, verticalMetrics):
+    y = pt[1]
+    for v in verticalMetrics:
+        d = abs(v - y)
+        if d != 0 and d <= 5:
+            return True, v
+    return False, None
+
+registerTest(
+    identifier="pointsNearVerticalMetrics",
+    level="segment",
+    title="Near Vertical Metrics",
+    description="Two or more points are just off a vertical metric.",
+    testFunction=testForSegmentsNearVerticalMetrics,
+    severity="warning",
+    cost="cheap",
+    dependencies=("contours", "fontInfo")
+)
+
+# Unsmooth Smooths
+
+def testUnsmoothSmooths(glyph, geometry):
+    """
+    Smooth segments should have bcps in the right places.
+    """
+    unsmoothSmooths = {}
+    segmentTypes = geometry.segmentTypes
+    for index in range(geometry.contourCount):
+        start, end = geometry.getContourRange(index)
+        prev = end - 1
+        for i in range(start, end):
+            if segmentTypes[prev] == "curve" and segmentTypes[i] == "curve":
+                if geometry.smooth[prev]:
+                    pt1 = geometry.offCurves[prev][1]
+                    pt2 = geometry.onCurves[prev]
+                    pt3 = geometry.offCurves[i][0]
+                    angle1 = _calcAngle(pt1, pt2, r=0)
+                    angle2 = _calcAngle(pt2, pt3, r=0)
+                    if angle1 != angle2:
+                        if index not in unsmoothSmooths:
+                            unsmoothSmooths[index] = []
+                        unsmoothSmooths[index].append((pt1, pt2, pt3))
+            prev = i
+    return unsmoothSmooths
+
+registerTest(
+    identifier="unsmoothSmooths",
+    level="segment",
+    title="Unsmooth Smooths",
+    description="One or more smooth points do not have handles that are properly placed.",
+    testFunction=testUnsmoothSmooths,
+    severity="warning",
+    cost="cheap",
+    dependencies=("contours",)
+)
+
+# Complex Curves
+
+def testForComplexCurves(glyph, geometry):
+    """
+    S curves are suspicious.
+    """
+    impliedS = {}
+    for index in range(geometry.contourCount):
+        for i, pt0, offCurves, pt3 in _iterSegmentPoints(geometry, index):
+            if geometry.segmentTypes[i] == "curve":
+                pt1, pt2 = offCurves
+                if _testComplexCurve(pt0, pt1, pt2, pt3):
+                    if index not in impliedS:
+                        impliedS[index] = []
+                    impliedS[index].append((pt0, pt1, pt2, pt3))
+    return impliedS
+
+def _testComplexCurve(pt0, pt1, pt2, pt3):
+    line1 = (pt0, pt3)
+    line2 = (pt1, pt2)
+    return _intersectLines(line1, line2) is not None
+
+registerTest(
+    identifier="complexCurves",
+    level="segment",
+    title="Complex Curves",
+    description="One or more curves is suspiciously complex.",
+    testFunction=testForComplexCurves,
+    severity="info",
+    cost="moderate",
+    dependencies=("contours",)
+)
+
+# Crossed Handles
+
+def testForCrossedHandles(glyph, geometry):
+    """
+    Handles shouldn't intersect.
+    """
+    crossedHandles = {}
+    for index in range(geometry.contourCount):
+        for i, pt0, offCurves, pt3 in _iterSegmentPoints(geometry, index):
+            if geometry.segmentTypes[i] == "curve":
+                pt1, pt2 = offCurves
+                data = _testCrossedHandles(pt0, pt1, pt2, pt3)
+                if data is not None:
+                    if index not in crossedHandles:
+                        crossedHandles[index] = []
+                    crossedHandles[index].append(data)
+    return crossedHandles
+
+def _testCrossedHandles(pt0, pt1, pt2, pt3):
+    # direct intersection
+    direct = _intersectLines((pt0, pt1), (pt2, pt3))
+    if direct:
+        return dict(points=(pt0, pt1, pt2, pt3), intersection=direct)
+    # indirect intersection
+    # bcp1 = ray, bcp2 = segment
+    angle = _calcAngle(pt0, pt1)
+    if angle in (0, 180.0):
+        t1 = (pt0[0] + 1000, pt0[1])
+        t2 = (pt0[0] - 1000, pt0[1])
+    else:
+        yOffset = _getAngleOffset(angle, 1000)
+        t1 = (pt0[0] + 1000, pt0[1] + yOffset)
+        t2 = (pt0[0] - 1000, pt0[1] - yOffset)
+    indirect = _intersectLines((t1, t2), (pt2, pt3))
+    if indirect:
+        return dict(points=(pt0, indirect, pt2, pt3), intersection=indirect)
+    # bcp1 = segment, bcp2 = ray
+    angle = _calcAngle(pt3, pt2)
+    if angle in (90.0, 270.0):
+        t1 = (pt3[0], pt3[1] + 1000)
+        t2 = (pt3[0], pt3[1] - 1000)
+    else:
+        yOffset = _getAngleOffset(angle, 1000)
+        t1 = (pt3[0] + 1000, pt3[1] + yOffset)
+        t2 = (pt3[0] - 1000, pt3[1] - yOffset)
+    indirect = _intersectLines((t1, t2), (pt0, pt1))
+    if indirect:
+        return dict(points=(pt0, pt1, indirect, pt3), intersection=indirect)
+    return None
+
+registerTest(
+    identifier="crossedHandles",
+    level="segment",
+    title="Crossed Handles",
+    description="One or more curves contain crossed handles.",
+    testFunction=testForCrossedHandles,
+    severity="warning",
+    cost="expensive",
+    dependencies=("contours",)
+)
+
+# Unnecessary Handles
+
+def testForUnnecessaryHandles(glyph, geometry):
+    """
+    Handles shouldn't be used if they aren't doing anything.
+    """
+    unnecessaryHandles = {}
+    for index in range(geometry.contourCount):
+        for i, pt0, offCurves, pt3 in _iterSegmentPoints(geometry, index):
+            if geometry.segmentTypes[i] == "curve":
+                pt1, pt2 = offCurves
+                if _testUnnecessaryHandles(pt0, pt1, pt2, pt3):
+                    if index not in unnecessaryHandles:
+                        unnecessaryHandles[index] = []
+                    unnecessaryHandles[index].append((pt1, pt2))
+    return unnecessaryHandles
+
+def _testUnnecessaryHandles(pt0, pt1, pt2, pt3):
+    lineAngle = _calcAngle(pt0, pt3, 0)
+    bcpAngle1 = bcpAngle2 = None
+    if pt0 != pt1:
+        bcpAngle1 = _calcAngle(pt0, pt1, 0)
+    if pt2 != pt3:
+        bcpAngle2 = _calcAngle(pt2, pt3, 0)
+    return bcpAngle1 == lineAngle and bcpAngle2 == lineAngle
+
+registerTest(
+    identifier="unnecessaryHandles",
+    level="segment",
+    title="Unnecessary Handles",
+    description="One or more curves has unnecessary handles.",
+    testFunction=testForUnnecessaryHandles,
+    severity="warning",
+    cost="moderate",
+    dependencies=("contours",)
+)
+
+# Uneven Handles
+
+def testForUnevenHandles(glyph, geometry):
+    """
+    Handles should share the workload as evenly as possible.
+    """
+    unevenHandles = {}
+    for index in range(geometry.contourCount):
+        for i, on1, offCurves, on2 in _iterSegmentPoints(geometry, index):
+            if geometry.segmentTypes[i] == "curve":
+                off1, off2 = offCurves
+                data = _testUnevenHandles(on1, off1, off2, on2)
+                if data is not None:
+                    if index not in unevenHandles:
+                        unevenHandles[index] = []
+                    unevenHandles[index].append(data)
+    return unevenHandles
+
+def _testUnevenHandles(on1, off1, off2, on2):
+    # create rays perpendicular to the
+    # angle between the on and off
+    # through the on
+    curve = (on1, off1, off2, on2)
+    off1Angle = _calcAngle(on1, off1) - 90
+    on1Ray = _createLineThroughPoint(on1, off1Angle)
+    off2Angle = _calcAngle(off2, on2) - 90
+    on2Ray = _createLineThroughPoint(on2, off2Angle)
+    # find the intersection of the rays
+    rayIntersection = _intersectLines(on1Ray, on2Ray)
+    if rayIntersection is None:
+        return None
+    # draw a line between the off curves and the intersection
+    # and find out where these lines intersect the curve
+    off1Intersection = _getLineCurveIntersection((off1, rayIntersection), curve)
+    off2Intersection = _getLineCurveIntersection((off2, rayIntersection), curve)
+    if off1Intersection is None or off2Intersection is None:
+        return None
+    if not off1Intersection.points or not off2Intersection.points:
+        return None
+    off1IntersectionPoint = (off1Intersection.points[0].x, off1Intersection.points[0].y)
+    off2IntersectionPoint = (off2Intersection.points[0].x, off2Intersection.points[0].y)
+    # assemble the off curves and their intersections into lines
+    off1Line = (off1, off1IntersectionPoint)
+    off2Line = (off2, off2IntersectionPoint)
+    # measure and compare these
+    # if they are not both very short calculate the ratio
+    length1, length2 = sorted((_getLineLength(*off1Line), _getLineLength(*off2Line)))
+    if length1 < 3 or length2 < 3:
+        return None
+    ratio = length2 / float(length1)
+    # if outside acceptable range, flag
+    if ratio <= 1.5:
+        return None
+    off1Shape = _getUnevenHandleShape(on1, off1, off2, on2, off1Intersection, on1, off1IntersectionPoint, off1)
+    off2Shape = _getUnevenHandleShape(on1, off1, off2, on2, off2Intersection, off2IntersectionPoint, on2, off2)
+    return (off1, off2, off1Shape, off2Shape)
+
+def _getUnevenHandleShape(pt0, pt1, pt2, pt3, intersection, start, end, off):
+    splitSegments = ftBezierTools.splitCubicAtT(pt0, pt1, pt2, pt3, *intersection.t)
+    curves = []
+    for segment in splitSegments:
+        if _roundPoint(segment[0]) != _roundPoint(start) and not curves:
+            continue
+        curves.append(segment[1:])
+        if _roundPoint(segment[-1]) == _roundPoint(end):
+            break
+    return curves + [off, start]
+
+registerTest(
+    identifier="unevenHandles",
+    level="segment",
+    title="Uneven Handles",
+    description="One or more curves has uneven handles.",
+    testFunction=testForUnevenHandles,
+    severity="info",
+    cost="expensive",
+    dependencies=("contours",)
+)
+
+# -----------------
+# Point Level Tests
+# -----------------
+
+# Stray Points
+
+def testForStrayPoints(glyph, geometry):
+    """
+    There should be no stray points.
+    """
+    strayPoints = {}
+    for index in range(geometry.contourCount):
+        start, end = geometry.getContourRange(index)
+        if end - start == 1:
+            strayPoints[index] = geometry.onCurves[start]
+    return strayPoints
+
+registerTest(
+    identifier="strayPoints",
+    level="point",
+    title="Stray Points",
+    description="One or more stray points are present.",
+    testFunction=testForStrayPoints,
+    severity="error",
+    cost="cheap",
+    dependencies=("contours",)
+)
+
+# Unnecessary Points
+
+def testForUnnecessaryPoints(glyph, geometry):
+    """
+    Consecutive segments shouldn't have the same angle.
+    """
+    unnecessaryPoints = {}
+    segmentTypes = geometry.segmentTypes
+    onCurves = geometry.onCurves
+    for index in range(geometry.contourCount):
+        start, end = geometry.getContourRange(index)
+        for i in range(start, end):
+            if segmentTypes[i] == "line":
+                prev = i - 1 if i > start else end - 1
+                next = i + 1 if i + 1 < end else start
+                if segmentTypes[next] == "line":
+                    thisAngle = _calcAngle(onCurves[prev], onCurves[i])
+                    nextAngle = _calcAngle(onCurves[i], onCurves[next])
+                    if thisAngle == nextAngle:
+                        if index not in unnecessaryPoints:
+                            unnecessaryPoints[index] = []
+                        unnecessaryPoints[index].append(onCurves[i])
+    return unnecessaryPoints
+
+registerTest(
+    identifier="unnecessaryPoints",
+    level="point",
+    title="Unnecessary Points",
+    description="One or more unnecessary points are present in lines.",
+    testFunction=testForUnnecessaryPoints,
+    severity="warning",
+    cost="cheap",
+    dependencies=("contours",)
+)
+
+# Overlapping Points
+
+def testForOverlappingPoints(glyph, geometry):
+    """
+    Consequtive points should not overlap.
+    """
+    overlappingPoints = {}
+    for index in range(geometry.contourCount):
+        start, end = geometry.getContourRange(index)
+        if end - start == 1:
+            continue
+        for i, prev, offCurves, point in _iterSegmentPoints(geometry, index):
+            if point == prev:
+                if index not in overlappingPoints:
+                    overlappingPoints[index] = set()
+                overlappingPoints[index].add(point)
+    return overlappingPoints
+
+registerTest(
+    identifier="overlappingPoints",
+    level="point",
+    title="Overlapping Points",
+    description="Two or more points are overlapping.",
+    testFunction=testForOverlappingPoints,
+    severity="error",
+    cost="cheap",
+    dependencies=("contours",)
+)
+
+# Near Coincident Points
+
+nearCoincidentPointDistance = 2
+
+def testForNearCoincidentPoints(glyph, geometry):
+    """
+    Points in different contours or components
+    should either be in the same place or not
+    be almost in the same place.
+    """
+    pairs = set()
+    distance = nearCoincidentPointDistance
+    grid = geometry.getSpatialGrid()
+    onCurves = geometry.onCurves
+    segmentContours = grid.segmentContours
+    for i, point in enumerate(onCurves):
+        for j in grid.getPointsNear(point, distance):
+            if j > i and segmentContours[i] != segmentContours[j] and onCurves[j] != point:
+                pairs.add(tuple(sorted((point, onCurves[j]))))
+    components = [componentGeometry.onCurves for componentGeometry in _getComponentGeometries(glyph)]
+    if components:
+        componentGrid = {}
+        for componentIndex, points in enumerate(components):
+            for point in points:
+                for j in grid.getPointsNear(point, distance):
+                    if onCurves[j] != point:
+                        pairs.add(tuple(sorted((point, onCurves[j]))))
+                # compare to the points of the other
+                # components with a grid of their own
+                x = int(math.floor(point[0] / distance))
+                y = int(math.floor(point[1] / distance))
+                for cellX in (x - 1, x, x + 1):
+                    for cellY in (y - 1, y, y + 1):
+                        for otherIndex, other in componentGrid.get((cellX, cellY), ()):
+                            if otherIndex != componentIndex and other != point and _calcDistance(point, other) <= distance:
+                                pairs.add(tuple(sorted((point, other))))
+                cell = (x, y)
+                if cell not in componentGrid:
+                    componentGrid[cell] = []
+                componentGrid[cell].append((componentIndex, point))
+    return sorted(pairs)
+
+registerTest(
+    identifier="nearCoincidentPoints",
+    level="point",
+    title="Near Coincident Points",
+    description="Points in different contours or components are almost in the same place.",
+    testFunction=testForNearCoincidentPoints,
+    severity="warning",
+    cost="moderate",
+    dependencies=("contours", "components", "componentBases")
+)
+
+
+# --------------
+# Test Utilities
+# --------------
+
+def _getUnicodeIndex(font):
+    """
+    Get the code point to glyph names index for the font.
+    This is defcon's unicodeData, so it is built once per
+    font, kept up to date as glyph unicodes change and
+    shared by everything that has access to the font.
+    """
+    return font.naked().unicodeData
+
+def _getFont(glyph):
+    # fontParts uses glyph.font, RoboFab uses glyph.getParent()
+    font = getattr(glyph, "font", None)
+    if font is None:
+        font = glyph.getParent()
+    return font
+
+def _getBounds(obj):
+    # fontParts uses obj.bounds, RoboFab uses obj.box
+    if hasattr(obj, "bounds"):
+        return obj.bounds
+    return obj.box
+
+def _unwrapPoint(pt):
+    return pt.x, pt.y
+
+def _roundPoint(pt):
+    return round(pt[0]), round(pt[1])
+
+def _intersectLines(line1, line2):
+    # adapted from: http://www.kevlindev.com/gui/math/intersection/Intersection.js
+    a1, a2 = line1
+    b1, b2 = line2
+    ua_t = (b2[0] - b1[0]) * (a1[1] - b1[1]) - (b2[1] - b1[1]) * (a1[0] - b1[0])
+    ub_t = (a2[0] - a1[0]) * (a1[1] - b1[1]) - (a2[1] - a1[1]) * (a1[0] - b1[0])
+    u_b  = (b2[1] - b1[1]) * (a2[0] - a1[0]) - (b2[0] - b1[0]) * (a2[1] - a1[1])
+    if u_b != 0:
+        ua = ua_t / float(u_b)
+        ub = ub_t / float(u_b)
+        if 0 <= ua and ua <= 1 and 0 <= ub and ub <= 1:
+            return a1[0] + ua * (a2[0] - a1[0]), a1[1] + ua * (a2[1] - a1[1])
+        else:
+            return None
+    else:
+        return None
+
+def _calcAngle(point1, point2, r=None):
+    if not isinstance(point1, tuple):
+        point1 = _unwrapPoint(point1)
+    if not isinstance(point2, tuple):
+        point2 = _unwrapPoint(point2)
+    width = point2[0] - point1[0]
+    height = point2[1] - point1[1]
+    angle = round(math.atan2(height, width) * 180 / math.pi, 3)
+    if r is not None:
+        angle = round(angle, r)
+    return angle
+
+def _getAngleOffset(angle, distance):
+    A = 90
+    B = angle
+    C = 180 - (A + B)
+    if C == 0:
+        return 0
+    c = distance
+    A = math.radians(A)
+    B = math.radians(B)
+    C = math.radians(C)
+    b = (c * math.sin(B)) / math.sin(C)
+    return round(b, 5)
+
+def _createLineThroughPoint(pt, angle):
+    angle = math.radians(angle)
+    length = 100000
+    x1 = math.cos(angle) * -length + pt[0]
+    y1 = math.sin(angle) * -length + pt[1]
+    x2 = math.cos(angle) * length + pt[0]
+    y2 = math.sin(angle) * length + pt[1]
+    return (x1, y1), (x2, y2)
+
+def _getLineLength(pt1, pt2):
+    return math.hypot(pt1[0] - pt2[0], pt1[1] - pt2[1])
+
+def _getAreaOfTriangle(pt1, pt2, pt3):
+    a = _getLineLength(pt1, pt2)
+    b = _getLineLength(pt2, pt3)
+    c = _getLineLength(pt3, pt1)
+    s = (a + b + c) / 2.0
+    area = math.sqrt(s * (s - a) * (s - b) * (s - c))
+    return area
+
+def _getLineCurveIntersection(line, curve):
+    points = curve + line
+    intersection = _intersectCubicLine(*points)
+    return intersection
+
+_IntersectionPoint = namedtuple("_IntersectionPoint", "x y")
+
+class _Intersection(object):
+
+    def __init__(self):
+        self.points = []
+        self.t = []
+
+def _intersectCubicLine(p1, p2, p3, p4, a1, a2):
+    # adapted from: http://www.kevlindev.com/gui/math/intersection/Intersection.js
+    # coefficients of the cubic
+    c3 = (-p1[0] + 3 * p2[0] - 3 * p3[0] + p4[0], -p1[1] + 3 * p2[1] - 3 * p3[1] + p4[1])
+    c2 = (3 * p1[0] - 6 * p2[0] + 3 * p3[0], 3 * p1[1] - 6 * p2[1] + 3 * p3[1])
+    c1 = (-3 * p1[0] + 3 * p2[0], -3 * p1[1] + 3 * p2[1])
+    c0 = p1
+    # normal form of the line
+    n = (a1[1] - a2[1], a2[0] - a1[0])
+    cl = a1[0] * a2[1] - a2[0] * a1[1]
+    # used to determine if a point is on the line segment
+    xMin = min(a1[0], a2[0])
+    yMin = min(a1[1], a2[1])
+    xMax = max(a1[0], a2[0])
+    yMax = max(a1[1], a2[1])
+    roots = ftBezierTools.solveCubic(
+        n[0] * c3[0] + n[1] * c3[1],
+        n[0] * c2[0] + n[1] * c2[1],
+        n[0] * c1[0] + n[1] * c1[1],
+        n[0] * c0[0] + n[1] * c0[1] + cl
+    )
+    result = _Intersection()
+    for t in roots:
+        if not 0 <= t <= 1:
+            continue
+        p5 = _interpolatePoint(p1, p2, t)
+        p6 = _interpolatePoint(p2, p3, t)
+        p7 = _interpolatePoint(p3, p4, t)
+        p8 = _interpolatePoint(p5, p6, t)
+        p9 = _interpolatePoint(p6, p7, t)
+        x, y = _interpolatePoint(p8, p9, t)
+        if a1[0] == a2[0]:
+            onLine = yMin <= y <= yMax
+        elif a1[1] == a2[1]:
+            onLine = xMin <= x <= xMax
+        else:
+            onLine = xMin <= x <= xMax and yMin <= y <= yMax
+        if onLine:
+            result.points.append(_IntersectionPoint(x, y))
+            result.t.append(t)
+    return result
+
+def _interpolatePoint(pt1, pt2, t):
+    return pt1[0] + (pt2[0] - pt1[0]) * t, pt1[1] + (pt2[1] - pt1[1]) * t
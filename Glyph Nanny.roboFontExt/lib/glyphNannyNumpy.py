@@ -0,0 +1,362 @@
+"""
+A NumPy backend for the segment level tests.
+
+The segments of any number of glyphs are packed into
+arrays and each test is evaluated for all of them at
+once. The array math is only used to rule segments out.
+The segments that remain are confirmed with the same
+functions that the scalar tests use, so the results
+are identical to the scalar path.
+
+NumPy is optional. If it is not installed, available
+is False and the scalar tests should be used.
+
+Running this module compares the two paths on UFOs:
+
+    python glyphNannyNumpy.py MyFont-Regular.ufo
+"""
+
+import glyphNannyCore
+from glyphNannyProfiler import profiler
+from glyphNannyCore import GlyphGeometry, _iterSegmentPoints, _testStraightLine, _testComplexCurve, _testCrossedHandles, _testUnnecessaryHandles, _testUnevenHandles
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+available = numpy is not None
+
+segmentTests = [
+    "straightLines",
+    "complexCurves",
+    "crossedHandles",
+    "unnecessaryHandles",
+    "unevenHandles"
+]
+
+# Tolerance used to widen the array tests so
+# that floating point differences between the
+# array math and the scalar math can only add
+# candidates, never remove them.
+tolerance = 1e-6
+
+# -------
+# Packing
+# -------
+
+class SegmentArrays(object):
+
+    """
+    The line and curve segments of a list of GlyphGeometry objects.
+
+    lines is a (n, 2, 2) array and curves is a (n, 4, 2)
+    array. lineData and curveData hold the original point
+    tuples and lineOwners and curveOwners hold the glyph
+    and contour index of each segment.
+    """
+
+    def __init__(self, geometries):
+        lines = []
+        lineOwners = []
+        curves = []
+        curveOwners = []
+        for glyphIndex, geometry in enumerate(geometries):
+            segmentTypes = geometry.segmentTypes
+            for contourIndex in range(geometry.contourCount):
+                for i, prev, offCurves, point in _iterSegmentPoints(geometry, contourIndex):
+                    if segmentTypes[i] == "line":
+                        lines.append((prev, point))
+                        lineOwners.append((glyphIndex, contourIndex))
+                    elif segmentTypes[i] == "curve":
+                        pt1, pt2 = offCurves
+                        curves.append((prev, pt1, pt2, point))
+                        curveOwners.append((glyphIndex, contourIndex))
+        self.glyphCount = len(geometries)
+        self.lineData = lines
+        self.lineOwners = lineOwners
+        self.curveData = curves
+        self.curveOwners = curveOwners
+        self.lines = numpy.array(lines, dtype=float).reshape((len(lines), 2, 2))
+        self.curves = numpy.array(curves, dtype=float).reshape((len(curves), 4, 2))
+
+# -------------
+# Array Filters
+# -------------
+
+def _cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+def _mayIntersect(a1, a2, b1, b2):
+    """
+    Mask of the line pairs that may intersect. This
+    is the same parametric test as _intersectLines
+    with the range widened by the tolerance. Nearly
+    parallel pairs are always included.
+    """
+    da = a2 - a1
+    db = b2 - b1
+    d = a1 - b1
+    denominator = _cross(da, db)
+    magnitude = numpy.hypot(da[:, 0], da[:, 1]) * numpy.hypot(db[:, 0], db[:, 1])
+    nearlyParallel = numpy.abs(denominator) <= tolerance * numpy.maximum(magnitude, 1.0)
+    safe = numpy.where(denominator == 0, 1.0, denominator)
+    ua = _cross(db, d) / safe
+    ub = _cross(da, d) / safe
+    inRange = (ua >= -tolerance) & (ua <= 1 + tolerance) & (ub >= -tolerance) & (ub <= 1 + tolerance)
+    return inRange | nearlyParallel
+
+def filterStraightLines(lines):
+    delta = numpy.abs(lines[:, 0] - lines[:, 1])
+    return (((delta[:, 0] > 0) & (delta[:, 0] <= 5)) | ((delta[:, 1] > 0) & (delta[:, 1] <= 5)))
+
+def filterComplexCurves(curves):
+    return _mayIntersect(curves[:, 0], curves[:, 3], curves[:, 1], curves[:, 2])
+
+def filterCrossedHandles(curves):
+    # an intersection with either handle's ray, including
+    # the direct intersection, needs the other handle's
+    # points to be on opposite sides of that ray's line
+    pt0, pt1, pt2, pt3 = curves[:, 0], curves[:, 1], curves[:, 2], curves[:, 3]
+    mask = numpy.zeros(len(curves), dtype=bool)
+    for start, end, other1, other2 in ((pt0, pt1, pt2, pt3), (pt3, pt2, pt0, pt1)):
+        direction = end - start
+        # a zero length handle is treated as a horizontal ray
+        degenerate = (direction[:, 0] == 0) & (direction[:, 1] == 0)
+        direction = numpy.where(degenerate[:, None], numpy.array([1.0, 0.0]), direction)
+        length = numpy.hypot(direction[:, 0], direction[:, 1])
+        sides = []
+        for other in (other1, other2):
+            offset = other - start
+            distance = numpy.hypot(offset[:, 0], offset[:, 1])
+            # sine of the angle between the ray and the point
+            sides.append(_cross(direction, offset) / (length * numpy.maximum(distance, 1e-12)))
+        side1, side2 = sides
+        # the scalar rays use angles rounded to three
+        # decimals, so points that are nearly on the
+        # line could be on either side of it
+        mask |= (side1 * side2 <= 0) | (numpy.abs(side1) <= 1e-4) | (numpy.abs(side2) <= 1e-4)
+    # the first ray is horizontal if the
+    # handle's angle rounds to 90 degrees
+    angle = _angles(pt0, pt1)
+    mask |= numpy.abs(angle - 90) <= 1e-3
+    return mask
+
+def filterUnnecessaryHandles(curves):
+    # the rounded angles can only match if the
+    # handles are within a degree of the line
+    pt0, pt1, pt2, pt3 = curves[:, 0], curves[:, 1], curves[:, 2], curves[:, 3]
+    lineAngle = _angles(pt0, pt3)
+    mask = numpy.ones(len(curves), dtype=bool)
+    for start, end in ((pt0, pt1), (pt2, pt3)):
+        delta = end - start
+        mask &= (delta[:, 0] != 0) | (delta[:, 1] != 0)
+        difference = numpy.abs(_angles(start, end) - lineAngle) % 360
+        difference = numpy.minimum(difference, 360 - difference)
+        mask &= difference <= 1 + tolerance
+    return mask
+
+def _angles(pt1, pt2):
+    delta = pt2 - pt1
+    return numpy.degrees(numpy.arctan2(delta[:, 1], delta[:, 0]))
+
+def filterUnevenHandles(curves):
+    """
+    Mask of the curves that may have uneven handles. The
+    intersections of the lines from the off curves to the
+    intersection of the perpendicular rays are found with
+    a batched eigenvalue solve of the cubics.
+    """
+    on1, off1, off2, on2 = curves[:, 0], curves[:, 1], curves[:, 2], curves[:, 3]
+    count = len(curves)
+    # perpendiculars to the handles through the on curves
+    normal1 = off1 - on1
+    normal2 = on2 - off2
+    normal1 = numpy.where(((normal1[:, 0] == 0) & (normal1[:, 1] == 0))[:, None], numpy.array([1.0, 0.0]), normal1)
+    normal2 = numpy.where(((normal2[:, 0] == 0) & (normal2[:, 1] == 0))[:, None], numpy.array([1.0, 0.0]), normal2)
+    ray1 = numpy.stack((-normal1[:, 1], normal1[:, 0]), axis=1)
+    ray2 = numpy.stack((-normal2[:, 1], normal2[:, 0]), axis=1)
+    denominator = _cross(ray1, ray2)
+    parallel = numpy.abs(denominator) <= tolerance * numpy.hypot(ray1[:, 0], ray1[:, 1]) * numpy.hypot(ray2[:, 0], ray2[:, 1])
+    safe = numpy.where(parallel, 1.0, denominator)
+    s = _cross(on2 - on1, ray2) / safe
+    rayIntersection = on1 + ray1 * s[:, None]
+    # coefficients of the curves
+    c3 = -on1 + 3 * off1 - 3 * off2 + on2
+    c2 = 3 * on1 - 6 * off1 + 3 * off2
+    c1 = -3 * on1 + 3 * off1
+    c0 = on1
+    lengths = []
+    unsure = parallel.copy()
+    for off in (off1, off2):
+        n = numpy.stack((off[:, 1] - rayIntersection[:, 1], rayIntersection[:, 0] - off[:, 0]), axis=1)
+        cl = off[:, 0] * rayIntersection[:, 1] - rayIntersection[:, 0] * off[:, 1]
+        a = (n * c3).sum(axis=1)
+        b = (n * c2).sum(axis=1)
+        c = (n * c1).sum(axis=1)
+        d = (n * c0).sum(axis=1) + cl
+        scale = numpy.maximum(numpy.maximum(numpy.abs(a), numpy.abs(b)), numpy.maximum(numpy.abs(c), numpy.abs(d)))
+        scale = numpy.maximum(scale, 1.0)
+        # cubics that are close to being lower
+        # order are left to the scalar code
+        lowOrder = numpy.abs(a) <= 1e-3 * scale
+        unsure |= lowOrder
+        safeA = numpy.where(lowOrder, 1.0, a)
+        companion = numpy.zeros((count, 3, 3))
+        companion[:, 0, 0] = -b / safeA
+        companion[:, 0, 1] = -c / safeA
+        companion[:, 0, 2] = -d / safeA
+        companion[:, 1, 0] = 1
+        companion[:, 2, 1] = 1
+        if count:
+            roots = numpy.linalg.eigvals(companion)
+        else:
+            roots = numpy.zeros((0, 3), dtype=complex)
+        real = numpy.abs(roots.imag) <= 1e-4
+        t = roots.real
+        valid = real & (t >= -tolerance) & (t <= 1 + tolerance)
+        # points on the curve
+        t3 = t[..., None]
+        points = ((c3[:, None] * t3 + c2[:, None]) * t3 + c1[:, None]) * t3 + c0[:, None]
+        # must be on the line segment
+        lo = numpy.minimum(off, rayIntersection)[:, None] - 1e-3
+        hi = numpy.maximum(off, rayIntersection)[:, None] + 1e-3
+        valid &= numpy.all((points >= lo) & (points <= hi), axis=2)
+        length = numpy.hypot(points[..., 0] - off[:, None, 0], points[..., 1] - off[:, None, 1])
+        lengths.append(numpy.where(valid, length, numpy.nan))
+    # compare every possible pair of intersections
+    length1 = lengths[0][:, :, None]
+    length2 = lengths[1][:, None, :]
+    short = numpy.fmin(length1, length2)
+    long = numpy.fmax(length1, length2)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        possible = (short >= 3 - 1e-3) & (long > (1.5 - 1e-3) * short)
+    possible = possible.reshape((count, 9)).any(axis=1)
+    return (possible & ~parallel) | unsure
+
+# -----
+# Tests
+# -----
+
+def getSegmentReports(geometries, identifiers=None, durations=None):
+    """
+    Run the segment tests listed in identifiers on
+    a list of GlyphGeometry objects. A list with a
+    dict of test identifiers and results for each
+    geometry is returned. If durations is a dict,
+    the seconds spent on each test are added to it.
+    The time spent packing the arrays is shared
+    equally by the tests.
+    """
+    if identifiers is None:
+        identifiers = segmentTests
+    clock = profiler.clock
+    start = clock()
+    arrays = SegmentArrays(geometries)
+    reports = [dict((identifier, {}) for identifier in identifiers) for geometry in geometries]
+    if durations is not None and identifiers:
+        packing = (clock() - start) / len(identifiers)
+        for identifier in identifiers:
+            durations[identifier] = durations.get(identifier, 0) + packing
+    if "straightLines" in identifiers:
+        start = clock()
+        for i in numpy.nonzero(filterStraightLines(arrays.lines))[0]:
+            pt0, pt1 = arrays.lineData[i]
+            if _testStraightLine(pt0, pt1):
+                glyphIndex, contourIndex = arrays.lineOwners[i]
+                reports[glyphIndex]["straightLines"].setdefault(contourIndex, set()).add((pt0, pt1))
+        if durations is not None:
+            durations["straightLines"] = durations.get("straightLines", 0) + clock() - start
+    curveTests = [
+        ("complexCurves", filterComplexCurves, _testComplexCurve),
+        ("crossedHandles", filterCrossedHandles, _testCrossedHandles),
+        ("unnecessaryHandles", filterUnnecessaryHandles, _testUnnecessaryHandles),
+        ("unevenHandles", filterUnevenHandles, _testUnevenHandles)
+    ]
+    for identifier, filterFunction, testFunction in curveTests:
+        if identifier not in identifiers:
+            continue
+        start = clock()
+        for i in numpy.nonzero(filterFunction(arrays.curves))[0]:
+            pt0, pt1, pt2, pt3 = arrays.curveData[i]
+            data = testFunction(pt0, pt1, pt2, pt3)
+            if not data:
+                continue
+            if identifier == "complexCurves":
+                data = (pt0, pt1, pt2, pt3)
+            elif identifier == "unnecessaryHandles":
+                data = (pt1, pt2)
+            glyphIndex, contourIndex = arrays.curveOwners[i]
+            reports[glyphIndex][identifier].setdefault(contourIndex, []).append(data)
+        if durations is not None:
+            durations[identifier] = durations.get(identifier, 0) + clock() - start
+    return reports
+
+def getGlyphReports(font, glyphNames, testStates):
+    """
+    Get the reports for the named glyphs. The
+    segment tests use the arrays and all other
+    tests use the scalar functions. The reports
+    are the same as getGlyphReport's.
+    """
+    glyphs = [font[name] for name in glyphNames]
+    geometries = [GlyphGeometry(glyph) for glyph in glyphs]
+    segmentStates = dict(testStates)
+    for identifier in segmentTests:
+        segmentStates[identifier] = False
+    identifiers = [identifier for identifier in segmentTests if testStates.get(identifier, True)]
+    durations = None
+    if profiler.enabled:
+        durations = {}
+    segmentReports = getSegmentReports(geometries, identifiers, durations)
+    if durations:
+        _recordSegmentTimings(glyphs, geometries, segmentReports, durations)
+    reports = []
+    for glyph, geometry, segmentReport in zip(glyphs, geometries, segmentReports):
+        report = glyphNannyCore.getGlyphReport(font, glyph, segmentStates, geometry=geometry)
+        report.update(segmentReport)
+        reports.append(report)
+    return reports
+
+def _recordSegmentTimings(glyphs, geometries, segmentReports, durations):
+    # the tests ran on all glyphs at once, so each
+    # glyph is given a share of the time for its
+    # number of segments
+    counts = [len(geometry.onCurves) for geometry in geometries]
+    total = sum(counts)
+    for identifier, duration in durations.items():
+        for glyph, count, segmentReport in zip(glyphs, counts, segmentReports):
+            if total:
+                share = duration * count / float(total)
+            else:
+                share = duration / len(glyphs)
+            profiler.record(identifier, glyph.name, share, segmentReport[identifier])
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from fontParts.world import OpenFont
+
+    for path in sys.argv[1:]:
+        font = OpenFont(path, showInterface=False)
+        glyphs = [font[name] for name in glyphNannyCore.getGlyphOrder(font)]
+        geometries = [GlyphGeometry(glyph) for glyph in glyphs]
+        arrays = SegmentArrays(geometries)
+        segmentCount = len(arrays.lines) + len(arrays.curves)
+        start = time.time()
+        scalar = []
+        for glyph, geometry in zip(glyphs, geometries):
+            scalar.append(dict((identifier, glyphNannyCore.testRegistry[identifier]["testFunction"](glyph, geometry)) for identifier in segmentTests))
+        scalarTime = time.time() - start
+        start = time.time()
+        vectorized = getSegmentReports(geometries)
+        vectorizedTime = time.time() - start
+        mismatches = [glyph.name for glyph, a, b in zip(glyphs, scalar, vectorized) if repr(a) != repr(b)]
+        print("%s: %d glyphs, %d segments" % (path, len(glyphs), segmentCount))
+        print("  scalar: %.3f seconds, %d segments per second" % (scalarTime, segmentCount / max(scalarTime, 1e-9)))
+        print("  numpy: %.3f seconds, %d segments per second" % (vectorizedTime, segmentCount / max(vectorizedTime, 1e-9)))
+        if mismatches:
+            print("  results differ: %s" % " ".join(mismatches))
+        else:
+            print("  results are identical")
+        font.close()
@@ -0,0 +1,175 @@
+"""
+Sinks that write font reports as they are made.
+
+    sink = getReportSink("jsonl", sys.stdout)
+    writeFontReport(font, iterFontReport(font, testStates), sink)
+
+Each sink is told about the start and end of each
+font and is given the glyph reports one at a time,
+so nothing has to be held in memory and the output
+can be read while the font is still being tested.
+Only glyphs that have problems are written.
+"""
+
+import os
+import csv
+from glyphNannyCore import testRegistry, formatFontTitle, formatGlyphReport, getReportProblems
+from glyphNannyRecords import getGlyphRecords, getJSONLinesHeader, recordToJSON, BinaryRecordWriter
+
+# -----
+# Sinks
+# -----
+
+class BaseReportSink(object):
+
+    """
+    stream is a file-like object. Subclasses must
+    implement addGlyph(name, report), which writes the
+    report for the glyph named name and returns True
+    if the glyph has problems. beginFont and endFont
+    may be overridden to write a header and a footer.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def beginFont(self, font):
+        pass
+
+    def endFont(self):
+        pass
+
+    def write(self, text):
+        self.stream.write(text)
+        self.stream.flush()
+
+
+class TextReportSink(BaseReportSink):
+
+    """
+    The same text as formatFontReport.
+    """
+
+    def beginFont(self, font):
+        self.write(formatFontTitle(font) + "\n")
+
+    def addGlyph(self, name, report):
+        text = formatGlyphReport(name, report)
+        if not text:
+            return False
+        self.write("\n" + text + "\n")
+        return True
+
+    def endFont(self):
+        self.write("\n")
+
+
+class JSONLinesReportSink(BaseReportSink):
+
+    """
+    The glyphNannyRecords schema header followed
+    by one line per record.
+    """
+
+    def __init__(self, stream):
+        super(JSONLinesReportSink, self).__init__(stream)
+        self.write(getJSONLinesHeader() + "\n")
+
+    def beginFont(self, font):
+        self._fontName = _getFontName(font)
+
+    def addGlyph(self, name, report):
+        records = getGlyphRecords(self._fontName, name, report)
+        if not records:
+            return False
+        self.write("".join([recordToJSON(record) + "\n" for record in records]))
+        return True
+
+
+class BinaryReportSink(BaseReportSink):
+
+    """
+    The glyphNannyRecords binary encoding.
+    stream must accept bytes.
+    """
+
+    def __init__(self, stream):
+        super(BinaryReportSink, self).__init__(stream)
+        self._writer = BinaryRecordWriter(stream)
+
+    def beginFont(self, font):
+        self._fontName = _getFontName(font)
+
+    def addGlyph(self, name, report):
+        records = getGlyphRecords(self._fontName, name, report)
+        for record in records:
+            self._writer.write(record)
+        self._writer.flush()
+        return bool(records)
+
+
+class CSVReportSink(BaseReportSink):
+
+    """
+    One row per problem with font, glyph,
+    test, severity and description columns.
+    """
+
+    columns = ["font", "glyph", "test", "severity", "description"]
+
+    def __init__(self, stream):
+        super(CSVReportSink, self).__init__(stream)
+        self._writer = csv.writer(stream)
+        self._writer.writerow(self.columns)
+
+    def beginFont(self, font):
+        self._fontName = _getFontName(font)
+
+    def addGlyph(self, name, report):
+        problems = getReportProblems(report)
+        for identifier in problems:
+            data = testRegistry[identifier]
+            self._writer.writerow([self._fontName, name, identifier, data["severity"], data["description"]])
+        self.stream.flush()
+        return bool(problems)
+
+
+def _getFontName(font):
+    if font.path is None:
+        return None
+    return os.path.basename(font.path)
+
+# --------
+# Registry
+# --------
+
+reportSinks = dict(
+    text=TextReportSink,
+    jsonl=JSONLinesReportSink,
+    csv=CSVReportSink,
+    binary=BinaryReportSink
+)
+
+# Formats that must be written to a binary stream.
+binaryReportFormats = set(["binary"])
+
+def getReportSink(format, stream):
+    """
+    Get a sink for format writing to stream.
+    """
+    return reportSinks[format](stream)
+
+def writeFontReport(font, reports, sink):
+    """
+    Write the (glyph name, report) pairs in reports
+    to sink. reports may be any iterable, such as
+    iterFontReport or iterFontReportParallel. The
+    number of glyphs with problems is returned.
+    """
+    problems = 0
+    sink.beginFont(font)
+    for name, report in reports:
+        if sink.addGlyph(name, report):
+            problems += 1
+    sink.endFont()
+    return problems
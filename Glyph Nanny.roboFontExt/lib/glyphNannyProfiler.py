@@ -0,0 +1,156 @@
+"""
+Opt-in timing of the Glyph Nanny tests.
+
+    from glyphNannyProfiler import profiler
+    profiler.enabled = True
+    ...
+    print(profiler.toJSON())
+
+While the profiler is enabled, every test that is run
+through glyphNannyCore.runTest is timed. For each test
+the call count, the total time and the size of the
+results are kept along with a histogram of the most
+recent durations. The totals are also kept for the
+most recently tested glyphs.
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+
+try:
+    _clock = time.perf_counter
+except AttributeError:
+    _clock = time.time
+
+# The upper edges of the histogram
+# buckets in milliseconds.
+histogramEdges = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000)
+
+
+class TestProfiler(object):
+
+    """
+    windowSize is the number of recent durations
+    that are kept per test. glyphLimit is the number
+    of glyphs that per glyph totals are kept for.
+    """
+
+    def __init__(self, windowSize=1000, glyphLimit=500):
+        self.enabled = False
+        self.windowSize = windowSize
+        self.glyphLimit = glyphLimit
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._tests = {}
+            self._glyphs = OrderedDict()
+
+    def clock(self):
+        return _clock()
+
+    def record(self, identifier, glyphName, duration, result):
+        """
+        Record a run of the test identifier on the glyph
+        named glyphName that took duration seconds.
+        """
+        size = getResultSize(result)
+        with self._lock:
+            data = self._tests.get(identifier)
+            if data is None:
+                data = self._tests[identifier] = dict(calls=0, time=0.0, size=0, maximum=0.0, recent=deque(maxlen=self.windowSize))
+            data["calls"] += 1
+            data["time"] += duration
+            data["size"] += size
+            data["maximum"] = max(data["maximum"], duration)
+            data["recent"].append(duration)
+            glyphData = self._glyphs.pop(glyphName, None)
+            if glyphData is None:
+                glyphData = {}
+            calls, total, glyphSize = glyphData.get(identifier, (0, 0.0, 0))
+            glyphData[identifier] = (calls + 1, total + duration, glyphSize + size)
+            self._glyphs[glyphName] = glyphData
+            if len(self._glyphs) > self.glyphLimit:
+                self._glyphs.popitem(last=False)
+
+    def getTestSummary(self):
+        """
+        Get a dict of test identifiers and their
+        calls, total time, mean time, 95th percentile
+        and maximum of the recent times, result size
+        and histogram. Times are in milliseconds.
+        """
+        summary = {}
+        with self._lock:
+            for identifier, data in self._tests.items():
+                recent = sorted(data["recent"])
+                p95 = 0
+                if recent:
+                    p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))]
+                summary[identifier] = dict(
+                    calls=data["calls"],
+                    total=data["time"] * 1000,
+                    mean=data["time"] * 1000 / data["calls"],
+                    p95=p95 * 1000,
+                    maximum=data["maximum"] * 1000,
+                    size=data["size"],
+                    histogram=_makeHistogram(recent)
+                )
+        return summary
+
+    def getGlyphSummary(self):
+        """
+        Get a dict of glyph names and dicts of test
+        identifiers and their calls, total time in
+        milliseconds and result size.
+        """
+        summary = {}
+        with self._lock:
+            for glyphName, glyphData in self._glyphs.items():
+                summary[glyphName] = dict([(identifier, dict(calls=calls, total=total * 1000, size=size)) for identifier, (calls, total, size) in glyphData.items()])
+        return summary
+
+    def toJSON(self):
+        data = dict(
+            histogramEdges=histogramEdges,
+            tests=self.getTestSummary(),
+            glyphs=self.getGlyphSummary()
+        )
+        return json.dumps(data, indent=2, sort_keys=True)
+
+
+def _makeHistogram(durations):
+    counts = [0] * (len(histogramEdges) + 1)
+    for duration in durations:
+        duration *= 1000
+        for i, edge in enumerate(histogramEdges):
+            if duration < edge:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return counts
+
+def getResultSize(result):
+    """
+    Get the number of things a test found.
+    """
+    if not result:
+        return 0
+    if isinstance(result, dict):
+        size = 0
+        for value in result.values():
+            if isinstance(value, (list, tuple, set, dict)):
+                size += len(value)
+            elif value:
+                size += 1
+        return size
+    if isinstance(result, (list, set)):
+        return len(result)
+    return 1
+
+
+profiler = TestProfiler()
@@ -0,0 +1,279 @@
+"""
+Glyph reports as flat records with a stable schema.
+
+The reports made by the tests are nested data that
+is only meant for the drawing functions. This module
+turns them into records that can be stored and loaded
+without running the tests again:
+
+    font      the file name of the font or None
+    glyph     the glyph name
+    test      the test identifier
+    severity  "error", "warning" or "info"
+    contour   the contour index or None
+    points    a tuple of (x, y) coordinates
+    message   a description of the problem
+
+Records can be written as JSON Lines or in a compact
+binary form. Increase schemaVersion if the fields or
+the encodings change.
+"""
+
+import json
+import struct
+from collections import namedtuple
+from glyphNannyCore import testRegistry, reportOrder
+
+schemaName = "com.typesupply.GlyphNanny.report"
+schemaVersion = 1
+
+ReportRecord = namedtuple("ReportRecord", "font glyph test severity contour points message")
+
+# -------
+# Records
+# -------
+
+def getGlyphRecords(fontName, glyphName, report):
+    """
+    Get the records for a glyph report in reportOrder.
+    """
+    records = []
+    for identifier in reportOrder:
+        value = report.get(identifier)
+        if not value:
+            continue
+        severity = testRegistry[identifier]["severity"]
+        description = testRegistry[identifier]["description"]
+        builder = _recordBuilders.get(identifier, _buildGlyphRecord)
+        for contour, points, message in builder(value):
+            if message is None:
+                message = description
+            points = tuple([(pt[0], pt[1]) for pt in points])
+            records.append(ReportRecord(fontName, glyphName, identifier, severity, contour, points, message))
+    return records
+
+# Each builder turns the value of a test in a report
+# into a list of (contour index, points, message).
+# A message of None means the test's description.
+
+def _buildGlyphRecord(value):
+    return [(None, (), None)]
+
+def _buildMessageRecords(value):
+    return [(None, (), message) for message in value]
+
+def _buildSideRecords(value):
+    return [(None, (), value[key]) for key in ("leftMessage", "rightMessage") if value[key]]
+
+def _buildSymmetryRecords(value):
+    return [(None, (), value["message"])]
+
+def _buildContourRecords(value):
+    return [(index, (), None) for index in sorted(value)]
+
+def _buildContourBoundsRecords(value):
+    records = []
+    for index, (xMin, yMin, xMax, yMax) in sorted(value.items()):
+        records.append((index, ((xMin, yMin), (xMax, yMax)), None))
+    return records
+
+def _buildContourPointsRecords(value):
+    return [(index, points, None) for index, points in sorted(value.items())]
+
+def _buildContourPointRecords(value):
+    return [(index, (point,), None) for index, point in sorted(value.items())]
+
+def _buildPointRecords(value):
+    records = []
+    for index, points in sorted(value.items()):
+        for point in sorted(points):
+            records.append((index, (point,), None))
+    return records
+
+def _buildPointPairRecords(value):
+    return [(None, pair, None) for pair in sorted(value)]
+
+def _buildShapeRecords(value):
+    records = []
+    for index, shapes in sorted(value.items()):
+        for points in sorted(shapes):
+            records.append((index, points, None))
+    return records
+
+def _buildCrossedHandlesRecords(value):
+    records = []
+    for index, crossings in sorted(value.items()):
+        for data in crossings:
+            records.append((index, data["points"], None))
+    return records
+
+def _buildUnevenHandlesRecords(value):
+    records = []
+    for index, handles in sorted(value.items()):
+        for off1, off2, off1Shape, off2Shape in handles:
+            records.append((index, (off1, off2), None))
+    return records
+
+def _buildVerticalMetricsRecords(value):
+    records = []
+    for metric, points in sorted(value.items()):
+        message = "Two or more points are just off the vertical metric at %s." % metric
+        records.append((None, sorted(points), message))
+    return records
+
+_recordBuilders = dict(
+    unicodeValue=_buildMessageRecords,
+    contourCount=_buildMessageRecords,
+    ligatureMetrics=_buildSideRecords,
+    componentMetrics=_buildSideRecords,
+    metricsSymmetry=_buildSymmetryRecords,
+    duplicateContours=_buildContourRecords,
+    touchingContours=_buildPointRecords,
+    smallContours=_buildContourBoundsRecords,
+    openContours=_buildContourPointsRecords,
+    extremePoints=_buildPointRecords,
+    straightLines=_buildShapeRecords,
+    pointsNearVerticalMetrics=_buildVerticalMetricsRecords,
+    unsmoothSmooths=_buildShapeRecords,
+    complexCurves=_buildShapeRecords,
+    crossedHandles=_buildCrossedHandlesRecords,
+    unnecessaryHandles=_buildShapeRecords,
+    unevenHandles=_buildUnevenHandlesRecords,
+    strayPoints=_buildContourPointRecords,
+    unnecessaryPoints=_buildPointRecords,
+    overlappingPoints=_buildPointRecords,
+    nearCoincidentPoints=_buildPointPairRecords
+)
+
+# -----------
+# JSON Lines
+# -----------
+
+# The first line is a header with the schema.
+# Each following line is one record as an array
+# of the fields in ReportRecord order.
+
+def getJSONLinesHeader():
+    return json.dumps(dict(schema=schemaName, version=schemaVersion), sort_keys=True)
+
+def recordToJSON(record):
+    return json.dumps(list(record), separators=(",", ":"))
+
+def recordFromJSON(text):
+    font, glyph, test, severity, contour, points, message = json.loads(text)
+    points = tuple([tuple(pt) for pt in points])
+    return ReportRecord(font, glyph, test, severity, contour, points, message)
+
+def readJSONLinesRecords(stream):
+    """
+    Yield the records in a JSON Lines stream.
+    """
+    header = json.loads(stream.readline())
+    _checkSchema(header.get("schema"), header.get("version"))
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield recordFromJSON(line)
+
+# ------
+# Binary
+# ------
+
+# The stream starts with the magic bytes and the
+# schema version. Strings are written once to a
+# string table and then referred to by index.
+#
+#   string:  "S", uint32 length, UTF-8 bytes
+#   record:  "R", uint32 font, uint32 glyph,
+#            uint32 test, uint32 severity,
+#            int32 contour, uint32 message,
+#            uint32 point count, float64 x/y pairs
+#
+# The index 0xFFFFFFFF means None and a contour
+# of -1 means None.
+
+binaryMagic = b"GNYR"
+_none = 0xFFFFFFFF
+_headerStruct = struct.Struct("<4sH")
+_stringStruct = struct.Struct("<cI")
+_recordStruct = struct.Struct("<c4IiII")
+
+
+class BinaryRecordWriter(object):
+
+    """
+    Write records to a binary stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._strings = {}
+        self.stream.write(_headerStruct.pack(binaryMagic, schemaVersion))
+
+    def _getStringIndex(self, text):
+        if text is None:
+            return _none
+        index = self._strings.get(text)
+        if index is None:
+            index = self._strings[text] = len(self._strings)
+            data = text.encode("utf-8")
+            self.stream.write(_stringStruct.pack(b"S", len(data)) + data)
+        return index
+
+    def write(self, record):
+        font = self._getStringIndex(record.font)
+        glyph = self._getStringIndex(record.glyph)
+        test = self._getStringIndex(record.test)
+        severity = self._getStringIndex(record.severity)
+        message = self._getStringIndex(record.message)
+        contour = record.contour
+        if contour is None:
+            contour = -1
+        coordinates = [value for pt in record.points for value in pt]
+        data = _recordStruct.pack(b"R", font, glyph, test, severity, contour, message, len(record.points))
+        data += struct.pack("<%dd" % len(coordinates), *coordinates)
+        self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def readBinaryRecords(stream):
+    """
+    Yield the records in a binary stream.
+    """
+    magic, version = _headerStruct.unpack(_read(stream, _headerStruct.size))
+    if magic != binaryMagic:
+        raise ValueError("Not a Glyph Nanny report.")
+    _checkSchema(schemaName, version)
+    strings = []
+    while True:
+        kind = stream.read(1)
+        if not kind:
+            break
+        if kind == b"S":
+            length, = struct.unpack("<I", _read(stream, 4))
+            strings.append(_read(stream, length).decode("utf-8"))
+        elif kind == b"R":
+            data = _read(stream, _recordStruct.size - 1)
+            font, glyph, test, severity, contour, message, count = struct.unpack("<4IiII", data)
+            coordinates = struct.unpack("<%dd" % (count * 2), _read(stream, count * 16))
+            points = tuple(zip(coordinates[0::2], coordinates[1::2]))
+            if contour == -1:
+                contour = None
+            font, glyph, test, severity, message = [None if i == _none else strings[i] for i in (font, glyph, test, severity, message)]
+            yield ReportRecord(font, glyph, test, severity, contour, points, message)
+        else:
+            raise ValueError("Unknown block in Glyph Nanny report.")
+
+def _read(stream, length):
+    data = stream.read(length)
+    if len(data) != length:
+        raise ValueError("The Glyph Nanny report is incomplete.")
+    return data
+
+def _checkSchema(name, version):
+    if name != schemaName:
+        raise ValueError("Not a Glyph Nanny report.")
+    if version != schemaVersion:
+        raise ValueError("Unsupported Glyph Nanny report version: %s" % version)
@@ -0,0 +1,141 @@
+"""
+The Glyph Nanny extension defaults.
+
+RoboFont runs glyphNanny.py as the main script and the
+menu scripts import it as a module, so there are two
+copies of glyphNanny. The settings are kept in this
+module so that all of them share one settings object.
+"""
+
+from AppKit import NSColor, NSCalibratedRGBColorSpace
+from mojo.extensions import getExtensionDefault, setExtensionDefault, getExtensionDefaultColor, setExtensionDefaultColor
+from glyphNannyCore import testRegistry, dictToTuple
+
+# --------
+# Defaults
+# --------
+
+defaultKeyStub = "com.typesupply.GlyphNanny."
+defaultKeyObserverVisibility = defaultKeyStub + "displayReportInGlyphView"
+defaultKeyTestStates = defaultKeyStub + "testStates"
+defaultKeyBackgroundReports = defaultKeyStub + "computeReportsInBackground"
+defaultKeyColorInform = defaultKeyStub + "colorInform"
+defaultKeyColorReview = defaultKeyStub + "colorReview"
+defaultKeyColorRemove = defaultKeyStub + "colorRemove"
+defaultKeyColorInsert = defaultKeyStub + "colorInsert"
+
+colorFallbacks = {
+    # Informative: Blue
+    defaultKeyColorInform : (0, 0, 0.7, 0.3),
+    # Insert Something: Green
+    defaultKeyColorInsert : (0, 1, 0, 0.75),
+    # Remove Something: Red
+    defaultKeyColorRemove : (1, 0, 0, 0.5),
+    # Review Something: Yellow-Orange
+    defaultKeyColorReview : (1, 0.7, 0, 0.7)
+}
+
+def registerGlyphNannyDefaults():
+    defaults = {
+        defaultKeyObserverVisibility : False,
+        defaultKeyBackgroundReports : False,
+        defaultKeyTestStates : {}
+    }
+    for key in sorted(testRegistry.keys()):
+        defaults[defaultKeyTestStates][key] = True
+
+    try:
+        from mojo.extensions import registerExtensionsDefaults
+    except ImportError:
+        def registerExtensionsDefaults(d):
+            for k, v in d.items():
+                e = getExtensionDefault(k, fallback="__fallback__")
+                if e == "__fallback__":
+                    setExtensionDefault(k, v)
+
+    registerExtensionsDefaults(defaults)
+
+    # handle nested
+    nested = getExtensionDefault(defaultKeyTestStates)
+    for key, default in defaults[defaultKeyTestStates].items():
+        if key not in nested:
+            nested[key] = default
+            setExtensionDefault(defaultKeyTestStates, nested)
+
+# --------
+# Settings
+# --------
+
+class GlyphNannySettings(object):
+
+    """
+    The extension defaults kept in memory so that
+    they don't need to be read on every draw. The
+    defaults are registered and read the first time
+    a setting is needed. The setters update both the
+    memory and the defaults.
+    """
+
+    _loadedAttributes = set(["displayReport", "backgroundReports", "testStates", "testStatesKey", "colors", "colorsKey"])
+
+    def __init__(self):
+        self._loaded = False
+
+    def __getattr__(self, attr):
+        # only called for attributes that
+        # haven't been set by load yet
+        if attr in self._loadedAttributes and not self.__dict__.get("_loaded"):
+            self.load()
+            return getattr(self, attr)
+        raise AttributeError(attr)
+
+    def load(self):
+        registerGlyphNannyDefaults()
+        self.displayReport = getExtensionDefault(defaultKeyObserverVisibility)
+        self.backgroundReports = getExtensionDefault(defaultKeyBackgroundReports)
+        self.testStates = dict(getExtensionDefault(defaultKeyTestStates))
+        self.testStatesKey = dictToTuple(self.testStates)
+        self.colors = {}
+        for key, fallback in colorFallbacks.items():
+            color = getExtensionDefaultColor(key)
+            if color is None:
+                color = NSColor.colorWithCalibratedRed_green_blue_alpha_(*fallback)
+            self.colors[key] = color
+        self._updateColorsKey()
+        self._loaded = True
+
+    def _updateColorsKey(self):
+        self.colorsKey = tuple([(key, getColorKey(self.colors[key])) for key in sorted(self.colors.keys())])
+
+    def setDisplayReport(self, value):
+        self.displayReport = value
+        setExtensionDefault(defaultKeyObserverVisibility, value)
+
+    def setBackgroundReports(self, value):
+        self.backgroundReports = value
+        setExtensionDefault(defaultKeyBackgroundReports, value)
+
+    def setTestState(self, identifier, value):
+        self.testStates[identifier] = value
+        self.testStatesKey = dictToTuple(self.testStates)
+        setExtensionDefault(defaultKeyTestStates, dict(self.testStates))
+
+    def setColor(self, key, color):
+        self.colors[key] = color
+        self._updateColorsKey()
+        setExtensionDefaultColor(key, color)
+
+
+def getColorKey(color):
+    """
+    Get a hashable (r, g, b, a) tuple for an NSColor
+    that can be used in cache keys. None is returned
+    for None.
+    """
+    if color is None:
+        return None
+    color = color.colorUsingColorSpaceName_(NSCalibratedRGBColorSpace)
+    return color.getRed_green_blue_alpha_(None, None, None, None)
+
+
+settings = GlyphNannySettings()
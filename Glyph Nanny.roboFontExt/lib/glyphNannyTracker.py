@@ -0,0 +1,236 @@
+"""
+Keep a font report up to date by only testing
+the glyphs that changed since the last report.
+
+    tracker = FontReportTracker(font)
+    for name, report in tracker.iterReport(testStates):
+        ...
+    tracker.close()
+
+The tracker listens to the defcon notifications of
+the font and keeps a DependencyIndex of the font up
+to date. When a glyph changes, it is tested again
+and the tests of other glyphs that depend on it are
+run again: the component tests of composites that
+use it as a component base, the ligature tests of
+ligatures that use it as a part and the Unicode
+tests of glyphs that share one of its Unicode
+values. When the font info changes, the tests that
+depend on it are run again for every glyph.
+
+Listeners added with addListener are told which
+tests of which glyphs are no longer valid as soon
+as a change happens.
+"""
+
+from glyphNannyCore import testRegistry, fontDependencies, getGlyphReport, getGlyphOrder, dictToTuple, DependencyIndex
+
+
+class FontReportTracker(object):
+
+    """
+    font is a fontParts or RoboFab font.
+    reportFunction is called with the font, a list
+    of glyph names and the testStates, and must
+    return a list of (glyph name, report) pairs.
+    """
+
+    def __init__(self, font, reportFunction=None):
+        if reportFunction is None:
+            reportFunction = _getGlyphReports
+        self.font = font
+        self._reportFunction = reportFunction
+        self._naked = font.naked()
+        self._layer = self._naked.layers.defaultLayer
+        self._reports = {}
+        self._testStatesKey = None
+        # glyph name to the identifiers of the tests that
+        # need to be run again, None means all of them
+        self._pending = {}
+        self._listeners = []
+        self._observedGlyphs = {}
+        self.dependencyIndex = DependencyIndex(self._naked)
+        for name in self._naked.keys():
+            self._observeGlyph(self._naked[name])
+        self._layer.addObserver(self, "glyphAddedNotification", "Layer.GlyphAdded")
+        self._layer.addObserver(self, "glyphWillBeDeletedNotification", "Layer.GlyphWillBeDeleted")
+        self._layer.addObserver(self, "glyphNameChangedNotification", "Layer.GlyphNameChanged")
+        self._naked.info.addObserver(self, "fontInfoChangedNotification", "Info.Changed")
+
+    def close(self):
+        for glyph in self._observedGlyphs.values():
+            glyph.removeObserver(self, "Glyph.Changed")
+        self._observedGlyphs = {}
+        self._listeners = []
+        self._layer.removeObserver(self, "Layer.GlyphAdded")
+        self._layer.removeObserver(self, "Layer.GlyphWillBeDeleted")
+        self._layer.removeObserver(self, "Layer.GlyphNameChanged")
+        self._naked.info.removeObserver(self, "Info.Changed")
+
+    def addListener(self, callback):
+        """
+        callback is called with a dict of glyph names
+        and the identifiers of the tests that are no
+        longer valid because of a change to another
+        glyph or to the font info.
+        """
+        self._listeners.append(callback)
+
+    # -------------
+    # Notifications
+    # -------------
+
+    def _observeGlyph(self, glyph):
+        if id(glyph) in self._observedGlyphs:
+            return
+        glyph.addObserver(self, "glyphChangedNotification", "Glyph.Changed")
+        self._observedGlyphs[id(glyph)] = glyph
+
+    def _unobserveGlyph(self, glyph):
+        if id(glyph) not in self._observedGlyphs:
+            return
+        glyph.removeObserver(self, "Glyph.Changed")
+        del self._observedGlyphs[id(glyph)]
+
+    def glyphChangedNotification(self, notification):
+        self._glyphChanged(notification.object.name)
+
+    def glyphAddedNotification(self, notification):
+        name = notification.data["name"]
+        self._observeGlyph(self._layer[name])
+        self._glyphChanged(name)
+
+    def glyphWillBeDeletedNotification(self, notification):
+        name = notification.data["name"]
+        self._unobserveGlyph(self._layer[name])
+        self._glyphChanged(name, removed=True)
+
+    def glyphNameChangedNotification(self, notification):
+        self._glyphChanged(notification.data["oldValue"], removed=True)
+        self._glyphChanged(notification.data["newValue"])
+
+    def fontInfoChangedNotification(self, notification):
+        identifiers = _getDependentTests("fontInfo")
+        self._invalidate(dict.fromkeys(self._naked.keys(), identifiers))
+
+    def _glyphChanged(self, name, removed=False):
+        # the glyphs that depended on the old state
+        # and the glyphs that depend on the new state
+        before = self.dependencyIndex.getDependents(name)
+        if removed:
+            self.dependencyIndex.removeGlyph(name)
+            self._reports.pop(name, None)
+            self._pending.pop(name, None)
+        else:
+            self.dependencyIndex.updateGlyph(name)
+            self._pending[name] = None
+        after = self.dependencyIndex.getDependents(name)
+        invalid = {}
+        for dependents in (before, after):
+            for dependency, names in dependents.items():
+                identifiers = _getDependentTests(dependency)
+                for dependent in names:
+                    if dependent == name:
+                        continue
+                    if dependent not in invalid:
+                        invalid[dependent] = set()
+                    invalid[dependent] |= identifiers
+        if invalid:
+            self._invalidate(invalid)
+
+    def _invalidate(self, invalid):
+        for name, identifiers in invalid.items():
+            if name not in self._pending:
+                self._pending[name] = set(identifiers)
+            elif self._pending[name] is not None:
+                self._pending[name] |= identifiers
+        for callback in self._listeners:
+            callback(invalid)
+
+    # -------
+    # Reports
+    # -------
+
+    def update(self, testStates):
+        """
+        Run the tests that are no longer valid since
+        the last update. The number of glyphs tested
+        is returned.
+        """
+        testStatesKey = dictToTuple(testStates)
+        if testStatesKey != self._testStatesKey:
+            self._reports = {}
+            self._pending = {}
+        # group the glyphs by the tests they need
+        groups = {}
+        for name in getGlyphOrder(self.font):
+            if name not in self._reports:
+                identifiers = None
+            elif name in self._pending:
+                identifiers = self._pending[name]
+                if identifiers is not None:
+                    identifiers = frozenset(identifiers)
+            else:
+                continue
+            if identifiers not in groups:
+                groups[identifiers] = []
+            groups[identifiers].append(name)
+        count = 0
+        for identifiers, names in groups.items():
+            if identifiers is None:
+                for name, report in self._reportFunction(self.font, names, testStates):
+                    self._reports[name] = report
+            else:
+                partialTestStates = {}
+                for identifier in testRegistry.keys():
+                    partialTestStates[identifier] = identifier in identifiers and testStates.get(identifier, True)
+                if any(partialTestStates.values()):
+                    for name, report in self._reportFunction(self.font, names, partialTestStates):
+                        # reports that were already handed
+                        # out are not changed
+                        merged = dict(self._reports[name])
+                        for identifier in identifiers:
+                            if partialTestStates[identifier]:
+                                merged[identifier] = report[identifier]
+                        self._reports[name] = merged
+            count += len(names)
+        self._testStatesKey = testStatesKey
+        self._pending = {}
+        return count
+
+    def getReport(self, testStates):
+        """
+        Get a dict of glyph names and reports
+        like getFontReport.
+        """
+        self.update(testStates)
+        return dict(self._reports)
+
+    def iterReport(self, testStates):
+        """
+        Yield (glyph name, report) pairs in glyphOrder.
+        """
+        self.update(testStates)
+        for name in getGlyphOrder(self.font):
+            yield name, self._reports[name]
+
+
+def _getGlyphReports(font, glyphNames, testStates):
+    return [(name, getGlyphReport(font, font[name], testStates)) for name in glyphNames]
+
+_dependentTests = {}
+
+def _getDependentTests(dependency):
+    """
+    Get the identifiers of the tests
+    that have dependency.
+    """
+    assert dependency in fontDependencies
+    identifiers = _dependentTests.get(dependency)
+    if identifiers is None:
+        identifiers = set()
+        for identifier, data in testRegistry.items():
+            if dependency in data["dependencies"]:
+                identifiers.add(identifier)
+        identifiers = _dependentTests[dependency] = frozenset(identifiers)
+    return identifiers
@@ -0,0 +1,404 @@
+"""
+Time the Glyph Nanny tests on synthetic fonts.
+
+    python benchmarks/glyphNannyBenchmark.py --save results.json
+    python benchmarks/glyphNannyBenchmark.py --compare results.json
+
+The fonts are built in memory from the glyphs in
+test.ufo. Each benchmark is run several times and
+the fastest time is kept:
+
+    test.<identifier>  one test on every glyph
+    geometry           GlyphGeometry for every glyph
+    glyphReport        getGlyphReport for every glyph
+    representation     the per-test representations
+                       of every glyph, built from scratch
+    fontReport         getFontReport
+
+The results are saved as JSON. With --compare the
+results are compared to a saved file and the exit
+code is 1 if anything became slower than --threshold
+allows. Before the timing, the shortcuts that some
+tests take are checked against the full computation
+on outlines that have caused problems. The exit code
+is 1 if a check fails. This requires fontTools,
+fontParts, fontPens, defcon and booleanOperations.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, "Glyph Nanny.roboFontExt", "lib"))
+
+from fontTools.pens.basePen import BasePen
+from fontTools.misc import bezierTools as ftBezierTools
+import glyphNannyCore
+
+resultsFormatVersion = 1
+
+# -----
+# Fonts
+# -----
+
+# name: (glyph count, curve subdivisions)
+fontSizes = {
+    "test" : (None, 0),
+    "large" : (3000, 0),
+    "dense" : (150, 4)
+}
+
+quickFontSizes = {
+    "test" : (None, 0),
+    "large" : (300, 0),
+    "dense" : (15, 4)
+}
+
+
+class SubdividePen(BasePen):
+
+    """
+    Split every segment into 2 ** subdivisions
+    segments and jitter the new points so that
+    the outline has many more points.
+    """
+
+    def __init__(self, outPen, subdivisions, randomizer):
+        BasePen.__init__(self)
+        self.outPen = outPen
+        self.count = 2 ** subdivisions
+        self.randomizer = randomizer
+
+    def _jitter(self, pt):
+        r = self.randomizer
+        return (round(pt[0] + r.uniform(-2, 2)), round(pt[1] + r.uniform(-2, 2)))
+
+    def _moveTo(self, pt):
+        self.outPen.moveTo(pt)
+
+    def _lineTo(self, pt):
+        pt0 = self._getCurrentPoint()
+        for i in range(1, self.count):
+            t = i / float(self.count)
+            self.outPen.lineTo(self._jitter((pt0[0] + (pt[0] - pt0[0]) * t, pt0[1] + (pt[1] - pt0[1]) * t)))
+        self.outPen.lineTo(pt)
+
+    def _curveToOne(self, pt1, pt2, pt3):
+        pt0 = self._getCurrentPoint()
+        ts = [i / float(self.count) for i in range(1, self.count)]
+        segments = ftBezierTools.splitCubicAtT(pt0, pt1, pt2, pt3, *ts)
+        for i, (a, b, c, d) in enumerate(segments):
+            if i < len(segments) - 1:
+                d = self._jitter(d)
+            self.outPen.curveTo(b, c, d)
+
+    def _closePath(self):
+        self.outPen.closePath()
+
+    def _endPath(self):
+        self.outPen.endPath()
+
+
+def buildFont(glyphCount=None, subdivisions=0, seed=1):
+    """
+    Build a font from the glyphs in test.ufo.
+    glyphCount glyphs are made by copying the source
+    glyphs. None means one copy of each. Composites
+    and ligatures are added so that the metrics tests
+    have something to look at.
+    """
+    from fontParts.world import OpenFont, NewFont
+    randomizer = random.Random(seed)
+    source = OpenFont(os.path.join(root, "test.ufo"), showInterface=False)
+    font = NewFont(showInterface=False)
+    for attr in "unitsPerEm descender xHeight capHeight ascender".split(" "):
+        setattr(font.info, attr, getattr(source.info, attr))
+    sourceNames = sorted(source.keys())
+    if glyphCount is None:
+        glyphCount = len(sourceNames)
+    names = []
+    for i in range(glyphCount):
+        sourceGlyph = source[sourceNames[i % len(sourceNames)]]
+        name = "glyph%05d" % i
+        glyph = font.newGlyph(name)
+        glyph.width = sourceGlyph.width
+        sourceGlyph.draw(SubdividePen(glyph.getPen(), subdivisions, randomizer))
+        glyph.moveBy((randomizer.randint(-3, 3), 0))
+        glyph.unicodes = [0xE000 + i]
+        names.append(name)
+    # one composite and one ligature for every ten glyphs
+    for i in range(0, glyphCount - 1, 10):
+        composite = font.newGlyph(names[i] + ".composite")
+        composite.width = font[names[i]].width
+        composite.appendComponent(names[i])
+        ligature = font.newGlyph(names[i] + "_" + names[i + 1])
+        ligature.width = font[names[i]].width + font[names[i + 1]].width
+        font[names[i]].draw(ligature.getPen())
+    font.glyphOrder = sorted(font.keys())
+    source.close()
+    return font
+
+# ----------
+# Benchmarks
+# ----------
+
+def timeFunction(function, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        function()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+def runBenchmarks(font, testStates, repeat):
+    """
+    Get a dict of benchmark names and times for font.
+    """
+    from glyphNannyCore import GlyphGeometry, getGlyphReport, getFontReport, testRegistry
+    glyphs = [font[name] for name in glyphNannyCore.getGlyphOrder(font)]
+    geometries = [GlyphGeometry(glyph) for glyph in glyphs]
+    results = {}
+    results["geometry"] = timeFunction(lambda: [GlyphGeometry(glyph) for glyph in glyphs], repeat)
+    for identifier in glyphNannyCore.reportOrder:
+        if not testStates.get(identifier, True):
+            continue
+        testFunction = testRegistry[identifier]["testFunction"]
+        def run():
+            for glyph, geometry in zip(glyphs, geometries):
+                testFunction(glyph, geometry)
+        results["test." + identifier] = timeFunction(run, repeat)
+    results["glyphReport"] = timeFunction(lambda: [getGlyphReport(font, glyph, testStates) for glyph in glyphs], repeat)
+    results["representation"] = timeFunction(lambda: _getRepresentationReports(glyphs, testStates), repeat)
+    results["fontReport"] = timeFunction(lambda: getFontReport(font, testStates), repeat)
+    return results
+
+# the same representations as the extension
+
+geometryRepresentationKey = "com.typesupply.GlyphNanny.Benchmark.Geometry"
+testRepresentationKeyStub = "com.typesupply.GlyphNanny.Benchmark.Test."
+
+def _registerRepresentationFactories():
+    import defcon
+    from fontParts.fontshell import RFont
+    from glyphNannyCore import GlyphGeometry, testRegistry
+
+    # fontParts glyphs only know their font if
+    # they are wrapped through the font
+    def wrapGlyph(glyph):
+        return RFont(glyph.font)[glyph.name]
+
+    def geometryFactory(glyph):
+        return GlyphGeometry(wrapGlyph(glyph))
+
+    def makeTestFactory(identifier):
+        testFunction = testRegistry[identifier]["testFunction"]
+        def testFactory(glyph):
+            geometry = glyph.getRepresentation(geometryRepresentationKey)
+            return testFunction(wrapGlyph(glyph), geometry)
+        return testFactory
+
+    registered = defcon.Glyph.representationFactories
+    if geometryRepresentationKey not in registered:
+        defcon.registerRepresentationFactory(defcon.Glyph, geometryRepresentationKey, geometryFactory, destructiveNotifications=("Glyph.ContoursChanged",))
+    for identifier in testRegistry.keys():
+        name = testRepresentationKeyStub + identifier
+        if name not in registered:
+            defcon.registerRepresentationFactory(defcon.Glyph, name, makeTestFactory(identifier))
+
+def _getRepresentationReports(glyphs, testStates):
+    reports = []
+    for glyph in glyphs:
+        naked = glyph.naked()
+        naked.destroyAllRepresentations()
+        report = {}
+        for identifier in glyphNannyCore.testRegistry.keys():
+            if testStates.get(identifier, True):
+                report[identifier] = naked.getRepresentation(testRepresentationKeyStub + identifier)
+        reports.append(report)
+    return reports
+
+# ------
+# Checks
+# ------
+
+def buildCheckFont():
+    """
+    Build a font with the outlines that the
+    shortcuts in the tests have to handle.
+    """
+    from fontParts.world import NewFont
+    font = NewFont(showInterface=False)
+    # removing overlap drops contours without area
+    glyph = font.newGlyph("collinear")
+    pen = glyph.getPen()
+    for i in range(3):
+        x = i * 200
+        pen.moveTo((x, 0))
+        pen.lineTo((x + 50, 50))
+        pen.lineTo((x + 100, 100))
+        pen.closePath()
+    pen.moveTo((0, 500))
+    pen.lineTo((100, 500))
+    pen.closePath()
+    pen.moveTo((0, 700))
+    pen.curveTo((30, 700), (60, 700), (100, 700))
+    pen.closePath()
+    glyph = font.newGlyph("collinearAndOverlapping")
+    pen = glyph.getPen()
+    pen.moveTo((0, 0))
+    pen.lineTo((0, 100))
+    pen.lineTo((100, 100))
+    pen.lineTo((100, 0))
+    pen.closePath()
+    pen.moveTo((50, 50))
+    pen.lineTo((50, 150))
+    pen.lineTo((150, 150))
+    pen.lineTo((150, 50))
+    pen.closePath()
+    pen.moveTo((300, 0))
+    pen.lineTo((400, 100))
+    pen.closePath()
+    pen.moveTo((500, 0))
+    pen.lineTo((550, 0))
+    pen.lineTo((600, 0))
+    pen.closePath()
+    return font
+
+def checkOverlapRemovalBound(font):
+    """
+    Get the names of the glyphs in font that removing
+    overlap removes more contours from than the contour
+    count test's shortcut allows for.
+    """
+    from glyphNannyCore import GlyphGeometry, _countPossibleOverlapRemovals, _getOverlapRemovalCount
+    failures = []
+    for glyph in font:
+        geometry = GlyphGeometry(glyph)
+        if _countPossibleOverlapRemovals(geometry) < _getOverlapRemovalCount(glyph, geometry):
+            failures.append(glyph.name)
+    return sorted(failures)
+
+def runChecks():
+    """
+    Get a list of (check, glyph names) for
+    the checks that failed.
+    """
+    font = buildCheckFont()
+    failed = []
+    failures = checkOverlapRemovalBound(font)
+    if failures:
+        failed.append(("overlapRemovalBound", failures))
+    font.close()
+    return failed
+
+# -------
+# Results
+# -------
+
+def getEnvironment():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(
+        commit=commit,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        time=time.strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+def compareResults(baseline, results, threshold):
+    """
+    Get a list of (font, benchmark, old, new, ratio)
+    for everything in both results and a list of the
+    entries that are slower than threshold allows.
+    """
+    rows = []
+    regressions = []
+    for fontName, benchmarks in sorted(results["fonts"].items()):
+        oldBenchmarks = baseline["fonts"].get(fontName, {})
+        for benchmark, new in sorted(benchmarks["times"].items()):
+            old = oldBenchmarks.get("times", {}).get(benchmark)
+            if old is None:
+                continue
+            ratio = new / max(old, 1e-9)
+            row = (fontName, benchmark, old, new, ratio)
+            rows.append(row)
+            # very short times are too noisy to compare
+            if ratio > 1 + threshold and new - old > 0.005:
+                regressions.append(row)
+    return rows, regressions
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Time the Glyph Nanny tests on synthetic fonts.")
+    parser.add_argument("--save", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare the results to this JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Fraction that a time may grow before it is a regression. Defaults to 0.2.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times each benchmark is run. Defaults to 3.")
+    parser.add_argument("--fonts", help="Comma separated list of the fonts to use: %s." % ", ".join(sorted(fontSizes.keys())))
+    parser.add_argument("--skip", help="Comma separated list of tests not to run.")
+    parser.add_argument("--quick", action="store_true", help="Use smaller fonts.")
+    args = parser.parse_args(args)
+
+    sizes = quickFontSizes if args.quick else fontSizes
+    fontNames = sorted(sizes.keys())
+    if args.fonts:
+        fontNames = [name.strip() for name in args.fonts.split(",")]
+    testStates = {}
+    for identifier in glyphNannyCore.testRegistry.keys():
+        testStates[identifier] = True
+    if args.skip:
+        for identifier in args.skip.split(","):
+            testStates[identifier.strip()] = False
+
+    exitCode = 0
+    failed = runChecks()
+    for check, glyphNames in failed:
+        sys.stdout.write("check failed: %s: %s\n" % (check, " ".join(glyphNames)))
+    if failed:
+        exitCode = 1
+
+    _registerRepresentationFactories()
+    results = dict(version=resultsFormatVersion, quick=args.quick, environment=getEnvironment(), fonts={})
+    for fontName in fontNames:
+        glyphCount, subdivisions = sizes[fontName]
+        font = buildFont(glyphCount, subdivisions)
+        pointCount = sum([len(contour.points) for glyph in font for contour in glyph.contours])
+        sys.stdout.write("%s: %d glyphs, %d points\n" % (fontName, len(font), pointCount))
+        sys.stdout.flush()
+        times = runBenchmarks(font, testStates, args.repeat)
+        for benchmark, duration in sorted(times.items()):
+            sys.stdout.write("  %-36s %9.4f\n" % (benchmark, duration))
+        results["fonts"][fontName] = dict(glyphs=len(font), points=pointCount, times=times)
+        font.close()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != results["quick"]:
+            sys.stdout.write("\nThe baseline was made with different font sizes.\n")
+        rows, regressions = compareResults(baseline, results, args.threshold)
+        sys.stdout.write("\n%-8s %-36s %9s %9s %7s\n" % ("font", "benchmark", "old", "new", "ratio"))
+        for fontName, benchmark, old, new, ratio in rows:
+            mark = ""
+            if (fontName, benchmark, old, new, ratio) in regressions:
+                mark = " slower"
+            sys.stdout.write("%-8s %-36s %9.4f %9.4f %7.2f%s\n" % (fontName, benchmark, old, new, ratio, mark))
+        if regressions:
+            exitCode = 1
+    return exitCode
+
+
+if __name__ == "__main__":
+    sys.exit(main())